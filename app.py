@@ -1,17 +1,29 @@
 import random
 import datetime
-import re
-from flask import Flask, render_template, request, jsonify
-from src.helper import embeddings, text_chunks
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import ChatOpenAI
-from langchain.chains import create_retrieval_chain
-import google.generativeai as genai
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+import json
+import time
+import uuid
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context, url_for
+from src.helper import get_embeddings
+from src.cache import TTLCache, CachedEmbeddings, CachedRetriever, IndexGenerationWatcher, normalize_query
+from src.semantic_cache import SemanticAnswerCache, context_signature
+from src.stubs import StubEmbeddings, StubGenerativeModel, StubRetriever
+from src.backends import LazyBackend, LazyEmbeddings, LazyRetriever, readiness, warm_up
+from src.intent import IntentClassifier, load_intent_phrases
+from src.memory import ConversationStore, build_history, is_follow_up, refers_back
+from src.context import ContextPacker, truncate_to_tokens
+from src.retrieval import AdaptiveRetriever, CrossEncoderReranker
+from src.metrics import MetricsRegistry, Tracer, record_stage, set_outcome, span
+from src.llm import CircuitBreaker, HTTPGenerativeModel, LLMClient, LLMUnavailable
+from src.pipeline import AnswerPipeline, IncompleteAnswer, Stage
+from src.precomputed import PrecomputedAnswers
+from src.batch import BatchJobs, BatchPipeline, BatchRunner, RateLimiter, parse_items
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from dotenv import load_dotenv
 from src.prompt import system_prompt
 import os
+import atexit
 import logging
 
 # Configure logging
@@ -25,28 +37,277 @@ load_dotenv()
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 
+# Backends: "stub" swaps in the local stand-ins from src/stubs.py, so the app
+# can be run and load-tested offline without API keys. VECTOR_BACKEND=local
+# serves the on-disk index built by store_index.py instead of Pinecone, and
+# LLM_BACKEND=http posts prompts to LLM_HTTP_URL (see src/llm.py).
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "huggingface")
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "pinecone")
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+
+# Per-stage timing of every answer, served at /metrics. TRACE_SAMPLE_RATE of
+# requests, and all slower than TRACE_SLOW_MS, are logged with their spans
+# (to TRACE_LOG_PATH as JSON lines if set). PROFILE_SLOW_MS turns on cProfile
+# for /get and keeps a .prof report for requests slower than that.
+metrics_registry = MetricsRegistry()
+tracer = Tracer(
+    metrics_registry,
+    sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "0.01")),
+    slow_ms=float(os.environ.get("TRACE_SLOW_MS", "2000")),
+    log_path=os.environ.get("TRACE_LOG_PATH"),
+    profile_slow_ms=float(os.environ["PROFILE_SLOW_MS"]) if os.environ.get("PROFILE_SLOW_MS") else None,
+    profile_dir=os.environ.get("PROFILE_DIR", "profiles"),
+    profile_sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "1.0")),
+)
+
+# Fast boot: backend clients are built on first use and warmed on a
+# background thread, so a worker starts serving (and /health reports
+# progress) without waiting on model loads or remote handshakes.
+# FAST_BOOT=0 builds everything during import, as before.
+FAST_BOOT = os.environ.get("FAST_BOOT", "1") == "1"
+GEMINI_LIST_MODELS = os.environ.get("GEMINI_LIST_MODELS", "0") == "1"
+# Simulated client start-up time for the stub backends (startup benchmark).
+STUB_CONNECT_LATENCY = float(os.environ.get("STUB_CONNECT_LATENCY_MS", "0")) / 1000
+
 # Check if required environment variables are set
-if not PINECONE_API_KEY:
+if VECTOR_BACKEND == "pinecone" and not PINECONE_API_KEY:
     raise ValueError("PINECONE_API_KEY is not set. Please create a .env file with your API keys.")
-if not GEMINI_API_KEY:
+if LLM_BACKEND == "gemini" and not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY is not set. Please create a .env file with your API keys.")
 
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
-os.environ["GEMINI_API_KEY"] = GEMINI_API_KEY
+if PINECONE_API_KEY:
+    os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
+if GEMINI_API_KEY:
+    os.environ["GEMINI_API_KEY"] = GEMINI_API_KEY
 
 index_name = "medical-bot"
 
-# Initialize Pinecone vector store
-try:
-    docsearch = PineconeVectorStore.from_existing_index(
-        index_name=index_name,
-        embedding=embeddings 
+# Caches in front of the embedder and the vector store. Query embeddings stay
+# valid across re-ingestion; retrieved documents are dropped when the manifest
+# written by store_index.py changes (and expire after the TTL regardless).
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_TTL = float(os.environ.get("RETRIEVAL_CACHE_TTL", "3600"))
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "vector_index")
+INDEX_MANIFEST_PATH = os.environ.get(
+    "INDEX_MANIFEST_PATH",
+    os.path.join(LOCAL_INDEX_DIR, "manifest.json") if VECTOR_BACKEND == "local" else "index_manifest.json",
+)
+
+def build_query_embedder():
+    # Only the query embedder is needed to serve; the PDF corpus is loaded and
+    # chunked by store_index.py, never by the web workers.
+    if EMBEDDING_BACKEND == "stub":
+        time.sleep(STUB_CONNECT_LATENCY)
+        return StubEmbeddings(latency=float(os.environ.get("STUB_EMBED_LATENCY_MS", "0")) / 1000)
+    return get_embeddings()
+
+# Retrieval: over-fetch RETRIEVAL_FETCH_K candidates and keep k of them by
+# MMR ("mmr") or by score ("similarity"); RERANKER_MODEL names a CPU
+# cross-encoder that reranks instead. With RETRIEVAL_ADAPTIVE_K, k is
+# RETRIEVAL_MIN_K for short definitional questions and RETRIEVAL_MAX_K for
+# comparisons. Tune with benchmarks/retrieval_eval.py.
+RETRIEVAL_SEARCH_TYPE = os.environ.get("RETRIEVAL_SEARCH_TYPE", "mmr")
+RETRIEVAL_K = int(os.environ.get("RETRIEVAL_K", "5"))
+RETRIEVAL_MIN_K = int(os.environ.get("RETRIEVAL_MIN_K", "3"))
+RETRIEVAL_MAX_K = int(os.environ.get("RETRIEVAL_MAX_K", "8"))
+RETRIEVAL_FETCH_K = int(os.environ.get("RETRIEVAL_FETCH_K", "20"))
+RETRIEVAL_MMR_LAMBDA = float(os.environ.get("RETRIEVAL_MMR_LAMBDA", "0.7"))
+RETRIEVAL_ADAPTIVE_K = os.environ.get("RETRIEVAL_ADAPTIVE_K", "1") == "1"
+RERANKER_MODEL = os.environ.get("RERANKER_MODEL")
+
+def build_base_retriever():
+    if VECTOR_BACKEND == "stub":
+        time.sleep(STUB_CONNECT_LATENCY)
+        return StubRetriever(
+            k=5, latency=float(os.environ.get("STUB_RETRIEVAL_LATENCY_MS", "0")) / 1000
+        )
+    if VECTOR_BACKEND == "local":
+        from src.local_index import LocalVectorStore
+
+        docsearch = LocalVectorStore.load(
+            LOCAL_INDEX_DIR,
+            embedding=embeddings,
+            nprobe=int(os.environ.get("LOCAL_INDEX_NPROBE", "8")),
+        )
+    else:
+        # Imported here: the Pinecone client is slow to import and
+        # from_existing_index makes a round trip to describe the index.
+        from langchain_pinecone import PineconeVectorStore
+
+        docsearch = PineconeVectorStore.from_existing_index(
+            index_name=index_name,
+            embedding=embeddings
+        )
+    logger.info(f"Vector store initialized successfully ({VECTOR_BACKEND})")
+    reranker = None
+    if RERANKER_MODEL:
+        reranker = CrossEncoderReranker(RERANKER_MODEL)
+        reranker.load()
+    return AdaptiveRetriever(
+        vectorstore=docsearch,
+        embeddings=embeddings,
+        search_type=RETRIEVAL_SEARCH_TYPE,
+        k=RETRIEVAL_K,
+        min_k=RETRIEVAL_MIN_K,
+        max_k=RETRIEVAL_MAX_K,
+        fetch_k=RETRIEVAL_FETCH_K,
+        lambda_mult=RETRIEVAL_MMR_LAMBDA,
+        adaptive_k=RETRIEVAL_ADAPTIVE_K,
+        reranker=reranker,
     )
-    retriever = docsearch.as_retriever(search_type="similarity", search_kwargs={"k": 5})
-    logger.info("Pinecone vector store initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing Pinecone: {e}")
-    raise
+
+def build_gemini_model():
+    if LLM_BACKEND == "stub":
+        time.sleep(STUB_CONNECT_LATENCY)
+        return StubGenerativeModel(
+            latency=float(os.environ.get("STUB_LLM_LATENCY_MS", "0")) / 1000,
+            tokens=int(os.environ.get("STUB_LLM_TOKENS", "20")),
+        )
+    if LLM_BACKEND == "http":
+        return HTTPGenerativeModel(
+            os.environ.get("LLM_HTTP_URL", "http://127.0.0.1:8765/generate"),
+            pool_size=int(os.environ.get("LLM_HTTP_POOL_SIZE", "32")),
+        )
+    import google.generativeai as genai
+
+    genai.configure(api_key=GEMINI_API_KEY)
+    if GEMINI_LIST_MODELS:
+        # Diagnostic only: a network round trip, so never on the boot path.
+        logger.info("Available Gemini models:")
+        for m in genai.list_models():
+            if 'generateContent' in m.supported_generation_methods:
+                logger.info(f"Model: {m.name}")
+    return genai.GenerativeModel("models/gemini-1.5-flash")
+
+embedder_backend = LazyBackend("embeddings", build_query_embedder)
+vector_backend = LazyBackend("vector_store", build_base_retriever)
+llm_backend = LazyBackend("llm", build_gemini_model)
+BACKENDS = (embedder_backend, vector_backend, llm_backend)
+
+# Every LLM call gets LLM_TIMEOUT seconds and up to LLM_MAX_RETRIES retries
+# of transient failures with jittered backoff. LLM_HEDGE=1 sends a second
+# request when the first is slower than the recent LLM_HEDGE_PERCENTILE
+# latency. After LLM_BREAKER_FAILURES failed calls in a row, answers are
+# built from the retrieved context alone for LLM_BREAKER_RESET seconds.
+llm_client = LLMClient(
+    llm_backend,
+    timeout=float(os.environ.get("LLM_TIMEOUT", "30")),
+    max_retries=int(os.environ.get("LLM_MAX_RETRIES", "2")),
+    backoff_base=float(os.environ.get("LLM_BACKOFF_BASE_MS", "250")) / 1000,
+    backoff_max=float(os.environ.get("LLM_BACKOFF_MAX_MS", "4000")) / 1000,
+    hedge=os.environ.get("LLM_HEDGE", "0") == "1",
+    hedge_percentile=float(os.environ.get("LLM_HEDGE_PERCENTILE", "0.95")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.environ.get("LLM_BREAKER_RESET", "30")),
+    ),
+    max_workers=int(os.environ.get("LLM_MAX_WORKERS", "32")),
+)
+
+embedding_cache = TTLCache(maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+retrieval_cache = TTLCache(maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+embeddings = CachedEmbeddings(LazyEmbeddings(embedder_backend), embedding_cache)
+
+# Answers to previously seen questions, matched on embedding similarity and
+# on the retrieved context, so FAQ-style questions skip the LLM entirely.
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "1") == "1"
+answer_cache = SemanticAnswerCache(
+    path=os.environ.get("SEMANTIC_CACHE_PATH", "semantic_cache.json"),
+    maxsize=int(os.environ.get("SEMANTIC_CACHE_SIZE", "2000")),
+    threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+)
+atexit.register(answer_cache.save)
+
+# Answers generated offline by precompute_answers.py for the most frequent
+# questions, matched on normalized text or within PRECOMPUTED_THRESHOLD
+# similarity. They skip retrieval and the LLM; store_index.py regenerates
+# them when re-ingestion changes what they were grounded in, and they are
+# not served while they were built for an older index generation.
+PRECOMPUTED_ENABLED = os.environ.get("PRECOMPUTED_ENABLED", "1") == "1"
+precomputed_answers = PrecomputedAnswers(
+    os.environ.get("PRECOMPUTED_ANSWERS_PATH", "precomputed_answers.json"),
+    threshold=float(os.environ.get("PRECOMPUTED_THRESHOLD", "0.95")),
+    manifest_path=INDEX_MANIFEST_PATH,
+)
+
+# Conversation memory: turns are stored per session (cookie) in SQLite by a
+# background writer. Follow-up questions get the last HISTORY_TURNS turns in
+# the prompt, within HISTORY_TOKEN_BUDGET; standalone questions are answered
+# without history, so they keep hitting the caches.
+CHAT_HISTORY_ENABLED = os.environ.get("CHAT_HISTORY_ENABLED", "1") == "1"
+HISTORY_TURNS = int(os.environ.get("HISTORY_TURNS", "4"))
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "600"))
+SESSION_COOKIE = "chat_session"
+SESSION_MAX_AGE = 30 * 24 * 3600
+conversation_store = None
+if CHAT_HISTORY_ENABLED:
+    conversation_store = ConversationStore(os.environ.get("CHAT_HISTORY_DB", "chat_history.db"))
+    atexit.register(conversation_store.close)
+
+retriever = CachedRetriever(
+    retriever=LazyRetriever(backend=vector_backend),
+    cache=retrieval_cache,
+    watcher=IndexGenerationWatcher(INDEX_MANIFEST_PATH),
+)
+
+# Concurrent /get requests for the same standalone question (same
+# normalize_query key) share one retrieval + LLM execution.
+COALESCE_ENABLED = os.environ.get("COALESCE_ENABLED", "1") == "1"
+
+# /batch and batch_answer.py: questions are embedded BATCH_EMBED_SIZE at a
+# time, searched on BATCH_SEARCH_WORKERS threads and answered on
+# BATCH_LLM_WORKERS threads. All batches on a server together start at most
+# BATCH_LLM_RATE_PER_MIN LLM calls per minute (0 for no limit), which leaves
+# LLM quota for interactive traffic. /batch jobs run in the background of the
+# worker that accepted them, BATCH_MAX_RUNNING at a time, with their state
+# and results in BATCH_JOBS_DIR.
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "10000"))
+BATCH_JOBS_DIR = os.environ.get("BATCH_JOBS_DIR", "batch_jobs")
+BATCH_MAX_RUNNING = int(os.environ.get("BATCH_MAX_RUNNING", "1"))
+BATCH_SETTINGS = {
+    "embed_batch_size": int(os.environ.get("BATCH_EMBED_SIZE", "32")),
+    "search_workers": int(os.environ.get("BATCH_SEARCH_WORKERS", "8")),
+    "llm_workers": int(os.environ.get("BATCH_LLM_WORKERS", "4")),
+}
+batch_limiter = RateLimiter(float(os.environ.get("BATCH_LLM_RATE_PER_MIN", "60")))
+
+def coalescing_stats():
+    return pipeline.coalescing_stats()
+
+def cache_counter(field):
+    caches = {
+        "embedding": embedding_cache,
+        "retrieval": retrieval_cache,
+        "answer": answer_cache,
+        "precomputed": precomputed_answers,
+    }
+    return lambda: {(name,): cache.stats()[field] for name, cache in caches.items()}
+
+metrics_registry.callback("rag_cache_hits_total", "Cache hits", ("cache",), cache_counter("hits"), kind="counter")
+metrics_registry.callback("rag_cache_misses_total", "Cache misses", ("cache",), cache_counter("misses"), kind="counter")
+metrics_registry.callback(
+    "rag_backend_ready", "1 once the backend client is built", ("backend",),
+    lambda: {(backend.name,): int(backend.ready) for backend in BACKENDS},
+)
+metrics_registry.callback(
+    "rag_llm_events_total", "LLM client calls, attempts, retries, timeouts, hedges and failures", ("event",),
+    lambda: {(event,): count for event, count in llm_client.stats().items() if isinstance(count, int)},
+    kind="counter",
+)
+metrics_registry.callback(
+    "rag_coalesced_requests_total", "Requests that shared another request's in-flight answer", (),
+    lambda: {(): coalescing_stats()["coalesced"]}, kind="counter",
+)
+metrics_registry.callback(
+    "rag_llm_circuit_open", "1 while the LLM circuit breaker is open", (),
+    lambda: {(): int(llm_client.breaker.state == "open")},
+)
+
+if FAST_BOOT:
+    warm_up(BACKENDS)
+else:
+    for backend in BACKENDS:
+        backend.get()
 
 # Enhanced system prompt with medical disclaimers
 enhanced_system_prompt = system_prompt + """
@@ -62,50 +323,150 @@ IMPORTANT GUIDELINES:
 MEDICAL DISCLAIMER: This information is for educational purposes only and should not replace professional medical advice, diagnosis, or treatment.
 """
 
-# Configure Gemini
-genai.configure(api_key=GEMINI_API_KEY)
-logger.info("Available Gemini models:")
-for m in genai.list_models():
-    if 'generateContent' in m.supported_generation_methods:
-        logger.info(f"Model: {m.name}")
+KB_ERROR_RESPONSE = "I apologize, but I'm experiencing technical difficulties with my medical knowledge base. For urgent health matters, please consult a healthcare professional directly."
+LLM_ERROR_RESPONSE = "I apologize, but I'm experiencing technical difficulties. Please try again or consult a healthcare professional for urgent matters."
+INCOMPLETE_RESPONSE = "My answer was cut off. Please ask again for the complete answer."
+DEGRADED_PREFIX = "I can't reach my language model right now, so here is what my medical reference says about your question:"
+
+GENERATION_CONFIG = {
+    "temperature": 0.2,
+    "max_output_tokens": 400,
+    "top_p": 0.8,
+    "top_k": 40
+}
+
+def extract_user_input(messages):
+    """Turn whatever the chain hands the LLM into the text sent to Gemini"""
+    if isinstance(messages, dict) and "input" in messages:
+        return messages["input"]
+    if isinstance(messages, list) and len(messages) > 0:
+        return messages[-1].content if hasattr(messages[-1], 'content') else str(messages[-1])
+    if hasattr(messages, "to_string"):
+        # Rendered prompt (system instructions + retrieved context + question)
+        return messages.to_string()
+    return str(messages)
+
+def degraded_answer(docs, max_passages=3, passage_tokens=100):
+    """Retrieval-only answer for when the LLM is unavailable"""
+    passages = [truncate_to_tokens(" ".join(doc.page_content.split()), passage_tokens) for doc in docs[:max_passages]]
+    if not passages:
+        return LLM_ERROR_RESPONSE
+    return (
+        DEGRADED_PREFIX + "\n\n" + "\n\n".join(f"- {passage}" for passage in passages)
+        + "\n\nPlease try again shortly for a complete answer, or consult a healthcare professional."
+    )
 
-gemini_model = genai.GenerativeModel("models/gemini-1.5-flash")
+def answer_outcome(raw_answer):
+    """llm for a model answer, degraded for a retrieval-only one, llm_error for the apology"""
+    text = raw_answer.strip()
+    if text == LLM_ERROR_RESPONSE:
+        return "llm_error"
+    if text.startswith(DEGRADED_PREFIX):
+        return "degraded"
+    return "llm"
+
+def chat_gemini_func(inputs):
+    """Answer from the packed context via the LLM client, degrading to the context alone"""
+    try:
+        prompt_value = format_prompt(inputs)
+        with span("llm"):
+            return llm_client.generate(extract_user_input(prompt_value), GENERATION_CONFIG)
+    except LLMUnavailable as e:
+        logger.error(f"LLM unavailable, answering from retrieved context: {e}")
+        return degraded_answer(inputs["context"])
+    except Exception as e:
+        logger.error(f"Gemini API error: {e}")
+        return LLM_ERROR_RESPONSE
 
-def chat_gemini_func(messages):
-    """Enhanced Gemini chat function with better error handling"""
+async def achat_gemini_func(inputs):
+    """Non-blocking variant of chat_gemini_func for the asyncio serving path"""
     try:
-        # Extract user input from messages
-        if isinstance(messages, dict) and "input" in messages:
-            user_input = messages["input"]
-        elif isinstance(messages, list) and len(messages) > 0:
-            user_input = messages[-1].content if hasattr(messages[-1], 'content') else str(messages[-1])
-        else:
-            user_input = str(messages)
-        
-        response = gemini_model.generate_content(
-            user_input,
-            generation_config={
-                "temperature": 0.2,
-                "max_output_tokens": 400,
-                "top_p": 0.8,
-                "top_k": 40
-            }
-        )
-        
-        return response.text if hasattr(response, "text") else str(response)
+        prompt_value = format_prompt(inputs)
+        with span("llm"):
+            return await llm_client.agenerate(extract_user_input(prompt_value), GENERATION_CONFIG)
+    except LLMUnavailable as e:
+        logger.error(f"LLM unavailable, answering from retrieved context: {e}")
+        return degraded_answer(inputs["context"])
     except Exception as e:
         logger.error(f"Gemini API error: {e}")
-        return "I apologize, but I'm experiencing technical difficulties. Please try again or consult a healthcare professional for urgent matters."
+        return LLM_ERROR_RESPONSE
+
+def stream_gemini_func(messages, docs=()):
+    """Yield Gemini output text pieces as they arrive"""
+    produced = False
+    start = time.perf_counter()
+    try:
+        for text in llm_client.stream(extract_user_input(messages), GENERATION_CONFIG):
+            if not produced:
+                record_stage("llm_first_token", start)
+            produced = True
+            yield text
+        record_stage("llm_stream", start)
+    except LLMUnavailable as e:
+        logger.error(f"LLM unavailable, answering from retrieved context: {e}")
+        yield degraded_answer(docs)
+    except Exception as e:
+        if produced:
+            # Part of the answer is out; the pipeline reports it as incomplete.
+            raise
+        logger.error(f"Gemini streaming error: {e}")
+        yield LLM_ERROR_RESPONSE
+
+async def astream_gemini_func(messages, docs=()):
+    """Async generator variant of stream_gemini_func"""
+    produced = False
+    start = time.perf_counter()
+    try:
+        async for text in llm_client.astream(extract_user_input(messages), GENERATION_CONFIG):
+            if not produced:
+                record_stage("llm_first_token", start)
+            produced = True
+            yield text
+        record_stage("llm_stream", start)
+    except LLMUnavailable as e:
+        logger.error(f"LLM unavailable, answering from retrieved context: {e}")
+        yield degraded_answer(docs)
+    except Exception as e:
+        if produced:
+            # Part of the answer is out; the pipeline reports it as incomplete.
+            raise
+        logger.error(f"Gemini streaming error: {e}")
+        yield LLM_ERROR_RESPONSE
 
 # Create prompt template
 prompt = ChatPromptTemplate.from_messages([
     ("system", enhanced_system_prompt),
+    MessagesPlaceholder("history", optional=True),
     ("human", "{input}"),
 ])
 
-# Create chains
-question_answer_chain = create_stuff_documents_chain(chat_gemini_func, prompt)
-rag_chain = create_retrieval_chain(retriever, question_answer_chain)
+# Retrieved chunks are merged, deduplicated and trimmed to
+# CONTEXT_TOKEN_BUDGET before they are stuffed into the prompt.
+CONTEXT_PACKING_ENABLED = os.environ.get("CONTEXT_PACKING_ENABLED", "1") == "1"
+context_packer = ContextPacker(
+    token_budget=int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1000")),
+    duplicate_threshold=float(os.environ.get("CONTEXT_DUPLICATE_THRESHOLD", "0.8")),
+)
+
+def pack_context(docs):
+    with span("context_packing"):
+        return context_packer.pack(docs) if CONTEXT_PACKING_ENABLED else docs
+
+def format_context(docs):
+    """Render documents the way create_stuff_documents_chain does"""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+def format_prompt(inputs):
+    with span("prompt_format"):
+        return prompt.invoke({**inputs, "context": format_context(inputs["context"])})
+
+# Create chains: pack -> prompt -> Gemini, the stuff-documents chain with
+# each step timed as its own stage. The LLM step keeps the packed context
+# for the retrieval-only answer served while the LLM is unavailable.
+question_answer_chain = (
+    RunnablePassthrough.assign(context=RunnableLambda(lambda inputs: pack_context(inputs["context"])))
+    | RunnableLambda(chat_gemini_func, afunc=achat_gemini_func)
+)
 
 @app.route("/")
 def home():
@@ -115,50 +476,59 @@ def home():
 def test():
     return jsonify({"status": "Flask medical bot is working!", "timestamp": datetime.datetime.now().isoformat()})
 
+@app.route("/stats")
+def stats():
+    """Cache and embedding counters for the hot path"""
+    data = {
+        "embedding_cache": embedding_cache.stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "precomputed_answers": precomputed_answers.stats(),
+        "context_packer": context_packer.stats(),
+    }
+    if embedder_backend.ready and hasattr(embedder_backend.get(), "stats"):
+        data["embedding_batcher"] = embedder_backend.get().stats()
+    if conversation_store is not None:
+        data["conversation_store"] = conversation_store.stats()
+    data["llm"] = llm_client.stats()
+    data["coalescing"] = coalescing_stats()
+    return jsonify(data)
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of request/stage latency and cache counters"""
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/health")
+def health():
+    """Readiness: 200 once every backend client is built, 503 while warming up"""
+    ready, backends = readiness(BACKENDS)
+    body = {"status": "ready" if ready else "starting", "backends": backends}
+    return jsonify(body), 200 if ready else 503
+
 # --- Enhanced Intent Detection ---
+# One precompiled pass over the message for all intents (see src/intent.py).
+# INTENT_PHRASES_PATH may point to a JSON file of extra phrases per intent.
+INTENT_PHRASES_PATH = os.environ.get("INTENT_PHRASES_PATH")
+intent_classifier = IntentClassifier(
+    phrases=load_intent_phrases(INTENT_PHRASES_PATH) if INTENT_PHRASES_PATH else None
+)
+
 def is_greeting(message):
     """Enhanced greeting detection with more patterns"""
-    greeting_patterns = [
-        r'\b(hi|hello|hey|hiya|howdy)\b',
-        r'\b(good\s+(morning|afternoon|evening|day))\b',
-        r'\b(greetings|salutations)\b',
-        r'^\s*(hi|hello|hey)[\s!.]*$'
-    ]
-    msg = message.lower().strip()
-    return any(re.search(pattern, msg) for pattern in greeting_patterns)
+    return intent_classifier.has_intent(message, "greeting")
 
 def is_farewell(message):
     """Enhanced farewell detection"""
-    farewell_patterns = [
-        r'\b(bye|goodbye|see\s+you|farewell|take\s+care|later)\b',
-        r'\b(thanks?\s+(and\s+)?bye|bye\s+thanks?)\b',
-        r'\b(have\s+a\s+(good|great|nice)\s+(day|evening|night))\b'
-    ]
-    msg = message.lower().strip()
-    return any(re.search(pattern, msg) for pattern in farewell_patterns)
+    return intent_classifier.has_intent(message, "farewell")
 
 def is_small_talk(message):
     """Enhanced small talk detection"""
-    small_talk_patterns = [
-        r'\b(how\s+are\s+you|how\s+you\s+doing|what\'?s\s+up)\b',
-        r'\b(how\'?s\s+it\s+going|how\'?s\s+everything)\b',
-        r'\b(nice\s+to\s+meet\s+you|pleased\s+to\s+meet)\b',
-        r'\b(thank\s*you|thanks|no\s+thank\s*you|no\s+thanks|nope|nah)\b',
-        r'\b(ok|okay|alright|fine|cool)\b'
-    ]
-    msg = message.lower().strip()
-    return any(re.search(pattern, msg) for pattern in small_talk_patterns)
+    return intent_classifier.has_intent(message, "small_talk")
 
 def is_emergency_keywords(message):
     """Detect emergency-related keywords"""
-    emergency_patterns = [
-        r'\b(emergency|urgent|critical|severe\s+pain)\b',
-        r'\b(can\'?t\s+breathe|difficulty\s+breathing|chest\s+pain)\b',
-        r'\b(heart\s+attack|stroke|seizure|overdose)\b',
-        r'\b(bleeding\s+heavily|unconscious|not\s+responding)\b'
-    ]
-    msg = message.lower().strip()
-    return any(re.search(pattern, msg) for pattern in emergency_patterns)
+    return intent_classifier.has_intent(message, "emergency")
 
 # --- Enhanced Response Functions ---
 def get_medical_greeting_response():
@@ -233,6 +603,17 @@ For urgent but non-emergency situations, please contact:
 
 I can provide general health information, but I cannot replace emergency medical care. Your safety is the top priority!"""
 
+MEDICAL_DISCLAIMER = "\n\n⚠️ Please consult with a healthcare professional for personalized medical advice."
+
+def medical_disclaimer(response_text):
+    """Disclaimer to append to a medical answer, or an empty string"""
+    medical_keywords = ['diagnosis', 'treatment', 'medication', 'disease', 'condition', 'symptoms']
+    lowered = response_text.lower()
+    if any(keyword in lowered for keyword in medical_keywords):
+        if "consult" not in lowered and "healthcare professional" not in lowered:
+            return MEDICAL_DISCLAIMER
+    return ""
+
 def sanitize_response(response_text):
     """Clean and format the response"""
     if not response_text:
@@ -242,14 +623,129 @@ def sanitize_response(response_text):
     response_text = response_text.strip()
     
     # Add medical disclaimer for medical advice
-    medical_keywords = ['diagnosis', 'treatment', 'medication', 'disease', 'condition', 'symptoms']
-    if any(keyword in response_text.lower() for keyword in medical_keywords):
-        if "consult" not in response_text.lower() and "healthcare professional" not in response_text.lower():
-            response_text += "\n\n⚠️ Please consult with a healthcare professional for personalized medical advice."
-    
-    return response_text
+    return response_text + medical_disclaimer(response_text)
+
+def quick_response(msg):
+    """Canned reply for emergencies, greetings, farewells and small talk, else None"""
+    # Emergency outranks every other intent, then greeting, farewell, small talk
+    with span("intent"):
+        intent = intent_classifier.classify(msg)
+    if intent == "emergency":
+        return get_emergency_response()
+    if intent == "greeting":
+        return get_medical_greeting_response()
+    if intent == "farewell":
+        return get_farewell_response()
+    if intent == "small_talk":
+        return get_small_talk_response()
+    return None
+
+def new_session_id():
+    session_id = uuid.uuid4().hex
+    if conversation_store is not None:
+        # Nothing can be stored under a fresh id, so its first turn skips the database.
+        conversation_store.start_session(session_id)
+    return session_id
+
+def get_session_id():
+    """Session id from the cookie; a new one is set on the response by set_session_cookie"""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        session_id = g.new_session_id = new_session_id()
+    return session_id
+
+@app.after_request
+def set_session_cookie(response):
+    session_id = g.pop("new_session_id", None)
+    if session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=SESSION_MAX_AGE, httponly=True, samesite="Lax")
+    return response
+
+def conversation_context(session_id, msg):
+    """
+    (retrieval query, history messages) for `msg`. Only follow-up questions
+    get history. The retrieval query also carries the last standalone
+    question when the follow-up refers back to it ("is it contagious?").
+    """
+    if conversation_store is None or not is_follow_up(msg):
+        return msg, []
+    with span("history"):
+        turns = conversation_store.recent_turns(session_id)
+        if not turns:
+            return msg, []
+        history = build_history(turns, HISTORY_TURNS, HISTORY_TOKEN_BUDGET)
+        if not refers_back(msg):
+            return msg, history
+        topic = next((q for q, _ in reversed(turns) if not is_follow_up(q)), turns[-1][0])
+        return f"{topic} {msg}", history
+
+def remember_turn(session_id, msg, raw_answer, final_response):
+    if conversation_store is not None and answer_outcome(raw_answer) == "llm":
+        conversation_store.record(session_id, msg, final_response)
+
+def lookup_cached_answer(msg, docs, history=None):
+    """Check the semantic answer cache; returns (answer or None, query vector, context key)"""
+    if not SEMANTIC_CACHE_ENABLED or history:
+        return None, None, None
+    with span("semantic_cache"):
+        context = context_signature(docs)
+        query_vector = embeddings.embed_query(msg)
+        return answer_cache.lookup(query_vector, context), query_vector, context
+
+async def alookup_cached_answer(msg, docs, history=None):
+    """Async variant of lookup_cached_answer; embedding runs off the event loop"""
+    if not SEMANTIC_CACHE_ENABLED or history:
+        return None, None, None
+    with span("semantic_cache"):
+        context = context_signature(docs)
+        query_vector = await embeddings.aembed_query(msg)
+        return answer_cache.lookup(query_vector, context), query_vector, context
+
+def lookup_precomputed(msg, history=None):
+    """Precomputed answer for a standalone question, or None"""
+    if not PRECOMPUTED_ENABLED or history:
+        return None
+    with span("precomputed"):
+        answer = precomputed_answers.lookup_text(msg)
+        if answer is None and len(precomputed_answers):
+            answer = precomputed_answers.lookup_vector(embeddings.embed_query(msg))
+        return answer
+
+async def alookup_precomputed(msg, history=None):
+    """Async variant of lookup_precomputed"""
+    if not PRECOMPUTED_ENABLED or history:
+        return None
+    with span("precomputed"):
+        answer = precomputed_answers.lookup_text(msg)
+        if answer is None and len(precomputed_answers):
+            answer = precomputed_answers.lookup_vector(await embeddings.aembed_query(msg))
+        return answer
+
+def store_cached_answer(msg, query_vector, context, raw_answer, final_response):
+    if SEMANTIC_CACHE_ENABLED and query_vector is not None and answer_outcome(raw_answer) == "llm":
+        with span("answer_cache_store"):
+            answer_cache.add(msg, query_vector, context, final_response)
+
+# /get and /stream here and in asgi.py all run this one pipeline (src/pipeline.py).
+pipeline = AnswerPipeline(
+    history=Stage.threaded(conversation_context),
+    precomputed=Stage(lookup_precomputed, alookup_precomputed),
+    retrieve=Stage(retriever.invoke, retriever.ainvoke),
+    cache_lookup=Stage(lookup_cached_answer, alookup_cached_answer),
+    generate=Stage(question_answer_chain.invoke, question_answer_chain.ainvoke),
+    llm_stream=Stage(stream_gemini_func, astream_gemini_func),
+    pack=pack_context,
+    format_prompt=format_prompt,
+    sanitize=sanitize_response,
+    disclaimer=medical_disclaimer,
+    outcome_of=answer_outcome,
+    store=store_cached_answer,
+    remember=Stage.threaded(remember_turn),
+    coalesce=COALESCE_ENABLED,
+)
 
 @app.route("/get", methods=["POST"])
+@tracer.traced("/get")
 def chat():
     """Enhanced chat endpoint with better error handling"""
     try:
@@ -259,49 +755,142 @@ def chat():
         
         logger.info(f"User input: {msg}")
         
-        # Check for emergency keywords first
-        if is_emergency_keywords(msg):
-            return get_emergency_response()
-        
-        # Handle different intents
-        if is_greeting(msg):
-            return get_medical_greeting_response()
-        
-        if is_farewell(msg):
-            return get_farewell_response()
-        
-        if is_small_talk(msg):
-            return get_small_talk_response()
+        canned = quick_response(msg)
+        if canned is not None:
+            set_outcome("canned")
+            return canned
         
         # Medical Q&A via RAG
         try:
-            response = rag_chain.invoke({"input": msg})
-            
-            # Handle different response formats
-            if isinstance(response, dict):
-                if "answer" in response:
-                    answer = response["answer"]
-                elif "output" in response:
-                    answer = response["output"]
-                else:
-                    answer = str(response)
-            else:
-                answer = str(response)
-            
-            # Sanitize and format the response
-            final_response = sanitize_response(answer)
-            logger.info(f"Generated response length: {len(final_response)}")
-            
-            return final_response
-            
+            return pipeline.respond(msg, get_session_id())
         except Exception as e:
             logger.error(f"Error in RAG chain: {e}")
-            return "I apologize, but I'm experiencing technical difficulties with my medical knowledge base. For urgent health matters, please consult a healthcare professional directly."
+            set_outcome("error")
+            return KB_ERROR_RESPONSE
     
     except Exception as e:
         logger.error(f"Unexpected error in chat endpoint: {e}")
+        set_outcome("error")
         return jsonify({"error": "An unexpected error occurred. Please try again."}), 500
 
+def sse_event(event, data):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/stream", methods=["POST"])
+def chat_stream():
+    """Streaming chat endpoint: forwards Gemini tokens as Server-Sent Events"""
+    msg = request.form.get("msg", "").strip()
+    if not msg:
+        return jsonify({"error": "Please enter a message"}), 400
+    
+    logger.info(f"User input (stream): {msg}")
+    session_id = get_session_id()
+
+    @tracer.traced("/stream")
+    def generate():
+        canned = quick_response(msg)
+        if canned is not None:
+            set_outcome("canned")
+            yield sse_event("token", canned)
+            yield sse_event("done", {})
+            return
+
+        try:
+            for piece in pipeline.stream(msg, session_id):
+                yield sse_event("token", piece)
+            yield sse_event("done", {})
+        except IncompleteAnswer:
+            yield sse_event("error", {"message": INCOMPLETE_RESPONSE})
+            yield sse_event("done", {})
+        except Exception as e:
+            logger.error(f"Error in streaming RAG chain: {e}")
+            set_outcome("error")
+            yield sse_event("token", KB_ERROR_RESPONSE)
+            yield sse_event("done", {})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def batch_cached_answer(msg, docs):
+    """(answer, outcome) from the precomputed tier or the semantic cache, else (None, None)"""
+    answer = lookup_precomputed(msg)
+    if answer is not None:
+        return answer, "precomputed"
+    answer, _, _ = lookup_cached_answer(msg, docs)
+    if answer is not None:
+        return answer, "cache"
+    return None, None
+
+def batch_generate(msg, docs):
+    # The query embedding is already cached by the batch embedding step.
+    query_vector = embeddings.embed_query(msg) if SEMANTIC_CACHE_ENABLED else None
+    args = (msg, docs, [], query_vector, context_signature(docs))
+    if pipeline.coalesce:
+        (_, final_response, outcome), _ = pipeline.inflight.do(
+            normalize_query(msg), pipeline.generate_from_docs, *args
+        )
+    else:
+        _, final_response, outcome = pipeline.generate_from_docs(*args)
+    return final_response, outcome
+
+batch_pipeline = BatchPipeline(
+    embed_many=embeddings.embed_queries,
+    retrieve=retriever.invoke,
+    cached_answer=batch_cached_answer,
+    generate=batch_generate,
+)
+
+def batch_runner(**overrides):
+    """A BatchRunner with the BATCH_* settings, sharing the server-wide LLM rate limit"""
+    settings = {**BATCH_SETTINGS, **overrides}
+    if "llm_rate_per_minute" not in overrides:
+        settings["limiter"] = batch_limiter
+    return BatchRunner(batch_pipeline, **settings)
+
+batch_jobs = BatchJobs(BATCH_JOBS_DIR, batch_runner, max_running=BATCH_MAX_RUNNING)
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    """Queue a JSONL file of questions as a background job; poll /batch/<id> for progress"""
+    upload = request.files.get("file")
+    lines = upload.stream.read().splitlines() if upload else request.get_data().splitlines()
+    try:
+        items = parse_items(lines)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid batch: {e}"}), 400
+    if not items:
+        return jsonify({"error": "No questions in batch"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Batch too large: at most {BATCH_MAX_ITEMS} questions"}), 413
+
+    job_id = batch_jobs.submit(items)
+    logger.info(f"Batch job {job_id}: {len(items)} questions queued")
+    status_url = url_for("batch_status", job_id=job_id)
+    return jsonify({
+        "id": job_id,
+        "total": len(items),
+        "status_url": status_url,
+        "results_url": url_for("batch_results", job_id=job_id),
+    }), 202, {"Location": status_url}
+
+@app.route("/batch/<job_id>", methods=["GET"])
+def batch_status(job_id):
+    status = batch_jobs.status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown batch job"}), 404
+    return jsonify(status)
+
+@app.route("/batch/<job_id>/results", methods=["GET"])
+def batch_results(job_id):
+    """The results written so far, one JSON line per answered question"""
+    if batch_jobs.status(job_id) is None:
+        return jsonify({"error": "Unknown batch job"}), 404
+    return Response(batch_jobs.read_results(job_id), mimetype="application/x-ndjson")
+
 @app.errorhandler(404)
 def not_found_error(error):
     return jsonify({"error": "Endpoint not found"}), 404
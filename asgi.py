@@ -0,0 +1,185 @@
+"""
+Asyncio serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+One process serves many concurrent chats: /get and /stream run the shared
+answer pipeline (src/pipeline.py) on the event loop with non-blocking
+retrieval and Gemini calls, share a single embedding model, and are
+admitted through a bounded limiter that answers 503 when the backlog is full. Every other route is served by the Flask app in app.py.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app,
+    INCOMPLETE_RESPONSE,
+    KB_ERROR_RESPONSE,
+    SESSION_COOKIE,
+    SESSION_MAX_AGE,
+    new_session_id,
+    pipeline,
+    quick_response,
+    sse_event,
+    tracer,
+)
+from src.concurrency import AsyncLimiter, Overloaded
+from src.metrics import set_outcome, span
+from src.pipeline import IncompleteAnswer
+
+logger = logging.getLogger(__name__)
+
+ASYNC_MAX_CONCURRENCY = int(os.environ.get("ASYNC_MAX_CONCURRENCY", "256"))
+ASYNC_MAX_QUEUE = int(os.environ.get("ASYNC_MAX_QUEUE", "512"))
+ASYNC_QUEUE_TIMEOUT = float(os.environ.get("ASYNC_QUEUE_TIMEOUT", "10"))
+
+limiter = AsyncLimiter(
+    max_concurrency=ASYNC_MAX_CONCURRENCY,
+    max_waiting=ASYNC_MAX_QUEUE,
+    wait_timeout=ASYNC_QUEUE_TIMEOUT,
+)
+
+BUSY_RESPONSE = {"error": "The assistant is busy right now. Please try again in a moment."}
+
+
+async def read_message(request):
+    body = await request.body()
+    return parse_qs(body.decode("utf-8")).get("msg", [""])[0].strip()
+
+
+def busy():
+    return JSONResponse(BUSY_RESPONSE, status_code=503, headers={"Retry-After": "1"})
+
+
+def session_of(request):
+    """(session id, True when it is new and must be set as a cookie)"""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if session_id:
+        return session_id, False
+    return new_session_id(), True
+
+
+def with_session_cookie(response, session_id, is_new):
+    if is_new:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=SESSION_MAX_AGE, httponly=True, samesite="lax")
+    return response
+
+
+@tracer.traced("/get")
+async def chat(request):
+    msg = await read_message(request)
+    if not msg:
+        return JSONResponse({"error": "Please enter a message"}, status_code=400)
+
+    logger.info(f"User input: {msg}")
+
+    canned = quick_response(msg)
+    if canned is not None:
+        set_outcome("canned")
+        return HTMLResponse(canned)
+
+    session_id, is_new = session_of(request)
+    try:
+        with span("queue_wait"):
+            await limiter.acquire()
+    except Overloaded:
+        set_outcome("rejected")
+        return busy()
+    try:
+        response = HTMLResponse(await pipeline.arespond(msg, session_id))
+        return with_session_cookie(response, session_id, is_new)
+    except Exception as e:
+        logger.error(f"Error in RAG chain: {e}")
+        set_outcome("error")
+        return HTMLResponse(KB_ERROR_RESPONSE)
+    finally:
+        limiter.release()
+
+
+async def chat_stream(request):
+    msg = await read_message(request)
+    if not msg:
+        return JSONResponse({"error": "Please enter a message"}, status_code=400)
+
+    logger.info(f"User input (stream): {msg}")
+
+    canned = quick_response(msg)
+    if canned is not None:
+        async def canned_events():
+            yield sse_event("token", canned)
+            yield sse_event("done", {})
+        return StreamingResponse(canned_events(), media_type="text/event-stream")
+
+    # Reject up front while headers can still carry a 503; the slot itself
+    # is taken inside the generator so it is always released with it.
+    if limiter.saturated():
+        limiter.rejected += 1
+        return busy()
+
+    session_id, is_new = session_of(request)
+
+    @tracer.traced("/stream")
+    async def events():
+        try:
+            with span("queue_wait"):
+                await limiter.acquire()
+        except Overloaded:
+            set_outcome("rejected")
+            yield sse_event("token", BUSY_RESPONSE["error"])
+            yield sse_event("done", {})
+            return
+        try:
+            async for piece in pipeline.astream(msg, session_id):
+                yield sse_event("token", piece)
+            yield sse_event("done", {})
+        except IncompleteAnswer:
+            yield sse_event("error", {"message": INCOMPLETE_RESPONSE})
+            yield sse_event("done", {})
+        except Exception as e:
+            logger.error(f"Error in streaming RAG chain: {e}")
+            set_outcome("error")
+            yield sse_event("token", KB_ERROR_RESPONSE)
+            yield sse_event("done", {})
+        finally:
+            limiter.release()
+
+    response = StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    return with_session_cookie(response, session_id, is_new)
+
+
+async def limiter_stats(request):
+    return JSONResponse(limiter.stats())
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Blocking backends (Pinecone client, CPU embedding) run in the default
+    # executor; size it so it is not the bottleneck below the limiter.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=ASYNC_MAX_CONCURRENCY, thread_name_prefix="rag-io")
+    )
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/get", chat, methods=["POST"]),
+        Route("/stream", chat_stream, methods=["POST"]),
+        Route("/stats/async", limiter_stats),
+        Mount("/", WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
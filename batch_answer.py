@@ -0,0 +1,86 @@
+"""
+Answer a JSONL file of questions offline, through the web app's own
+retriever, caches, prompt and LLM client (see src/batch.py).
+
+Each input line is {"id": ..., "question": ...}. Each result is appended to
+the output file as one JSON line as soon as it completes, and is flushed to
+disk. After a crash or Ctrl-C, running the same command again skips the ids
+already answered and retries those that failed or got a degraded answer.
+
+Usage:
+    python batch_answer.py questions.jsonl -o answers.jsonl
+    python batch_answer.py questions.jsonl -o answers.jsonl --rate 120 --llm-workers 8
+    python batch_answer.py questions.jsonl -o answers.jsonl --restart
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+from precompute_answers import serving_app
+from src.batch import COMPLETE_OUTCOMES, append_results, completed_ids, parse_items
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+def run_batch(input_path, output_path, restart=False, **settings):
+    """Answer the questions in `input_path` not yet answered in `output_path`; returns outcome counts"""
+    with open(input_path, "rb") as f:
+        items = parse_items(f)
+    if restart and os.path.exists(output_path):
+        os.remove(output_path)
+    done = completed_ids(output_path)
+    todo = [item for item in items if item["id"] not in done]
+    logger.info(f"{len(items)} questions, {len(items) - len(todo)} already answered, {len(todo)} to go")
+    if not todo:
+        return Counter()
+
+    runner = serving_app().batch_runner(**settings)
+    outcomes = Counter()
+    start = time.perf_counter()
+    for n, result in enumerate(append_results(runner.run(todo), output_path), start=1):
+        outcomes[result["outcome"]] += 1
+        if n % 50 == 0 or n == len(todo):
+            elapsed = time.perf_counter() - start
+            logger.info(f"{n}/{len(todo)} answered in {elapsed:.1f}s ({n / elapsed:.1f}/s)")
+    logger.info(f"Outcomes: {dict(outcomes)}")
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of {\"id\", \"question\"}")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file, appended to and resumed from")
+    parser.add_argument("--rate", type=float, default=float(os.environ.get("BATCH_LLM_RATE_PER_MIN", "60")),
+                        help="LLM calls started per minute (0 for no limit)")
+    parser.add_argument("--llm-workers", type=int, default=int(os.environ.get("BATCH_LLM_WORKERS", "4")))
+    parser.add_argument("--search-workers", type=int, default=int(os.environ.get("BATCH_SEARCH_WORKERS", "8")))
+    parser.add_argument("--embed-batch", type=int, default=int(os.environ.get("BATCH_EMBED_SIZE", "32")),
+                        help="questions embedded per forward pass")
+    parser.add_argument("--restart", action="store_true", help="discard earlier results and answer everything")
+    args = parser.parse_args()
+
+    try:
+        outcomes = run_batch(
+            args.input, args.output, restart=args.restart,
+            llm_rate_per_minute=args.rate,
+            llm_workers=args.llm_workers,
+            search_workers=args.search_workers,
+            embed_batch_size=args.embed_batch,
+        )
+    except ValueError as e:
+        logger.error(f"Invalid input: {e}")
+        sys.exit(2)
+    # Non-zero when something is left for a resumed run to retry.
+    sys.exit(0 if set(outcomes) <= COMPLETE_OUTCOMES else 1)
+
+
+if __name__ == "__main__":
+    main()
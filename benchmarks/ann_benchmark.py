@@ -0,0 +1,112 @@
+"""
+Recall@k and latency of the local vector index against brute-force search.
+
+By default builds synthetic clustered 384-dim vectors (MiniLM-sized). Pass
+--index-dir to benchmark an index built by store_index.py with
+VECTOR_BACKEND=local; queries are then perturbed copies of stored vectors.
+
+Usage:
+    python benchmarks/ann_benchmark.py --vectors 100000 --queries 200 --k 5
+    python benchmarks/ann_benchmark.py --index-dir vector_index
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.local_index import LocalVectorStore, normalize_rows
+
+
+class _NoEmbeddings:
+    """The benchmark works on raw vectors; the store never needs to embed."""
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+
+def synthetic_vectors(n, dim, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.normal(size=(clusters, dim)).astype(np.float32))
+    labels = rng.integers(clusters, size=n)
+    noise = rng.normal(scale=0.35, size=(n, dim)).astype(np.float32) / np.sqrt(dim) * 4
+    return normalize_rows(centers[labels] + noise)
+
+
+def build_store(vectors, quantization, directory, **kwargs):
+    store = LocalVectorStore(directory, _NoEmbeddings(), quantization=quantization, **kwargs)
+    store.add_vectors([str(i) for i in range(len(vectors))], vectors)
+    store.save()
+    return store
+
+
+def exact_top_k(vectors, queries, k):
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def measure(store, queries, truth, k):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        rows = [row for row, _ in store.search_by_vector(query, k)]
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & set(rows))
+    latencies = np.array(latencies) * 1000
+    return hits / (k * len(queries)), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--index-dir", help="benchmark an existing local index instead of synthetic data")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed + 1)
+    if args.index_dir:
+        existing = LocalVectorStore.load(args.index_dir, _NoEmbeddings())
+        _, _, vectors = existing._dense_vectors()
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim, args.clusters, args.seed)
+    picks = rng.choice(len(vectors), args.queries, replace=False)
+    queries = normalize_rows(vectors[picks] + rng.normal(scale=0.02, size=(args.queries, vectors.shape[1])))
+    queries = queries.astype(np.float32)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {args.queries} queries, k={args.k}")
+    print(f"{'configuration':28} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for quantization in ("none", "int8"):
+            # Brute force over the same storage format: an index too small for IVF.
+            exact = build_store(vectors, quantization, os.path.join(tmp, quantization + "-exact"),
+                                min_ivf_size=len(vectors) + 1)
+            recall, p50, p95 = measure(exact, queries, truth, args.k)
+            label = "float32" if quantization == "none" else "int8"
+            print(f"{'brute-force ' + label:28} {recall:>9.3f} {p50:>8.2f} {p95:>8.2f}")
+            store = build_store(vectors, quantization, os.path.join(tmp, quantization))
+            nlist = store.stats()["ivf_lists"]
+            if not nlist:
+                continue
+            for nprobe in args.nprobe:
+                store.nprobe = nprobe
+                recall, p50, p95 = measure(store, queries, truth, args.k)
+                name = f"ivf{nlist} nprobe={nprobe} {label}"
+                print(f"{name:28} {recall:>9.3f} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Concurrency check for request coalescing on /get.
+
+Boots the app in-process on stub backends with a slow LLM and the semantic
+answer cache off. It then fires --clients simultaneous /get requests for the
+same question, written with different case, spacing and punctuation, and
+counts the stub LLM's generate calls and the retrieval cache misses. With
+coalescing, one LLM call and one retrieval must serve every request. The
+same burst is repeated with coalescing off for comparison. The exit
+status is non-zero when the check fails.
+
+Usage:
+    python benchmarks/coalescing_check.py --mode sync --clients 32
+    python benchmarks/coalescing_check.py --mode async --clients 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VARIANTS = ["What is asthma?", "what is asthma", "What  is ASTHMA", "what is asthma ?!"]
+
+
+def boot(llm_latency_ms):
+    state = tempfile.mkdtemp(prefix="coalescing-")
+    os.environ.update({
+        "EMBEDDING_BACKEND": "stub",
+        "VECTOR_BACKEND": "stub",
+        "LLM_BACKEND": "stub",
+        "STUB_LLM_LATENCY_MS": str(llm_latency_ms),
+        "SEMANTIC_CACHE_ENABLED": "0",
+        "SEMANTIC_CACHE_PATH": os.path.join(state, "semantic_cache.json"),
+        "CHAT_HISTORY_DB": os.path.join(state, "chat_history.db"),
+        "FAST_BOOT": "0",
+    })
+    import app
+    import asgi
+
+    return app, asgi
+
+
+def burst_sync(app, clients):
+    barrier = threading.Barrier(clients)
+    bodies = [None] * clients
+
+    def client(i):
+        test_client = app.app.test_client()
+        barrier.wait()
+        bodies[i] = test_client.post("/get", data={"msg": VARIANTS[i % len(VARIANTS)]}).get_data(as_text=True)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return bodies
+
+
+def burst_async(asgi, clients):
+    import httpx
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/get", data={"msg": VARIANTS[i % len(VARIANTS)]}) for i in range(clients)
+            ))
+        return [response.text for response in responses]
+
+    return asyncio.run(run())
+
+
+def measure(app, asgi, mode, clients, enabled):
+    app.pipeline.coalesce = enabled
+    app.retrieval_cache.clear()
+    model = app.llm_backend.get()
+    llm_before, misses_before = model.calls, app.retrieval_cache.stats()["misses"]
+    coalesced_before = app.coalescing_stats()["coalesced"]
+    start = time.perf_counter()
+    bodies = burst_sync(app, clients) if mode == "sync" else burst_async(asgi, clients)
+    return {
+        "seconds": time.perf_counter() - start,
+        "llm_calls": model.calls - llm_before,
+        "retrievals": app.retrieval_cache.stats()["misses"] - misses_before,
+        "coalesced": app.coalescing_stats()["coalesced"] - coalesced_before,
+        "distinct_answers": len(set(bodies)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    app, asgi = boot(args.llm_latency_ms)
+    on = measure(app, asgi, args.mode, args.clients, enabled=True)
+    off = measure(app, asgi, args.mode, args.clients, enabled=False)
+
+    print(f"{args.clients} concurrent identical /get requests ({args.mode}), LLM latency {args.llm_latency_ms:.0f} ms")
+    print(f"{'coalescing':12} {'LLM calls':>9} {'retrievals':>10} {'coalesced':>9} {'answers':>7} {'seconds':>8}")
+    for name, r in (("on", on), ("off", off)):
+        print(f"{name:12} {r['llm_calls']:>9} {r['retrievals']:>10} {r['coalesced']:>9} "
+              f"{r['distinct_answers']:>7} {r['seconds']:>8.2f}")
+
+    ok = on["llm_calls"] == 1 and on["retrievals"] == 1 and on["coalesced"] == args.clients - 1
+    ok = ok and on["distinct_answers"] == 1
+    print("PASS: one backend call served every request" if ok else "FAIL: duplicate backend calls")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Prompt context size before and after the context packing stage.
+
+Chunks are produced by the ingestion splitter (1000 characters, 200 overlap)
+from --data-dir PDFs, or from synthetic pages built out of the stub corpus.
+Each question retrieves --k chunks by stub-embedding similarity, and the
+benchmark reports the estimated context tokens sent to the LLM with and
+without packing, plus the time spent packing.
+
+Usage:
+    python benchmarks/context_packing.py --k 5 --budget 1000
+    python benchmarks/context_packing.py --data-dir Data --k 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from src.context import ContextPacker
+from src.helper import iter_text_chunks, text_split
+from src.ingest import list_pdf_files
+from src.memory import estimate_tokens
+from src.stubs import STUB_CORPUS, StubEmbeddings
+
+QUESTIONS = [
+    "What are the symptoms of diabetes",
+    "How is hypertension treated",
+    "What are the side effects of ibuprofen",
+    "How does aspirin work",
+    "What causes iron deficiency anaemia",
+    "How is asthma managed",
+    "What are the signs of dehydration",
+    "What is a migraine",
+]
+
+
+def synthetic_chunks(pages, seed):
+    rng = random.Random(seed)
+    chunks = []
+    for page in range(pages):
+        passages = rng.sample(STUB_CORPUS, len(STUB_CORPUS))
+        doc = Document(page_content=" ".join(passages), metadata={"source": "synthetic.pdf", "page": page})
+        for index, chunk in enumerate(text_split([doc])):
+            chunk.metadata["chunk"] = index
+            chunks.append(chunk)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", help="split these PDFs instead of synthetic pages")
+    parser.add_argument("--pages", type=int, default=40, help="synthetic pages")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=1000, help="CONTEXT_TOKEN_BUDGET")
+    parser.add_argument("--threshold", type=float, default=0.8, help="CONTEXT_DUPLICATE_THRESHOLD")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.data_dir:
+        chunks = list(iter_text_chunks(list_pdf_files(args.data_dir)))
+    else:
+        chunks = synthetic_chunks(args.pages, args.seed)
+    embedder = StubEmbeddings()
+    vectors = np.array(embedder.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+
+    packer = ContextPacker(token_budget=args.budget, duplicate_threshold=args.threshold)
+    before, after, pack_ms = [], [], []
+    for question in QUESTIONS:
+        scores = vectors @ np.array(embedder.embed_query(question), dtype=np.float32)
+        docs = [chunks[i] for i in np.argsort(-scores)[: args.k]]
+        start = time.perf_counter()
+        packed = packer.pack(docs)
+        pack_ms.append((time.perf_counter() - start) * 1000)
+        before.append(sum(estimate_tokens(d.page_content) for d in docs))
+        after.append(sum(estimate_tokens(d.page_content) for d in packed))
+
+    stats = packer.stats()
+    print(f"{len(chunks)} chunks, {len(QUESTIONS)} questions, k={args.k}, budget={args.budget}")
+    print(f"context tokens/question   unpacked {statistics.mean(before):8.0f}   packed {statistics.mean(after):8.0f}")
+    print(f"token savings             {stats['token_savings']:.1%}")
+    print(f"merged chunks {stats['merged_chunks']}, dropped duplicates {stats['dropped_duplicates']}, "
+          f"truncated {stats['truncated']}, dropped for budget {stats['dropped_for_budget']}")
+    print(f"pack time p50 {statistics.median(pack_ms):.2f} ms, max {max(pack_ms):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+"""
+End-to-end benchmark: boot the server on stub backends, drive /get with a
+realistic message mix, and keep the results so versions can be compared.
+
+For each serving mode (uvicorn asgi:app, gunicorn app:app) the server is
+booted --boot-runs times in a fresh process on the stub embedder, vector
+store and LLM (src/stubs.py), with the latencies given below. Startup is
+timed to /test (process up) and to /health 200 (backends ready). The last
+boot then serves a seeded mix of greetings, small talk, emergencies,
+frequently asked medical questions and unique medical questions from
+benchmarks/data/messages.txt. The report covers throughput, p50/p95/p99
+latency overall and per message class, and the resident memory of each
+worker process, sampled from /proc during the run.
+
+Results are written to benchmarks/results/<time>-<git sha>.json. They are
+specific to the machine, so the directory is not tracked. Each run is
+compared with the newest earlier result that used the same settings on the
+same environment (Python, platform, CPU count and backends), or with
+--baseline. Results taken on a tree with uncommitted changes are only used
+with --allow-dirty-baseline. Throughput drops and latency, startup or
+memory increases beyond --tolerance percent are flagged, and
+--fail-on-regression turns them into a non-zero exit status.
+
+Usage:
+    python benchmarks/e2e_benchmark.py
+    python benchmarks/e2e_benchmark.py --modes async --requests 2000 --concurrency 200
+    python benchmarks/e2e_benchmark.py --mix greeting=0.3,medical_unique=0.7 --no-save
+    python benchmarks/e2e_benchmark.py --baseline benchmarks/results/20261017-101500-6e76709.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from load_test import ROOT, STUB_BACKENDS, free_port, percentile, post, start_server
+
+sys.path.insert(0, ROOT)
+
+from src.intent import IntentClassifier  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+MESSAGES_PATH = os.path.join(ROOT, "benchmarks", "data", "messages.txt")
+
+# Share of requests per message class. medical_faq repeats a few popular
+# questions (the caches and coalescing see them); medical_unique makes every
+# question distinct, so it always pays for retrieval and the LLM.
+DEFAULT_MIX = {
+    "greeting": 0.10,
+    "small_talk": 0.10,
+    "emergency": 0.05,
+    "medical_faq": 0.35,
+    "medical_unique": 0.40,
+}
+FAQ_SIZE = 5
+
+# Metric name -> True when higher is better.
+TRACKED_METRICS = {
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "ready_s": False,
+    "worker_rss_peak_mb": False,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown message class {name!r}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def message_pools(path=MESSAGES_PATH):
+    """Messages from `path` grouped by class, using the app's own intent engine"""
+    classifier = IntentClassifier()
+    pools = {name: [] for name in ("greeting", "small_talk", "emergency", "medical")}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            message = line.strip()
+            if not message:
+                continue
+            intent = classifier.classify(message)
+            if intent == "farewell":
+                intent = "small_talk"
+            pools[intent or "medical"].append(message)
+    return pools
+
+
+def build_workload(mix, requests, seed):
+    """[(message class, message)], the same for the same mix, size and seed"""
+    rng = random.Random(seed)
+    pools = message_pools()
+    faq = pools["medical"][:FAQ_SIZE]
+    classes = rng.choices(list(mix), weights=list(mix.values()), k=requests)
+    workload = []
+    for i, name in enumerate(classes):
+        if name == "medical_faq":
+            message = rng.choice(faq)
+        elif name == "medical_unique":
+            message = f"{rng.choice(pools['medical'])} (case {i})"
+        else:
+            message = rng.choice(pools[name])
+        workload.append((name, message))
+    return workload
+
+
+def process_tree(pid):
+    """`pid` and its direct children (the gunicorn workers), from /proc"""
+    children = []
+    for stat_path in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(stat_path) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat_path.split("/")[2]))
+    return pid, children
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler(threading.Thread):
+    """Peak RSS per worker process while the load runs; empty without /proc (Linux only)"""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peaks = {}
+        self.stopped = threading.Event()
+
+    def workers(self):
+        master, children = process_tree(self.pid)
+        return children or [master]
+
+    def sample(self):
+        for pid in self.workers():
+            rss = rss_mb(pid)
+            if rss is not None:
+                self.peaks[pid] = max(rss, self.peaks.get(pid, 0.0))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sample()
+
+
+def wait_for(url, deadline):
+    """Poll `url` until it answers 200; False at the deadline"""
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def boot(args, mode):
+    """(server process, base url, {"up_s", "ready_s"})"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.monotonic()
+    server = start_server(argparse.Namespace(**{**vars(args), "mode": mode}), port)
+    deadline = start + args.boot_timeout
+    if not wait_for(f"{base_url}/test", deadline):
+        stop(server)
+        raise RuntimeError(f"{mode} server did not come up")
+    up = time.monotonic() - start
+    if not wait_for(f"{base_url}/health", deadline):
+        stop(server)
+        raise RuntimeError(f"{mode} server backends did not become ready")
+    return server, base_url, {"up_s": up, "ready_s": time.monotonic() - start}
+
+
+def stop(server):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def latency_summary(latencies):
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": (statistics.mean(latencies) * 1000) if latencies else 0.0,
+    }
+
+
+def drive(base_url, workload, concurrency, timeout):
+    url = f"{base_url}/get"
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda item: post(url, item[1], timeout), workload))
+    elapsed = time.perf_counter() - start
+
+    ok = [latency for status, latency in results if status == 200]
+    summary = {
+        "requests": len(workload),
+        "ok": len(ok),
+        "rejected_503": sum(1 for status, _ in results if status == 503),
+        "errors": sum(1 for status, _ in results if status not in (200, 503)),
+        "seconds": elapsed,
+        "throughput_rps": len(ok) / elapsed,
+        **latency_summary(ok),
+        "by_class": {},
+    }
+    for name in sorted({name for name, _ in workload}):
+        latencies = [
+            latency for (cls, _), (status, latency) in zip(workload, results) if cls == name and status == 200
+        ]
+        summary["by_class"][name] = {"count": sum(1 for cls, _ in workload if cls == name), **latency_summary(latencies)}
+    return summary
+
+
+def run_mode(args, mode, workload):
+    startups = []
+    for run in range(args.boot_runs):
+        server, base_url, startup = boot(args, mode)
+        startups.append(startup)
+        if run < args.boot_runs - 1:
+            stop(server)
+    try:
+        sampler = MemorySampler(server.pid)
+        # Sample once before the load for the idle footprint.
+        idle = {pid: rss_mb(pid) for pid in sampler.workers()}
+        sampler.start()
+        result = drive(base_url, workload, args.concurrency, args.timeout)
+        sampler.stop()
+    finally:
+        stop(server)
+
+    idle_values = [rss for rss in idle.values() if rss is not None]
+    peaks = list(sampler.peaks.values())
+    result.update({
+        "mode": mode,
+        "workers": len(idle),
+        "up_s": statistics.median(s["up_s"] for s in startups),
+        "ready_s": statistics.median(s["ready_s"] for s in startups),
+        "worker_rss_idle_mb": statistics.mean(idle_values) if idle_values else None,
+        "worker_rss_peak_mb": max(peaks) if peaks else None,
+    })
+    return result
+
+
+def git_version():
+    def git(*cmd):
+        out = subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() if out.returncode == 0 else ""
+
+    return {"sha": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def run_config(args, mix):
+    """Settings that must match for two results of a mode to be comparable"""
+    return {
+        "workers": args.workers,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "mix": mix,
+        "seed": args.seed,
+        "embed_latency_ms": args.embed_latency_ms,
+        "retrieval_latency_ms": args.retrieval_latency_ms,
+        "llm_latency_ms": args.llm_latency_ms,
+        "cache": args.cache,
+    }
+
+
+def run_environment():
+    """The machine and backends a result was measured on; results only compare within one"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "backends": {name.removesuffix("_BACKEND").lower(): value for name, value in STUB_BACKENDS.items()},
+    }
+
+
+def find_baselines(config, environment, modes, exclude=None, allow_dirty=False):
+    """{mode: (report, result)} from the newest saved results with the same config and environment"""
+    found = {}
+    for path in sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")), reverse=True):
+        if exclude and os.path.abspath(path) == os.path.abspath(exclude):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if report.get("config") != config or report.get("environment") != environment:
+            continue
+        if report.get("version", {}).get("dirty", True) and not allow_dirty:
+            continue
+        for result in report["results"]:
+            if result["mode"] in modes:
+                found.setdefault(result["mode"], (report, result))
+    return found
+
+
+def compare(report, baselines, tolerance):
+    """Print metric changes against {mode: (report, result)}; returns the regressions found"""
+    regressions = []
+    for result in report["results"]:
+        if result["mode"] not in baselines:
+            continue
+        baseline, old = baselines[result["mode"]]
+        print(f"\n{result['mode']} vs. {baseline['version']['sha']}"
+              f"{' (dirty)' if baseline['version']['dirty'] else ''} from {baseline['timestamp']}")
+        print(f"{'metric':20} {'baseline':>10} {'current':>10} {'change':>8}")
+        for metric, higher_is_better in TRACKED_METRICS.items():
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressions.append((result["mode"], metric, change))
+            print(f"{metric:20} {before:>10.1f} {after:>10.1f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def print_report(report):
+    print(f"{report['config']['requests']} requests at concurrency {report['config']['concurrency']}, "
+          f"stub latency embed/retrieval/LLM "
+          f"{report['config']['embed_latency_ms']:.0f}/{report['config']['retrieval_latency_ms']:.0f}/"
+          f"{report['config']['llm_latency_ms']:.0f} ms")
+    print(f"{'mode':6} {'workers':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'up s':>6} {'ready s':>7} {'RSS idle':>9} {'RSS peak':>9}")
+    for r in report["results"]:
+        idle = f"{r['worker_rss_idle_mb']:.0f} MB" if r["worker_rss_idle_mb"] else "n/a"
+        peak = f"{r['worker_rss_peak_mb']:.0f} MB" if r["worker_rss_peak_mb"] else "n/a"
+        print(f"{r['mode']:6} {r['workers']:>7} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['errors'] + r['rejected_503']:>6} {r['up_s']:>6.2f} {r['ready_s']:>7.2f} "
+              f"{idle:>9} {peak:>9}")
+    for r in report["results"]:
+        print(f"\n{r['mode']} by message class:")
+        print(f"  {'class':16} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name, c in r["by_class"].items():
+            print(f"  {name:16} {c['count']:>6} {c['p50_ms']:>8.1f} {c['p95_ms']:>8.1f} {c['p99_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=["async", "sync"], default=["async", "sync"])
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers in sync mode")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="class=weight,... over " + ", ".join(DEFAULT_MIX))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embed-latency-ms", type=float, default=5)
+    parser.add_argument("--retrieval-latency-ms", type=float, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--boot-runs", type=int, default=3, help="boots per mode; startup is their median")
+    parser.add_argument("--boot-timeout", type=float, default=120)
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--baseline", help="result file to compare with (default: newest matching result)")
+    parser.add_argument("--tolerance", type=float, default=10, help="percent change flagged as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--allow-dirty-baseline", action="store_true",
+                        help="also compare with results taken on a tree with uncommitted changes")
+    parser.add_argument("--no-save", action="store_true", help="do not write the result file")
+    args = parser.parse_args()
+
+    workload = build_workload(args.mix, args.requests, args.seed)
+    config = run_config(args, args.mix)
+    environment = run_environment()
+    version = git_version()
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "version": version,
+        "environment": environment,
+        "config": config,
+        "results": [run_mode(args, mode, workload) for mode in args.modes],
+    }
+    print_report(report)
+
+    path = None
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{version['sha']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved {os.path.relpath(path, ROOT)}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("version", {}).get("dirty", True) and not args.allow_dirty_baseline:
+            sys.exit(f"{args.baseline} was taken on a tree with uncommitted changes; "
+                     f"pass --allow-dirty-baseline to compare with it anyway")
+        if baseline.get("config") != config:
+            print("Note: the baseline was run with different settings")
+        if baseline.get("environment") != environment:
+            print("Note: the baseline was run on a different environment")
+        baselines = {r["mode"]: (baseline, r) for r in baseline["results"]}
+    else:
+        baselines = find_baselines(config, environment, args.modes, exclude=path,
+                                   allow_dirty=args.allow_dirty_baseline)
+    if not baselines:
+        print("No earlier result from a clean tree with the same settings and environment to compare with")
+        return
+    regressions = compare(report, baselines, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0f}%")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Query-embedding throughput at different batch sizes.
+
+Measures two things for all-MiniLM-L6-v2:
+  * direct batches: embed_documents() over fixed-size batches (upper bound)
+  * micro-batching: many threads calling embed_query() concurrently through
+    BatchingEmbeddings, which is how the /get workers use the model
+
+Usage:
+    python benchmarks/embedding_throughput.py --queries 512 --batch-sizes 1 8 32 64
+    python benchmarks/embedding_throughput.py --device cpu --quantize
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embeddings import BatchingEmbeddings, select_device
+from src.helper import download_hugging_face_embeddings
+
+SAMPLE_QUESTIONS = [
+    "What are the symptoms of diabetes?",
+    "How does aspirin reduce inflammation?",
+    "What is the normal range for blood pressure?",
+    "Explain the mechanism of action of metformin",
+    "What causes iron deficiency anemia?",
+    "How is hypertension treated?",
+    "What are the side effects of ibuprofen?",
+    "What is acne and how is it treated?",
+]
+
+
+def make_queries(n):
+    return [f"{SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]} ({i})" for i in range(n)]
+
+
+def bench_direct(embeddings, queries, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        embeddings.embed_documents(queries[i:i + batch_size])
+    return len(queries) / (time.perf_counter() - start)
+
+
+def bench_microbatch(embeddings, queries, batch_size, threads, max_wait_ms):
+    batcher = BatchingEmbeddings(embeddings, max_batch_size=batch_size, max_wait_ms=max_wait_ms)
+    batcher.embed_query("warm up")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(batcher.embed_query, queries))
+    qps = len(queries) / (time.perf_counter() - start)
+    return qps, batcher.stats()["avg_batch_size"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--threads", type=int, default=64, help="concurrent callers for micro-batching")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--device", default=None, help="cpu, cuda, mps or auto")
+    parser.add_argument("--quantize", action="store_true", help="int8 dynamic quantization (CPU only)")
+    args = parser.parse_args()
+
+    device = select_device(args.device)
+    embeddings = download_hugging_face_embeddings(device=device, quantize=args.quantize)
+    embeddings.embed_documents(["warm up"])
+    queries = make_queries(args.queries)
+
+    print(f"device={device} quantize={args.quantize} queries={args.queries} threads={args.threads}")
+    print(f"{'batch':>6} {'direct q/s':>12} {'micro q/s':>12} {'avg batch':>10}")
+    for batch_size in args.batch_sizes:
+        direct = bench_direct(embeddings, queries, batch_size)
+        micro, avg_batch = bench_microbatch(embeddings, queries, batch_size, args.threads, args.max_wait_ms)
+        print(f"{batch_size:>6} {direct:>12.1f} {micro:>12.1f} {avg_batch:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Local stand-in for an LLM endpoint with configurable latency and faults.
+
+It speaks the protocol of src.llm.HTTPGenerativeModel: POST /generate with
+{"prompt", "generation_config", "stream"} answers {"text": ...}, or one JSON
+object per line (chunked) when streaming. Faults can be changed while it
+runs by POSTing any of the options below as JSON to /control; GET /stats
+reports requests served, faults injected and TCP connections accepted (so
+connection reuse is visible).
+
+    python benchmarks/fake_llm_server.py --port 8765 --latency-ms 300 --tail-rate 0.05 --error-rate 0.1
+    LLM_BACKEND=http LLM_HTTP_URL=http://127.0.0.1:8765/generate python app.py
+    curl -X POST localhost:8765/control -d '{"down": true}'
+
+Options: latency_ms (median), jitter (lognormal sigma), tail_rate/tail_ms
+(slow responses), error_rate (HTTP 503), hang_rate/hang_ms (stalls past any
+sane timeout), down (every request fails with 503), tokens (stream pieces).
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_FAULTS = {
+    "latency_ms": 200.0,
+    "jitter": 0.25,
+    "tail_rate": 0.0,
+    "tail_ms": 3000.0,
+    "error_rate": 0.0,
+    "hang_rate": 0.0,
+    "hang_ms": 60000.0,
+    "down": False,
+    "tokens": 20,
+}
+
+
+class FakeLLMServer:
+    """Threaded HTTP server; `start()` runs it in the background and returns the /generate URL."""
+
+    def __init__(self, host="127.0.0.1", port=0, seed=None, **faults):
+        self.faults = dict(DEFAULT_FAULTS, **faults)
+        self.counts = dict.fromkeys(("requests", "errors", "hangs", "slow", "connections"), 0)
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/generate"
+
+    def configure(self, **faults):
+        with self._lock:
+            self.faults.update(faults)
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _plan(self):
+        """(status, delay seconds) for the next request"""
+        with self._lock:
+            faults = dict(self.faults)
+            roll, noise = self._random.random(), self._random.gauss(0, faults["jitter"])
+        self._count("requests")
+        if faults["down"] or roll < faults["error_rate"]:
+            self._count("errors")
+            return 503, 0.0
+        roll -= faults["error_rate"]
+        if roll < faults["hang_rate"]:
+            self._count("hangs")
+            return 200, faults["hang_ms"] / 1000
+        roll -= faults["hang_rate"]
+        if roll < faults["tail_rate"]:
+            self._count("slow")
+            return 200, faults["tail_ms"] / 1000
+        return 200, faults["latency_ms"] / 1000 * math.exp(noise)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                server._count("connections")
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client timed out or hedged and hung up.
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    with server._lock:
+                        self._json(200, {"counts": dict(server.counts), "faults": dict(server.faults)})
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path == "/control":
+                    server.configure(**body)
+                    self._json(200, dict(server.faults))
+                    return
+                if self.path != "/generate":
+                    self._json(404, {"error": "not found"})
+                    return
+                status, delay = server._plan()
+                if status != 200:
+                    self._json(status, {"error": "model overloaded"})
+                    return
+                question = str(body.get("prompt", "")).rsplit("Human:", 1)[-1].strip()[:120]
+                text = f"Fake answer about: {question}. Symptoms should be reviewed by a clinician."
+                if not body.get("stream"):
+                    time.sleep(delay)
+                    self._json(200, {"text": text})
+                    return
+                words = text.split(" ")
+                size = max(1, math.ceil(len(words) / server.faults["tokens"]))
+                pieces = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(delay / 3)
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(delay * 2 / 3 / max(1, len(pieces) - 1))
+                    self._chunk(json.dumps({"text": piece}).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int)
+    for name, default in DEFAULT_FAULTS.items():
+        if isinstance(default, bool):
+            parser.add_argument(f"--{name.replace('_', '-')}", action="store_true")
+        else:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = vars(parser.parse_args())
+    host, port, seed = args.pop("host"), args.pop("port"), args.pop("seed")
+    server = FakeLLMServer(host, port, seed=seed, **args)
+    print(f"Fake LLM listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
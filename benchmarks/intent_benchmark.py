@@ -0,0 +1,91 @@
+"""
+Per-message cost of intent classification.
+
+Compares the original chain of is_* checks (four functions, each rebuilding
+its pattern list and lowercasing the message) with the precompiled
+single-pass IntentClassifier, over a corpus of real chat messages. It then
+grows the configured phrase lists to show how cost scales with them.
+
+Usage:
+    python benchmarks/intent_benchmark.py
+    python benchmarks/intent_benchmark.py --corpus my_messages.txt --repeat 200
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.intent import DEFAULT_PATTERNS, INTENT_PRIORITY, IntentClassifier
+
+
+def legacy_classify(message):
+    """The pre-engine behaviour: one re.search per pattern, per intent, in order."""
+    for intent in INTENT_PRIORITY:
+        patterns = list(DEFAULT_PATTERNS[intent])
+        msg = message.lower().strip()
+        if any(re.search(pattern, msg) for pattern in patterns):
+            return intent
+    return None
+
+
+def legacy_with_phrases(phrases):
+    compiled = {i: [r"\b" + re.escape(p) + r"\b" for p in phrases.get(i, [])] for i in INTENT_PRIORITY}
+
+    def classify(message):
+        for intent in INTENT_PRIORITY:
+            msg = message.lower().strip()
+            if any(re.search(p, msg) for p in DEFAULT_PATTERNS[intent] + compiled[intent]):
+                return intent
+        return None
+    return classify
+
+
+def random_phrases(n, seed=0):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8))) for _ in range(n * 2)]
+    return [" ".join(rng.sample(words, rng.randint(1, 3))) for _ in range(n)]
+
+
+def time_per_message(fn, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            fn(message)
+    return (time.perf_counter() - start) / (repeat * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "data", "messages.txt"))
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--phrase-counts", type=int, nargs="+", default=[0, 10, 100, 1000])
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        messages = [line.rstrip("\n") for line in f if line.strip()]
+
+    engine = IntentClassifier()
+    mismatches = [m for m in messages if legacy_classify(m) != engine.classify(m)]
+    print(f"{len(messages)} messages, {len(mismatches)} classification differences")
+    for m in mismatches[:10]:
+        print(f"  differs: {m!r}: legacy={legacy_classify(m)} engine={engine.classify(m)}")
+
+    print(f"{'extra phrases':>14} {'legacy us/msg':>14} {'engine us/msg':>14} {'speedup':>8}")
+    for count in args.phrase_counts:
+        phrases = {intent: random_phrases(count, seed=i) for i, intent in enumerate(INTENT_PRIORITY)} if count else {}
+        legacy = legacy_with_phrases(phrases) if count else legacy_classify
+        engine = IntentClassifier(phrases=phrases)
+        repeat = max(1, args.repeat // max(1, count // 10))
+        legacy_us = time_per_message(legacy, messages, repeat)
+        engine_us = time_per_message(engine.classify, messages, args.repeat)
+        print(f"{count:>14} {legacy_us:>14.2f} {engine_us:>14.2f} {legacy_us / engine_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+LLM client behaviour under latency tails, errors, hangs and an outage.
+
+Starts benchmarks/fake_llm_server.py in-process and sends the same workload
+through src.llm.LLMClient with different settings, reporting per run the
+share of calls answered, latency percentiles, how many requests reached the
+server and over how many TCP connections (connection reuse).
+
+    tail     5% of responses take --tail-ms: plain vs. hedged requests
+    flaky    20% of responses are HTTP 503: no retries vs. jittered retries
+    hang     2% of requests never answer: deadline alone vs. deadline + retry
+    outage   every request fails: how fast the breaker sheds load
+
+Usage:
+    python benchmarks/llm_resilience.py
+    python benchmarks/llm_resilience.py --requests 400 --concurrency 16 --latency-ms 150
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm_server import FakeLLMServer
+from src.backends import LazyBackend
+from src.llm import CircuitBreaker, HTTPGenerativeModel, LLMClient
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def run(server, client, faults, requests, concurrency):
+    server.configure(**faults)
+    before = dict(server.counts)
+    stats_before = client.stats()
+
+    def call(i):
+        start = time.perf_counter()
+        try:
+            client.generate(f"Human: question {i}")
+            ok = True
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies = [seconds * 1000 for _, seconds in results]
+    stats = client.stats()
+    return {
+        "ok": sum(ok for ok, _ in results) / len(results),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "elapsed": elapsed,
+        "server_requests": server.counts["requests"] - before["requests"],
+        "connections": server.counts["connections"] - before["connections"],
+        "retries": stats["retries"] - stats_before["retries"],
+        "hedges": stats["hedges"] - stats_before["hedges"],
+        "rejected": stats["rejected"] - stats_before["rejected"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--tail-ms", type=float, default=2000)
+    parser.add_argument("--timeout", type=float, default=5.0, help="LLM_TIMEOUT for every run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    healthy = dict(latency_ms=args.latency_ms, tail_rate=0.0, error_rate=0.0, hang_rate=0.0, down=False)
+    plain = dict(timeout=args.timeout, max_retries=0)
+    retrying = dict(timeout=args.timeout, max_retries=2, backoff_base=0.05, backoff_max=0.5)
+    scenarios = [
+        ("tail", "timeout only", plain, dict(tail_rate=0.05, tail_ms=args.tail_ms)),
+        ("tail", "hedged at p95", dict(plain, hedge=True), dict(tail_rate=0.05, tail_ms=args.tail_ms)),
+        ("flaky", "no retries", plain, dict(error_rate=0.2)),
+        ("flaky", "2 retries + jitter", retrying, dict(error_rate=0.2)),
+        ("hang", "deadline 1s", dict(plain, timeout=1.0), dict(hang_rate=0.02, hang_ms=10000)),
+        ("hang", "deadline 1s + retries", dict(retrying, timeout=1.0), dict(hang_rate=0.02, hang_ms=10000)),
+        ("outage", "retries, no breaker", dict(retrying, breaker=CircuitBreaker(10 ** 9)), dict(down=True)),
+        ("outage", "retries + breaker", dict(retrying, breaker=CircuitBreaker(5, 30.0)), dict(down=True)),
+    ]
+
+    server = FakeLLMServer(seed=args.seed)
+    server.start()
+    print(f"{args.requests} calls, concurrency {args.concurrency}, "
+          f"server latency {args.latency_ms:.0f} ms, timeout {args.timeout:.1f}s")
+    print(f"{'scenario':8} {'client':24} {'ok':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'server req':>10} {'conns':>6} {'retries':>7} {'hedges':>6} {'shed':>5}")
+    try:
+        for scenario, name, client_options, faults in scenarios:
+            model = HTTPGenerativeModel(server.url, pool_size=args.concurrency)
+            client = LLMClient(LazyBackend("llm", lambda: model), max_workers=args.concurrency * 2, **client_options)
+            # Hedging needs a latency history, so each run starts with a warm-up.
+            run(server, client, healthy, 30, args.concurrency)
+            r = run(server, client, dict(healthy, **faults), args.requests, args.concurrency)
+            model.close()
+            print(f"{scenario:8} {name:24} {r['ok']:>6.1%} {r['p50']:>8.0f} {r['p95']:>8.0f} {r['p99']:>8.0f} "
+                  f"{r['server_requests']:>10} {r['connections']:>6} {r['retries']:>7} {r['hedges']:>6} "
+                  f"{r['rejected']:>5}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Load test for /get against local stub backends.
+
+Boots the server in a subprocess with EMBEDDING_BACKEND, VECTOR_BACKEND and
+LLM_BACKEND set to "stub" (see src/stubs.py), then drives /get with many
+concurrent clients and reports throughput and latency percentiles.
+
+Usage:
+    # asyncio mode: one uvicorn process
+    python benchmarks/load_test.py --mode async --concurrency 200 --requests 2000
+    # classic mode: gunicorn sync workers, for comparison
+    python benchmarks/load_test.py --mode sync --workers 4 --concurrency 200
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What are the symptoms of diabetes",
+    "How is hypertension treated",
+    "What are the side effects of ibuprofen",
+    "How does aspirin work",
+    "What causes iron deficiency anaemia",
+    "What is acne",
+    "How is asthma managed",
+    "What are the signs of dehydration",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# Backends the benchmark servers run on.
+STUB_BACKENDS = {"EMBEDDING_BACKEND": "stub", "VECTOR_BACKEND": "stub", "LLM_BACKEND": "stub"}
+
+
+def stub_env(args):
+    # Fresh state per boot: the server starts with empty answer caches and
+    # never writes to the repo's chat history or precomputed answers.
+    state = tempfile.mkdtemp(prefix="load-test-")
+    env = dict(os.environ)
+    env.update(STUB_BACKENDS)
+    env.update({
+        "STUB_EMBED_LATENCY_MS": str(args.embed_latency_ms),
+        "STUB_RETRIEVAL_LATENCY_MS": str(args.retrieval_latency_ms),
+        "STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "SEMANTIC_CACHE_ENABLED": "1" if args.cache else "0",
+        "SEMANTIC_CACHE_PATH": os.path.join(state, "semantic_cache.json"),
+        "CHAT_HISTORY_DB": os.path.join(state, "chat_history.db"),
+        "PRECOMPUTED_ANSWERS_PATH": os.path.join(state, "precomputed_answers.json"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    return env
+
+
+def start_server(args, port):
+    if args.mode == "async":
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}",
+               "-w", str(args.workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=ROOT, env=stub_env(args),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_up(base_url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/test", timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.1)
+    raise RuntimeError("server did not come up")
+
+
+def post(url, message, timeout):
+    data = urllib.parse.urlencode({"msg": message}).encode()
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, data=data, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = None
+    return status, time.perf_counter() - start
+
+
+def run_load(base_url, args):
+    url = f"{base_url}/get"
+    # Unique suffixes defeat the exact-match caches so every request does
+    # the full retrieval + LLM round trip unless --repeat-questions is set.
+    messages = [
+        QUESTIONS[i % len(QUESTIONS)] + ("" if args.repeat_questions else f" (case {i})")
+        for i in range(args.requests)
+    ]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda m: post(url, m, args.timeout), messages))
+    elapsed = time.perf_counter() - start
+
+    ok = [latency for status, latency in results if status == 200]
+    return {
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "ok": len(ok),
+        "rejected_503": sum(1 for status, _ in results if status == 503),
+        "errors": sum(1 for status, _ in results if status not in (200, 503)),
+        "throughput_rps": len(ok) / elapsed,
+        "p50_ms": percentile(ok, 50) * 1000,
+        "p95_ms": percentile(ok, 95) * 1000,
+        "p99_ms": percentile(ok, 99) * 1000,
+        "mean_ms": (statistics.mean(ok) * 1000) if ok else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers in sync mode")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--embed-latency-ms", type=float, default=5)
+    parser.add_argument("--retrieval-latency-ms", type=float, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--repeat-questions", action="store_true", help="send identical questions")
+    parser.add_argument("--url", help="drive an already running server instead of booting one")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(args, port)
+    try:
+        wait_until_up(base_url)
+        print(json.dumps(run_load(base_url, args), indent=2))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Retrieval quality vs. latency for each retrieval configuration.
+
+Runs every question of a labeled set through AdaptiveRetriever under several
+configurations (plain top-k, MMR, adaptive k, optional cross-encoder) and
+reports per configuration:
+
+    recall     share of labeled evidence phrases found in the retrieved chunks
+    overlap    share of the reference answer's content words found there
+    chunks     mean number of chunks returned (prompt size)
+    p50/p95    retrieval latency, query embedding included
+
+The labeled set is JSONL: {"question", "evidence": [phrases], "answer"}.
+By default the questions in benchmarks/data/retrieval_eval.jsonl are run
+against a synthetic local index built from the stub corpus with stub
+embeddings. Point --index-dir at an index built with VECTOR_BACKEND=local
+(and --embeddings huggingface) with a labeled set for the real corpus to tune
+production settings.
+
+Usage:
+    python benchmarks/retrieval_eval.py
+    python benchmarks/retrieval_eval.py --reranker-model cross-encoder/ms-marco-MiniLM-L-6-v2
+    python benchmarks/retrieval_eval.py --index-dir vector_index --embeddings huggingface \\
+        --questions my_labeled_questions.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.local_index import LocalVectorStore
+from src.retrieval import AdaptiveRetriever, CrossEncoderReranker
+from src.stubs import STUB_CORPUS, StubEmbeddings
+
+DEFAULT_QUESTIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "retrieval_eval.jsonl")
+
+STOPWORDS = {
+    "the", "and", "with", "from", "that", "this", "which", "when", "while", "what", "causes",
+    "cause", "include", "includes", "into", "their", "there", "have", "been", "also", "usually",
+}
+
+CONFIGURATIONS = [
+    ("similarity k=3", dict(search_type="similarity", k=3, adaptive_k=False)),
+    ("similarity k=5", dict(search_type="similarity", k=5, adaptive_k=False)),
+    ("mmr k=5 lambda=0.5", dict(search_type="mmr", k=5, lambda_mult=0.5, adaptive_k=False)),
+    ("mmr k=5 lambda=0.7", dict(search_type="mmr", k=5, lambda_mult=0.7, adaptive_k=False)),
+    ("mmr adaptive k lambda=0.7", dict(search_type="mmr", k=5, lambda_mult=0.7, adaptive_k=True)),
+    ("similarity adaptive k", dict(search_type="similarity", k=5, adaptive_k=True)),
+]
+
+
+def content_words(text):
+    return {w for w in re.findall(r"[a-z0-9/]+", text.lower()) if len(w) > 3 and w not in STOPWORDS}
+
+
+def load_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_index(directory, embedding, repeats, distractors, seed):
+    """
+    One short page per (topic, repeat): the topic passage plus random
+    distractor passages, so every fact appears on several near-duplicate pages.
+    """
+    rng = random.Random(seed)
+    texts, metadatas = [], []
+    for repeat in range(repeats):
+        for topic, passage in enumerate(STUB_CORPUS):
+            others = rng.sample([p for p in STUB_CORPUS if p != passage], distractors)
+            parts = [passage] + others
+            rng.shuffle(parts)
+            texts.append(" ".join(parts))
+            metadatas.append({"source": "synthetic.pdf", "page": repeat * len(STUB_CORPUS) + topic})
+    return LocalVectorStore.from_texts(texts, embedding, metadatas=metadatas, index_dir=directory)
+
+
+def evaluate(retriever, questions):
+    recalls, overlaps, chunks, latencies = [], [], [], []
+    for item in questions:
+        start = time.perf_counter()
+        docs = retriever.invoke(item["question"])
+        latencies.append(time.perf_counter() - start)
+        context = " ".join(doc.page_content for doc in docs).lower()
+        evidence = item.get("evidence", [])
+        if evidence:
+            recalls.append(sum(phrase.lower() in context for phrase in evidence) / len(evidence))
+        answer_words = content_words(item.get("answer", ""))
+        if answer_words:
+            overlaps.append(len(answer_words & content_words(context)) / len(answer_words))
+        chunks.append(len(docs))
+    latencies = np.array(latencies) * 1000
+    return {
+        "recall": float(np.mean(recalls)) if recalls else float("nan"),
+        "overlap": float(np.mean(overlaps)) if overlaps else float("nan"),
+        "chunks": float(np.mean(chunks)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS)
+    parser.add_argument("--index-dir", help="evaluate an existing local index instead of the synthetic one")
+    parser.add_argument("--embeddings", choices=["stub", "huggingface"], default="stub")
+    parser.add_argument("--repeats", type=int, default=4, help="synthetic pages per topic")
+    parser.add_argument("--distractors", type=int, default=2, help="unrelated passages per synthetic page")
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--min-k", type=int, default=3, help="adaptive k for definitional questions")
+    parser.add_argument("--max-k", type=int, default=8, help="adaptive k for broad questions")
+    parser.add_argument("--reranker-model", help="also evaluate this CrossEncoder (needs sentence-transformers)")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the question set for latency")
+    parser.add_argument("--json", action="store_true", help="print raw JSON instead of a table")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.embeddings == "huggingface":
+        from src.helper import download_hugging_face_embeddings
+
+        embedding = download_hugging_face_embeddings()
+    else:
+        embedding = StubEmbeddings()
+    questions = load_questions(args.questions)
+
+    configurations = list(CONFIGURATIONS)
+    if args.reranker_model:
+        reranker = CrossEncoderReranker(args.reranker_model)
+        reranker.load()
+        configurations.append(("cross-encoder k=5", dict(k=5, adaptive_k=False, reranker=reranker)))
+        configurations.append(("cross-encoder adaptive k", dict(k=5, adaptive_k=True, reranker=reranker)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.index_dir:
+            store = LocalVectorStore.load(args.index_dir, embedding)
+        else:
+            store = synthetic_index(tmp, embedding, args.repeats, args.distractors, args.seed)
+        chunk_count = len(store)
+
+        results = {}
+        for name, options in configurations:
+            retriever = AdaptiveRetriever(vectorstore=store, embeddings=embedding, fetch_k=args.fetch_k,
+                                          min_k=args.min_k, max_k=args.max_k, **options)
+            runs = [evaluate(retriever, questions) for _ in range(args.rounds)]
+            result = dict(runs[0])
+            result["p50_ms"] = float(np.median([r["p50_ms"] for r in runs]))
+            result["p95_ms"] = float(np.median([r["p95_ms"] for r in runs]))
+            results[name] = result
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{chunk_count} chunks, {len(questions)} questions, fetch_k={args.fetch_k}")
+    print(f"{'configuration':28} {'recall':>7} {'overlap':>8} {'chunks':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, r in results.items():
+        print(f"{name:28} {r['recall']:>7.3f} {r['overlap']:>8.3f} {r['chunks']:>7.2f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
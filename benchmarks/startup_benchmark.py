@@ -0,0 +1,155 @@
+"""
+Cold-start benchmark for the web worker.
+
+Each repetition runs in a fresh interpreter so import caches are cold, then
+times the phases a gunicorn worker goes through before it can serve /get.
+
+--stubs boots app.py against the local stub backends (no keys, no network)
+and compares FAST_BOOT=1, where backends are warmed in the background after
+import, with FAST_BOOT=0, where import blocks until they are built.
+--connect-latency-ms makes each stub client take that long to build, standing
+in for model loads and remote handshakes.
+
+Usage:
+    python benchmarks/startup_benchmark.py --runs 5
+    python benchmarks/startup_benchmark.py --runs 3 --full-app   # needs .env
+    python benchmarks/startup_benchmark.py --runs 5 --stubs --connect-latency-ms 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in a child interpreter; prints one JSON object of phase -> seconds.
+PHASE_SCRIPT = r"""
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+timings = {{}}
+
+def phase(name, fn):
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        timings[name] = None
+        sys.stderr.write(f"{{name}} failed: {{e}}\n")
+        return
+    timings[name] = time.perf_counter() - start
+
+phase("import flask", lambda: importlib.import_module("flask"))
+phase("import langchain chains", lambda: (
+    importlib.import_module("langchain.chains"),
+    importlib.import_module("langchain.chains.combine_documents"),
+))
+phase("import src.helper", lambda: importlib.import_module("src.helper"))
+phase("init query embedder", lambda: importlib.import_module("src.helper").get_embeddings())
+phase("import langchain_pinecone", lambda: importlib.import_module("langchain_pinecone"))
+phase("import google.generativeai", lambda: importlib.import_module("google.generativeai"))
+if {full_app!r}:
+    phase("import app", lambda: importlib.import_module("app"))
+print(json.dumps(timings))
+"""
+
+# Boots app.py on stub backends; "ready" is when /health would first say 200.
+STUB_APP_SCRIPT = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+while client.get("/health").status_code != 200:
+    time.sleep(0.005)
+ready = time.perf_counter()
+print(json.dumps({{"import app": imported - start, "ready (/health 200)": ready - start}}))
+"""
+
+
+def stub_env(fast_boot, connect_latency_ms):
+    # Fresh state per boot, as in load_test.py: the app never touches the
+    # repo's chat history, semantic cache or precomputed answers.
+    state = tempfile.mkdtemp(prefix="startup-benchmark-")
+    env = dict(os.environ)
+    env.update({
+        "EMBEDDING_BACKEND": "stub",
+        "VECTOR_BACKEND": "stub",
+        "LLM_BACKEND": "stub",
+        "SEMANTIC_CACHE_ENABLED": "0",
+        "SEMANTIC_CACHE_PATH": os.path.join(state, "semantic_cache.json"),
+        "CHAT_HISTORY_DB": os.path.join(state, "chat_history.db"),
+        "PRECOMPUTED_ANSWERS_PATH": os.path.join(state, "precomputed_answers.json"),
+        "FAST_BOOT": "1" if fast_boot else "0",
+        "STUB_CONNECT_LATENCY_MS": str(connect_latency_ms),
+    })
+    return env
+
+
+def run_once(full_app, script=None, env=None):
+    script = script or PHASE_SCRIPT.format(root=ROOT, full_app=full_app)
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT, capture_output=True, text=True, check=True, env=env,
+    )
+    total = time.perf_counter() - start
+    timings = json.loads(out.stdout.strip().splitlines()[-1])
+    timings["total (process)"] = total
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--full-app", action="store_true", help="also import app.py (requires API keys)")
+    parser.add_argument("--stubs", action="store_true", help="boot app.py on stub backends, fast vs eager")
+    parser.add_argument("--connect-latency-ms", type=float, default=0,
+                        help="time each stub backend takes to build (with --stubs)")
+    parser.add_argument("--json", action="store_true", help="print raw JSON instead of a table")
+    args = parser.parse_args()
+
+    if args.stubs:
+        script = STUB_APP_SCRIPT.format(root=ROOT)
+        runs = []
+        for _ in range(args.runs):
+            run = {}
+            for fast_boot in (True, False):
+                label = "fast boot" if fast_boot else "eager boot"
+                timings = run_once(False, script, stub_env(fast_boot, args.connect_latency_ms))
+                run.update({f"{label}: {name}": value for name, value in timings.items()})
+            runs.append(run)
+    else:
+        runs = [run_once(args.full_app) for _ in range(args.runs)]
+    phases = list(runs[0].keys())
+
+    summary = {}
+    for name in phases:
+        values = [r[name] for r in runs if r.get(name) is not None]
+        if not values:
+            summary[name] = None
+            continue
+        summary[name] = {
+            "median_ms": statistics.median(values) * 1000,
+            "min_ms": min(values) * 1000,
+            "max_ms": max(values) * 1000,
+        }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{'phase':40} {'median':>10} {'min':>10} {'max':>10}")
+    for name, stats in summary.items():
+        if stats is None:
+            print(f"{name:40} {'failed':>10}")
+            continue
+        print(f"{name:40} {stats['median_ms']:>8.1f}ms {stats['min_ms']:>8.1f}ms {stats['max_ms']:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Generate the precomputed answer tier served by /get (see src/precomputed.py).
+
+Questions come from chat_history.db (the most frequent standalone questions)
+or from a curated list, one per line. Each one is answered through the web
+app's own retriever, context packing, prompt and LLM client, so a precomputed
+answer reads like a live one. store_index.py calls refresh_answers() after
+an ingestion run that changed the index. Every entry is then retrieved
+again, and its answer is regenerated if its context signature changed.
+
+Usage:
+    python precompute_answers.py --from-history --top 100 --min-count 3
+    python precompute_answers.py --questions faq.txt
+    python precompute_answers.py --refresh            # regenerate stale entries
+    python precompute_answers.py --list
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from src.cache import normalize_query
+from src.precomputed import load_entries, load_question_list, mine_questions, save_entries
+from src.semantic_cache import context_signature
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+PRECOMPUTED_ANSWERS_PATH = os.environ.get("PRECOMPUTED_ANSWERS_PATH", "precomputed_answers.json")
+CHAT_HISTORY_DB = os.environ.get("CHAT_HISTORY_DB", "chat_history.db")
+
+
+def serving_app():
+    """The web app module, booted for offline use: backends built eagerly, no history writer"""
+    os.environ.setdefault("FAST_BOOT", "0")
+    os.environ.setdefault("CHAT_HISTORY_ENABLED", "0")
+    import app
+
+    return app
+
+
+def generate_entry(app, question, count=None, docs=None):
+    """A precomputed entry for `question`, or None when the LLM gave no real answer"""
+    if docs is None:
+        docs = app.retriever.invoke(question)
+    answer = app.question_answer_chain.invoke({"input": question, "context": docs, "history": []})
+    if not isinstance(answer, str):
+        answer = str(answer)
+    if app.answer_outcome(answer) != "llm":
+        logger.warning(f"No answer generated for {question!r}")
+        return None
+    return {
+        "question": question,
+        "key": normalize_query(question),
+        "vector": [float(v) for v in app.embeddings.embed_query(question)],
+        "answer": app.sanitize_response(answer),
+        "context": context_signature(docs),
+        "sources": sorted({str(doc.metadata.get("source")) for doc in docs}),
+        "count": count,
+        "generated_at": time.time(),
+    }
+
+
+def index_generation(app):
+    from src.ingest import read_index_generation
+
+    return read_index_generation(app.INDEX_MANIFEST_PATH)
+
+
+def precompute(questions, path=PRECOMPUTED_ANSWERS_PATH, workers=4, replace=False):
+    """Answer [(question, count)] and merge them into `path`; returns the number stored"""
+    app = serving_app()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fresh = [e for e in pool.map(lambda item: generate_entry(app, *item), questions) if e is not None]
+    entries = {} if replace else {entry["key"]: entry for entry in load_entries(path)}
+    entries.update((entry["key"], entry) for entry in fresh)
+    save_entries(path, list(entries.values()), generation=index_generation(app))
+    logger.info(f"Precomputed {len(fresh)} of {len(questions)} answers; {len(entries)} entries in {path}")
+    return len(fresh)
+
+
+def refresh_answers(path=PRECOMPUTED_ANSWERS_PATH, workers=4, force=False):
+    """
+    Re-retrieve every entry and regenerate those whose context signature
+    changed (all of them with `force`). An entry that cannot be regenerated
+    is dropped rather than served stale. Returns (checked, regenerated, dropped).
+    """
+    entries = load_entries(path)
+    if not entries:
+        return 0, 0, 0
+    app = serving_app()
+
+    def refresh(entry):
+        docs = app.retriever.invoke(entry["question"])
+        if not force and context_signature(docs) == entry.get("context"):
+            return entry, False
+        return generate_entry(app, entry["question"], entry.get("count"), docs=docs), True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(refresh, entries))
+    kept = [entry for entry, _ in results if entry is not None]
+    regenerated = sum(1 for entry, changed in results if changed and entry is not None)
+    dropped = len(entries) - len(kept)
+    save_entries(path, kept, generation=index_generation(app))
+    logger.info(f"Checked {len(entries)} precomputed answers: {regenerated} regenerated, {dropped} dropped")
+    return len(entries), regenerated, dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-history", action="store_true", help=f"mine questions from {CHAT_HISTORY_DB}")
+    source.add_argument("--questions", help="file with one curated question per line")
+    source.add_argument("--refresh", action="store_true", help="regenerate entries whose context changed")
+    source.add_argument("--list", action="store_true", help="print the stored questions")
+    parser.add_argument("--top", type=int, default=100, help="questions to mine from history")
+    parser.add_argument("--min-count", type=int, default=2, help="minimum times a mined question was asked")
+    parser.add_argument("--output", default=PRECOMPUTED_ANSWERS_PATH)
+    parser.add_argument("--workers", type=int, default=4, help="questions answered concurrently")
+    parser.add_argument("--replace", action="store_true", help="drop entries not in the new question list")
+    parser.add_argument("--force", action="store_true", help="with --refresh, regenerate every entry")
+    args = parser.parse_args()
+
+    if args.list:
+        for entry in load_entries(args.output):
+            print(f"{entry.get('count') or '-':>5}  {entry['question']}")
+        return
+    if args.refresh:
+        refresh_answers(args.output, workers=args.workers, force=args.force)
+        return
+    if args.from_history:
+        questions = mine_questions(CHAT_HISTORY_DB, top_n=args.top, min_count=args.min_count)
+    else:
+        questions = [(question, None) for question in load_question_list(args.questions)]
+    if not questions:
+        logger.info("No questions to precompute")
+        return
+    precompute(questions, args.output, workers=args.workers, replace=args.replace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Backend clients built on first use.
+
+The embedding model, the vector store client and the Gemini client can each
+take seconds to build and may need the network, so app.py registers a factory
+for each one instead of building it at import. `warm_up` builds them on a
+background thread right after boot, and `readiness` reports their state for
+the /health endpoint. A factory that fails is retried on the next use.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, List
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger(__name__)
+
+
+class LazyBackend:
+    """Builds `factory()` once, on the first `get()`, and keeps the result."""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        self.state = "pending"
+        self.error = None
+        self.build_seconds = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def get(self):
+        if self._value is not None:
+            return self._value
+        with self._lock:
+            if self._value is None:
+                self.state = "building"
+                start = time.perf_counter()
+                try:
+                    value = self.factory()
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = str(e)
+                    logger.error(f"Failed to initialize {self.name} backend: {e}")
+                    raise
+                self.build_seconds = time.perf_counter() - start
+                self._value = value
+                self.state = "ready"
+                self.error = None
+                logger.info(f"{self.name} backend ready in {self.build_seconds:.2f}s")
+        return self._value
+
+    async def aget(self):
+        """Like get(), but a build in progress runs off the event loop"""
+        if self._value is not None:
+            return self._value
+        return await asyncio.get_running_loop().run_in_executor(None, self.get)
+
+    def status(self):
+        status = {"state": self.state}
+        if self.build_seconds is not None:
+            status["build_seconds"] = round(self.build_seconds, 3)
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+class LazyEmbeddings(Embeddings):
+    """Embeddings whose model is built by a LazyBackend on first use."""
+
+    def __init__(self, backend: LazyBackend):
+        self.backend = backend
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.backend.get().embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await (await self.backend.aget()).aembed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.backend.get().embed_documents(texts)
+
+
+class LazyRetriever(BaseRetriever):
+    """Retriever whose vector store is built by a LazyBackend on first use."""
+
+    backend: Any
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.backend.get().invoke(query)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await (await self.backend.aget()).ainvoke(query)
+
+
+def warm_up(backends):
+    """Build every backend on a daemon thread, in order; failures are only logged."""
+
+    def run():
+        for backend in backends:
+            try:
+                backend.get()
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=run, name="backend-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness(backends):
+    """(True when every backend is built, {name: status})"""
+    statuses = {backend.name: backend.status() for backend in backends}
+    return all(backend.ready for backend in backends), statuses
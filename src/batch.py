@@ -0,0 +1,316 @@
+"""
+Bulk question answering, shared by the /batch endpoint and batch_answer.py.
+
+Input is JSONL, one {"id": ..., "question": ...} per line. The id defaults
+to the line number, and a bare JSON string is accepted as the question.
+BatchRunner pipelines the stages, so no stage waits for the whole file:
+
+- questions are embedded `embed_batch_size` at a time in one forward pass,
+  which fills the query-embedding cache the retriever reads;
+- vector searches run on `search_workers` threads, and answers found in the
+  precomputed tier or the semantic cache are emitted right away;
+- the rest go to `llm_workers` threads, which start at most
+  `llm_rate_per_minute` LLM calls per minute between them.
+
+Results are yielded as they complete. Each one is a dict with the answer,
+its outcome, the retrieved sources and per-stage timings in milliseconds.
+
+BatchJobs runs /batch submissions in the background and keeps their state
+on disk, so a request never waits for a whole batch.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Outcomes that count as answered; anything else is retried on resume.
+COMPLETE_OUTCOMES = {"precomputed", "cache", "llm"}
+
+
+@dataclass
+class BatchPipeline:
+    embed_many: Callable  # questions -> vectors, priming the query-embedding cache
+    retrieve: Callable  # question -> documents
+    cached_answer: Callable  # (question, documents) -> (answer, outcome) or (None, None)
+    generate: Callable  # (question, documents) -> (answer, outcome), calls the LLM
+
+
+def parse_items(lines):
+    """[{"id", "question"}] from JSONL lines; ValueError names the first bad line"""
+    items, seen = [], set()
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {number}: invalid JSON ({e})")
+        if isinstance(record, str):
+            record = {"question": record}
+        question = record.get("question") if isinstance(record, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError(f"line {number}: missing \"question\"")
+        item_id = str(record.get("id", number))
+        if item_id in seen:
+            raise ValueError(f"line {number}: duplicate id {item_id!r}")
+        seen.add(item_id)
+        items.append({"id": item_id, "question": question.strip()})
+    return items
+
+
+def completed_ids(path):
+    """
+    Ids already answered in a results file from an earlier run. A last line
+    cut short by a crash is truncated away, so the file can be appended to.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            keep = data.rfind(b"\n") + 1
+            f.seek(keep)
+            f.truncate()
+            data = data[:keep]
+    done = set()
+    for line in data.splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        if result.get("outcome") in COMPLETE_OUTCOMES:
+            done.add(str(result.get("id")))
+    return done
+
+
+def append_results(results, path):
+    """Append each result to `path` as one JSON line flushed to disk, yielding it once written"""
+    with open(path, "a", encoding="utf-8") as out:
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            yield result
+
+
+def document_sources(docs):
+    sources, seen = [], set()
+    for doc in docs:
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        if key not in seen:
+            seen.add(key)
+            sources.append({"source": key[0], "page": key[1]})
+    return sources
+
+
+class RateLimiter:
+    """Spaces acquisitions at least 60 / `rate_per_minute` seconds apart across threads; 0 disables it."""
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BatchRunner:
+    def __init__(self, pipeline, embed_batch_size=32, search_workers=8, llm_workers=4,
+                 llm_rate_per_minute=60.0, limiter=None, max_pending=256):
+        self.pipeline = pipeline
+        self.embed_batch_size = embed_batch_size
+        self.search_workers = search_workers
+        self.llm_workers = llm_workers
+        self.limiter = limiter or RateLimiter(llm_rate_per_minute)
+        self.max_pending = max(max_pending, embed_batch_size)
+
+    def run(self, items):
+        """Yield one result per item, in completion order"""
+        if not items:
+            return
+        results = queue.Queue()
+        # Backpressure: at most max_pending questions between embedding and output.
+        pending = threading.Semaphore(self.max_pending)
+        stop = threading.Event()
+        search_pool = ThreadPoolExecutor(self.search_workers, thread_name_prefix="batch-search")
+        llm_pool = ThreadPoolExecutor(self.llm_workers, thread_name_prefix="batch-llm")
+
+        def finish(item, start, timings, **fields):
+            timings["total"] = (time.perf_counter() - start) * 1000
+            results.put({
+                "id": item["id"],
+                "question": item["question"],
+                **fields,
+                "timings_ms": {stage: round(ms, 1) for stage, ms in timings.items()},
+            })
+            pending.release()
+
+        def fail(item, start, timings, error):
+            logger.error(f"Batch item {item['id']} failed: {error}")
+            finish(item, start, timings, answer=None, outcome="error", sources=[], error=str(error))
+
+        def generate(item, start, timings, docs):
+            try:
+                wait_start = time.perf_counter()
+                self.limiter.acquire()
+                timings["rate_wait"] = (time.perf_counter() - wait_start) * 1000
+                llm_start = time.perf_counter()
+                answer, outcome = self.pipeline.generate(item["question"], docs)
+                timings["llm"] = (time.perf_counter() - llm_start) * 1000
+                finish(item, start, timings, answer=answer, outcome=outcome, sources=document_sources(docs))
+            except Exception as e:
+                fail(item, start, timings, e)
+
+        def search(item, start, timings):
+            try:
+                search_start = time.perf_counter()
+                docs = self.pipeline.retrieve(item["question"])
+                timings["retrieval"] = (time.perf_counter() - search_start) * 1000
+                answer, outcome = self.pipeline.cached_answer(item["question"], docs)
+                if answer is not None:
+                    finish(item, start, timings, answer=answer, outcome=outcome, sources=document_sources(docs))
+                elif not stop.is_set():
+                    llm_pool.submit(generate, item, start, timings, docs)
+            except Exception as e:
+                fail(item, start, timings, e)
+
+        def produce():
+            for offset in range(0, len(items), self.embed_batch_size):
+                batch = items[offset:offset + self.embed_batch_size]
+                for _ in batch:
+                    while not pending.acquire(timeout=0.5):
+                        if stop.is_set():
+                            return
+                if stop.is_set():
+                    return
+                start = time.perf_counter()
+                try:
+                    self.pipeline.embed_many([item["question"] for item in batch])
+                except Exception as e:
+                    # Retrieval still embeds each question on its own.
+                    logger.warning(f"Batch embedding failed: {e}")
+                embed_ms = (time.perf_counter() - start) * 1000
+                for item in batch:
+                    search_pool.submit(search, item, start, {"embed": embed_ms})
+
+        producer = threading.Thread(target=produce, name="batch-embed", daemon=True)
+        producer.start()
+        try:
+            for _ in range(len(items)):
+                yield results.get()
+        finally:
+            stop.set()
+            search_pool.shutdown(wait=False, cancel_futures=True)
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+
+
+class BatchJobs:
+    """
+    Background batch jobs, `max_running` at a time per process. A job keeps
+    three files in `directory`: <id>.input.jsonl with its questions,
+    <id>.jsonl with results appended as they complete, and <id>.json with
+    its state (queued, running, done or failed). Any worker can answer a
+    poll from the files. A job cut short by a restart stays "running" and
+    can be finished with batch_answer.py on its input and results files.
+    """
+
+    ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+    def __init__(self, directory, runner_factory, max_running=1):
+        self.directory = directory
+        self.runner_factory = runner_factory
+        self._slots = threading.Semaphore(max_running)
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def input_path(self, job_id):
+        return self._path(job_id, ".input.jsonl")
+
+    def results_path(self, job_id):
+        return self._path(job_id, ".jsonl")
+
+    def _write_state(self, job_id, **fields):
+        path = self._path(job_id, ".json")
+        state = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        state.update(fields, updated_at=time.time())
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def submit(self, items):
+        """Start answering `items` in the background; returns the job id"""
+        os.makedirs(self.directory, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        with open(self.input_path(job_id), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(item) + "\n" for item in items)
+        open(self.results_path(job_id), "w").close()
+        self._write_state(job_id, id=job_id, state="queued", total=len(items), created_at=time.time())
+        threading.Thread(target=self._run, args=(job_id, items), name=f"batch-job-{job_id[:8]}",
+                         daemon=True).start()
+        return job_id
+
+    def _run(self, job_id, items):
+        with self._slots:
+            self._write_state(job_id, state="running", started_at=time.time())
+            start = time.perf_counter()
+            try:
+                for _ in append_results(self.runner_factory().run(items), self.results_path(job_id)):
+                    pass
+            except Exception as e:
+                logger.error(f"Batch job {job_id} failed: {e}")
+                self._write_state(job_id, state="failed", error=str(e), finished_at=time.time())
+                return
+            self._write_state(job_id, state="done", finished_at=time.time())
+            logger.info(f"Batch job {job_id}: {len(items)} questions in {time.perf_counter() - start:.1f}s")
+
+    def status(self, job_id):
+        """The job's state with its progress and outcome counts so far, or None for an unknown id"""
+        if not self.ID_PATTERN.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id, ".json"), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        outcomes = Counter(result.get("outcome") for result in self.results(job_id))
+        state["completed"] = sum(outcomes.values())
+        state["outcomes"] = dict(outcomes)
+        return state
+
+    def read_results(self, job_id):
+        """The complete JSON lines written so far, as bytes"""
+        try:
+            with open(self.results_path(job_id), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return b""
+        # A line still being written is left for the next poll.
+        return data[:data.rfind(b"\n") + 1]
+
+    def results(self, job_id):
+        return [json.loads(line) for line in self.read_results(job_id).splitlines() if line.strip()]
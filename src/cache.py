@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from src.metrics import span
+
+_MISSING = object()
+_PUNCTUATION = re.compile(r"[^\w\s'-]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text):
+    """
+    Canonical cache key for a user question: Unicode-normalized, lowercased,
+    punctuation stripped and whitespace collapsed, so "Symptoms of diabetes?"
+    and "symptoms  of diabetes" share an entry.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class IndexGenerationWatcher:
+    """
+    Detects re-ingestion by watching the manifest written by store_index.py.
+    The file is stat'ed at most once per `check_interval` seconds.
+    """
+
+    def __init__(self, manifest_path, check_interval=5.0):
+        self.manifest_path = manifest_path
+        self.check_interval = check_interval
+        self._mtime = self._stat()
+        self._next_check = time.monotonic() + check_interval
+
+    def _stat(self):
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        return True
+
+
+class CachedEmbeddings(Embeddings):
+    """Caches query embeddings by normalized text. Document batches pass through."""
+
+    def __init__(self, base: Embeddings, cache: TTLCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.base.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = await self.base.aembed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Query embeddings for many texts, the uncached ones in a single
+        embed_documents batch. Assumes queries and documents are embedded
+        alike, as with the MiniLM model.
+        """
+        keys = [normalize_query(text) for text in texts]
+        found = {key: self.cache.get(key) for key in keys}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if found[key] is None:
+                missing.setdefault(key, text)
+        if missing:
+            for key, vector in zip(missing, self.base.embed_documents(list(missing.values()))):
+                self.cache.set(key, vector)
+                found[key] = vector
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Caches retrieved document sets by normalized query. When a `watcher` is
+    given, the cache is dropped as soon as the index is re-ingested.
+    """
+
+    retriever: BaseRetriever
+    cache: Any
+    watcher: Optional[Any] = None
+
+    def _lookup(self, query):
+        if self.watcher is not None and self.watcher.changed():
+            self.cache.clear()
+        key = normalize_query(query)
+        return key, self.cache.get(key)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with span("retrieval"):
+            key, docs = self._lookup(query)
+            if docs is None:
+                docs = self.retriever.invoke(query)
+                self.cache.set(key, docs)
+            return list(docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with span("retrieval"):
+            key, docs = self._lookup(query)
+            if docs is None:
+                docs = await self.retriever.ainvoke(query)
+                self.cache.set(key, docs)
+            return list(docs)
@@ -0,0 +1,66 @@
+import asyncio
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; callers should answer 503."""
+
+
+class AsyncLimiter:
+    """
+    Bounded concurrency with backpressure for the asyncio serving path.
+
+    At most `max_concurrency` requests run at once and at most `max_waiting`
+    queue behind them. Anything beyond that, or anything that waits longer than
+    `wait_timeout` seconds, is rejected immediately with Overloaded instead of
+    piling up unbounded work in the event loop.
+    """
+
+    def __init__(self, max_concurrency=256, max_waiting=512, wait_timeout=10.0):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def saturated(self):
+        """True when a new request would be rejected without waiting"""
+        return self.waiting >= self.max_waiting
+
+    async def acquire(self):
+        if self.saturated():
+            self.rejected += 1
+            raise Overloaded("too many queued requests")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("timed out waiting for a free slot")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_waiting": self.max_waiting,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
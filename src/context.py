@@ -0,0 +1,184 @@
+"""
+Context assembly between the retriever and the LLM.
+
+Retrieved chunks come from text_split (1000 characters, 200 overlap), so
+neighbouring chunks of a page repeat each other and several hits can say the
+same thing. ContextPacker merges adjacent chunks of the same page, removing
+the shared overlap, drops chunks that are mostly contained in a
+higher-ranked one, and fills a token budget in retrieval order.
+"""
+import re
+import threading
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from src.memory import estimate_tokens
+
+MIN_OVERLAP_CHARS = 30
+MAX_OVERLAP_CHARS = 400
+
+
+def shingles(text, size=3):
+    """Set of lower-cased word `size`-grams"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def overlap_length(left, right):
+    """Length of the longest suffix of `left` that is a prefix of `right`"""
+    longest = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for length in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def _chunk_range(doc):
+    first = doc.metadata.get("chunk")
+    return first, doc.metadata.get("chunk_end", first)
+
+
+def join_adjacent(first: Document, second: Document) -> Optional[Document]:
+    """
+    `first` followed by `second` as one document, or None when they are not
+    neighbours on the same page: consecutive chunk indices from ingestion,
+    or, for chunks stored without them, a shared overlap.
+    """
+    if (first.metadata.get("source"), first.metadata.get("page")) != (
+        second.metadata.get("source"), second.metadata.get("page")
+    ):
+        return None
+    left, right = first.page_content.rstrip(), second.page_content.lstrip()
+    _, first_end = _chunk_range(first)
+    second_start, second_end = _chunk_range(second)
+    if first_end is not None and second_start is not None:
+        # Chunk indices are authoritative; the overlap is only trimmed.
+        if second_start != first_end + 1:
+            return None
+        overlap = overlap_length(left, right)
+    else:
+        overlap = overlap_length(left, right)
+        if not overlap:
+            return None
+    text = left + right[overlap:] if overlap else left + " " + right
+    metadata = dict(first.metadata)
+    if second_end is not None:
+        metadata["chunk_end"] = second_end
+    return Document(page_content=text, metadata=metadata)
+
+
+def merge_adjacent(docs: List[Document]) -> List[Document]:
+    """Merge neighbouring chunks, keeping the position of the best-ranked one"""
+    merged = list(docs)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(len(merged)):
+                if i == j:
+                    continue
+                joined = join_adjacent(merged[i], merged[j])
+                if joined is not None:
+                    keep, drop = min(i, j), max(i, j)
+                    merged[keep] = joined
+                    del merged[drop]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut `text` to about `max_tokens`, at a sentence end when there is one"""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = max(cut.rfind(". "), cut.rfind(".\n"))
+    return cut[: end + 1] if end > limit // 2 else cut.rstrip() + "..."
+
+
+class ContextPacker:
+    """
+    Merge, deduplicate and budget retrieved documents. Chunks whose word
+    3-grams are at least `duplicate_threshold` contained in an earlier chunk
+    are dropped; the rest are added in retrieval order until `token_budget`
+    is spent, the last one truncated at a sentence end. Chunks left out for
+    the budget are counted in `dropped_for_budget`.
+    """
+
+    def __init__(self, token_budget=1000, duplicate_threshold=0.8, min_fragment_tokens=60):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.min_fragment_tokens = min_fragment_tokens
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.merged = 0
+        self.duplicates = 0
+        self.truncated = 0
+        self.over_budget = 0
+
+    def pack(self, docs: List[Document]) -> List[Document]:
+        docs = list(docs)
+        if not docs:
+            return docs
+        tokens_in = sum(estimate_tokens(doc.page_content) for doc in docs)
+
+        merged = merge_adjacent(docs)
+
+        kept, kept_shingles, duplicates = [], [], 0
+        for doc in merged:
+            grams = shingles(doc.page_content)
+            if grams and any(
+                len(grams & other) / len(grams) >= self.duplicate_threshold for other in kept_shingles
+            ):
+                duplicates += 1
+                continue
+            kept.append(doc)
+            kept_shingles.append(grams)
+
+        packed, used, truncated = [], 0, 0
+        for doc in kept:
+            cost = estimate_tokens(doc.page_content)
+            remaining = self.token_budget - used
+            if cost <= remaining:
+                packed.append(doc)
+                used += cost
+                continue
+            if remaining >= self.min_fragment_tokens or not packed:
+                text = truncate_to_tokens(doc.page_content, max(remaining, self.min_fragment_tokens))
+                packed.append(Document(page_content=text, metadata=dict(doc.metadata)))
+                used += estimate_tokens(text)
+                truncated += 1
+            break
+        # Everything from the chunk that hit the budget on, unless it was truncated in.
+        over_budget = len(kept) - len(packed)
+
+        with self._lock:
+            self.calls += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += used
+            self.merged += len(docs) - len(merged)
+            self.duplicates += duplicates
+            self.truncated += truncated
+            self.over_budget += over_budget
+        return packed
+
+    def stats(self):
+        return {
+            "token_budget": self.token_budget,
+            "calls": self.calls,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "token_savings": (1 - self.tokens_out / self.tokens_in) if self.tokens_in else 0.0,
+            "merged_chunks": self.merged,
+            "dropped_duplicates": self.duplicates,
+            "truncated": self.truncated,
+            "dropped_for_budget": self.over_budget,
+        }
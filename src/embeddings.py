@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def env_flag(name, default="0"):
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def select_device(preferred=None):
+    """
+    Pick the device for the embedding model. An explicit value (argument or
+    EMBEDDING_DEVICE) wins; "auto" prefers CUDA, then Apple MPS, then CPU.
+    """
+    preferred = (preferred or os.environ.get("EMBEDDING_DEVICE", "auto")).lower()
+    if preferred != "auto":
+        return preferred
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    if torch.cuda.is_available():
+        return "cuda"
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def quantize_for_cpu(model):
+    """
+    Dynamic int8 quantization of the Linear layers of a sentence-transformers
+    model. Roughly halves CPU latency for MiniLM with a negligible change in
+    cosine similarities.
+    """
+    import torch
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model so that concurrent `embed_query` calls from many
+    in-flight requests are coalesced into one `embed_documents` forward pass.
+
+    A single background thread collects queries until `max_batch_size` are
+    queued or `max_wait_ms` has passed since the first one arrived.
+    """
+
+    def __init__(self, base: Embeddings, max_batch_size=32, max_wait_ms=5.0):
+        self.base = base
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(
+                        target=self._run, name="embedding-batcher", daemon=True
+                    )
+                    self._worker.start()
+
+    def _collect(self):
+        """Queued (text, future) pairs for the next batch, skipping cancelled futures"""
+        batch = []
+        deadline = None
+        while len(batch) < self.max_batch_size:
+            if deadline is None:
+                item = self._queue.get()
+                deadline = time.monotonic() + self.max_wait
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            # A future cancelled by its caller (e.g. a disconnected asyncio
+            # request) is dropped; a running one can no longer be cancelled.
+            if item[1].set_running_or_notify_cancel():
+                batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch = self._collect()
+                if batch:
+                    self._embed(batch)
+            except Exception as e:
+                # Keep serving later queries whatever went wrong with this batch.
+                logger.error(f"Embedding batcher error: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _embed(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self.base.embed_documents(texts)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.queries += len(batch)
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def submit(self, text) -> Future:
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Already a batch; no point queueing it behind single queries.
+        return self.base.embed_documents(texts)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": (self.queries / self.batches) if self.batches else 0.0,
+        }
@@ -1,15 +1,21 @@
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence
 
-from typing import List
-from langchain.schema import Document
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.documents import Document
+
+
+# Get the current file's directory and construct the Data path dynamically
+current_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(os.path.dirname(current_dir), "Data")
 
 
 #Extract Data From the PDF File
 def load_pdf_file(data):
+    from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
+
     loader= DirectoryLoader(data,
                             glob="*.pdf",
                             loader_cls=PyPDFLoader)
@@ -17,50 +23,165 @@ def load_pdf_file(data):
     documents=loader.load()
 
     return documents
-  
-  
-# Get the current file's directory and construct the Data path dynamically
-current_dir = os.path.dirname(os.path.abspath(__file__))
-data_dir = os.path.join(os.path.dirname(current_dir), "Data")
-extracted_data = load_pdf_file(data=data_dir)
 
-from typing import List
-from langchain.schema import Document
 
 def filter_to_minimal_docs(docs: List[Document]) -> List[Document]:
     """
     Given a list of Document objects, return a new list of Document objects
-    containing only 'source' in metadata and the original page_content.
+    containing only 'source' and 'page' in metadata and the original page_content.
     """
     minimal_docs: List[Document] = []
     for doc in docs:
         src = doc.metadata.get("source")
+        metadata = {"source": src}
+        if "page" in doc.metadata:
+            metadata["page"] = doc.metadata["page"]
         minimal_docs.append(
             Document(
                 page_content=doc.page_content,
-                metadata={"source": src}
+                metadata=metadata
             )
         )
     return minimal_docs
-  
-  
-minimal_docs = filter_to_minimal_docs(extracted_data)
+
 
 #Split the Data into Text Chunks
 def text_split(minimal_docs):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
     text_splitter=RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
     text_chunks=text_splitter.split_documents(minimal_docs)
     return text_chunks
-  
-text_chunks=text_split(minimal_docs)
-print("Length of Text Chunks", len(text_chunks))
+
+
+def pdf_page_count(path):
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def extract_and_split_pages(path, source, start, end):
+    """
+    Extract pages [start, end) of one PDF and split them into chunks.
+    Runs inside worker processes, so it only takes and returns picklable values.
+    Each chunk carries its page number and its index within that page.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    chunks: List[Document] = []
+    for page_number in range(start, end):
+        page = Document(
+            page_content=reader.pages[page_number].extract_text(),
+            metadata={"source": source, "page": page_number},
+        )
+        for index, chunk in enumerate(text_split([page])):
+            chunk.metadata["chunk"] = index
+            chunks.append(chunk)
+    return chunks
+
+
+def iter_text_chunks(paths: Sequence[str], sources: Optional[Sequence[str]] = None,
+                     workers: Optional[int] = None, pages_per_task=8) -> Iterator[Document]:
+    """
+    Stream chunks for `paths` in file and page order, parsing page ranges across
+    a process pool. At most `2 * workers` page ranges are in flight, so memory is
+    bounded by the task size rather than by the size of the corpus.
+    """
+    sources = list(sources) if sources is not None else list(paths)
+    tasks = (
+        (path, source, start, min(start + pages_per_task, page_count))
+        for path, source in zip(paths, sources)
+        for page_count in [pdf_page_count(path)]
+        for start in range(0, page_count, pages_per_task)
+    )
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            yield from extract_and_split_pages(*task)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(executor.submit(extract_and_split_pages, *task))
+            if len(in_flight) >= 2 * workers:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+    finally:
+        # Don't keep parsing if the consumer stopped early.
+        executor.shutdown(cancel_futures=True)
+
+
+def load_text_chunks(data=data_dir):
+    """
+    Run the full ingestion-side pipeline (load, filter, split) over a directory
+    of PDFs. Only ingestion needs this; the serving path never calls it.
+    """
+    extracted_data = load_pdf_file(data=data)
+    minimal_docs = filter_to_minimal_docs(extracted_data)
+    text_chunks = text_split(minimal_docs)
+    print("Length of Text Chunks", len(text_chunks))
+    return text_chunks
+
 
 #Download the Embeddings from Hugging Face
-def download_hugging_face_embeddings():
+def download_hugging_face_embeddings(device=None, batch_size=None, quantize=None):
+    """
+    Build the MiniLM embedder on the best available device (EMBEDDING_DEVICE,
+    default auto). On CPU, EMBEDDING_QUANTIZE=1 swaps in an int8 model.
+    """
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from src.embeddings import env_flag, quantize_for_cpu, select_device
+
+    device = select_device(device)
+    if batch_size is None:
+        batch_size = int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+    if quantize is None:
+        quantize = env_flag("EMBEDDING_QUANTIZE")
+
     embeddings = HuggingFaceEmbeddings(
         model_name='sentence-transformers/all-MiniLM-L6-v2',
-        model_kwargs={'device': 'cuda'}  # This tells it to use GPU
+        model_kwargs={'device': device},
+        encode_kwargs={'batch_size': batch_size},
     )
+    if quantize and device == "cpu":
+        embeddings.client = quantize_for_cpu(embeddings.client)
     return embeddings
 
-embeddings = download_hugging_face_embeddings()
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    """
+    Build the query embedder once per process and reuse it. Unless
+    EMBEDDING_MICROBATCH=0, concurrent queries share one forward pass.
+    """
+    from src.embeddings import BatchingEmbeddings, env_flag
+
+    embeddings = download_hugging_face_embeddings()
+    if not env_flag("EMBEDDING_MICROBATCH", "1"):
+        return embeddings
+    return BatchingEmbeddings(
+        embeddings,
+        max_batch_size=int(os.environ.get("EMBEDDING_BATCH_SIZE", "32")),
+        max_wait_ms=float(os.environ.get("EMBEDDING_MAX_WAIT_MS", "5")),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_text_chunks():
+    """Load and chunk the PDF corpus once per process, on first request."""
+    return load_text_chunks()
+
+
+def __getattr__(name):
+    # Keep `from src.helper import embeddings, text_chunks` working without
+    # paying for either at import time.
+    if name == "embeddings":
+        return get_embeddings()
+    if name == "text_chunks":
+        return get_text_chunks()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
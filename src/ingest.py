@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from src.helper import iter_text_chunks
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+DEFAULT_BATCH_SIZE = 64
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hash a file in fixed-size blocks so large PDFs never sit in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source, page, index):
+    """
+    Deterministic vector ID for the index-th chunk of a page. Re-ingesting the
+    same page always produces the same IDs, so upserts overwrite in place.
+    """
+    key = f"{source}|{page}|{index}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:40]
+
+
+def source_key(path, data_dir):
+    """Stable, machine-independent name for a file inside the data directory."""
+    return os.path.relpath(path, data_dir).replace(os.sep, "/")
+
+
+def list_pdf_files(data_dir):
+    return sorted(
+        os.path.join(data_dir, name)
+        for name in os.listdir(data_dir)
+        if name.lower().endswith(".pdf")
+    )
+
+
+class Manifest:
+    """
+    Persistent record of what is currently in the vector store:
+    per-file content hashes and, per file, the chunk IDs and their content hashes.
+    """
+
+    def __init__(self, path, files=None, generation=None):
+        self.path = path
+        self.files: Dict[str, dict] = files or {}
+        self.generation = generation
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            logger.warning(f"Ignoring manifest {path} with unsupported version {data.get('version')}")
+            return cls(path)
+        return cls(path, files=data.get("files", {}), generation=data.get("generation"))
+
+    def save(self):
+        data = {"version": MANIFEST_VERSION, "generation": self.generation, "files": self.files}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def read_index_generation(manifest_path):
+    """Return the generation token of the last ingestion run, or None."""
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("generation")
+    except (OSError, ValueError):
+        return None
+
+
+@dataclass
+class IngestStats:
+    files_unchanged: int = 0
+    files_changed: int = 0
+    files_removed: int = 0
+    chunks_upserted: int = 0
+    chunks_unchanged: int = 0
+    chunks_deleted: int = 0
+    changed_sources: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self):
+        return bool(self.chunks_upserted or self.chunks_deleted)
+
+
+def sync_directory(data_dir, vectorstore, manifest_path, batch_size=DEFAULT_BATCH_SIZE, workers=None,
+                   commit=None):
+    """
+    Bring `vectorstore` in line with the PDFs in `data_dir`, touching only what
+    changed since the last run recorded in `manifest_path`.
+
+    Changed files are parsed and split across `workers` processes and streamed
+    through in `batch_size` upserts, so memory stays bounded by the batch.
+
+    `vectorstore` is any LangChain VectorStore supporting `add_documents(ids=...)`
+    and `delete(ids=...)` (PineconeVectorStore, InMemoryVectorStore, ...).
+
+    Stores that apply writes immediately get the manifest saved after every
+    file. Stores that buffer writes pass `commit`, which is called once at the
+    end, before the manifest is saved; an interrupted run then simply redoes
+    its (idempotent) upserts.
+    """
+    manifest = Manifest.load(manifest_path)
+    stats = IngestStats()
+    # Any applied change bumps the generation so serving caches can invalidate.
+    new_generation = uuid.uuid4().hex
+
+    current = {source_key(path, data_dir): path for path in list_pdf_files(data_dir)}
+
+    for source in sorted(set(manifest.files) - set(current)):
+        stale_ids = list(manifest.files[source]["chunks"])
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+        stats.chunks_deleted += len(stale_ids)
+        stats.files_removed += 1
+        stats.changed_sources.append(source)
+        del manifest.files[source]
+        manifest.generation = new_generation
+        logger.info(f"Removed {source}: deleted {len(stale_ids)} chunks")
+
+    changed = {}
+    for source, path in current.items():
+        sha = file_sha256(path)
+        previous = manifest.files.get(source)
+        if previous and previous["sha256"] == sha:
+            stats.files_unchanged += 1
+        else:
+            changed[source] = sha
+
+    pending = []
+
+    def flush():
+        if pending:
+            vectorstore.add_documents([doc for _, doc in pending], ids=[cid for cid, _ in pending])
+            stats.chunks_upserted += len(pending)
+            pending.clear()
+
+    def finish_file(source, new_chunks, upserted):
+        # Upserts for this file must land before the manifest says they did.
+        flush()
+        old_chunks = manifest.files.get(source, {}).get("chunks", {})
+        stale_ids = [cid for cid in old_chunks if cid not in new_chunks]
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+        stats.chunks_deleted += len(stale_ids)
+        stats.files_changed += 1
+        stats.changed_sources.append(source)
+        manifest.files[source] = {"sha256": changed[source], "chunks": new_chunks}
+        if upserted or stale_ids:
+            manifest.generation = new_generation
+        if commit is None:
+            # Persist after every file so an interrupted run resumes where it stopped.
+            manifest.save()
+        logger.info(f"Synced {source}: {upserted} upserted, {len(stale_ids)} deleted")
+
+    current_source, new_chunks, upserted = None, {}, 0
+    chunks = iter_text_chunks(
+        [current[source] for source in changed], sources=list(changed), workers=workers
+    )
+    for chunk in chunks:
+        source = chunk.metadata["source"]
+        if source != current_source:
+            if current_source is not None:
+                finish_file(current_source, new_chunks, upserted)
+            current_source, new_chunks, upserted = source, {}, 0
+
+        # The chunk index stays in the stored metadata: ContextPacker merges
+        # neighbouring chunks by it.
+        cid = chunk_id(source, chunk.metadata["page"], chunk.metadata["chunk"])
+        digest = content_hash(chunk.page_content)
+        new_chunks[cid] = digest
+        if manifest.files.get(source, {}).get("chunks", {}).get(cid) == digest:
+            stats.chunks_unchanged += 1
+            continue
+        pending.append((cid, chunk))
+        upserted += 1
+        if len(pending) >= batch_size:
+            flush()
+    if current_source is not None:
+        finish_file(current_source, new_chunks, upserted)
+
+    # Changed files that produced no chunks at all (e.g. image-only PDFs).
+    for source in changed:
+        if source not in manifest.files or manifest.files[source]["sha256"] != changed[source]:
+            finish_file(source, {}, 0)
+
+    if manifest.generation is None:
+        manifest.generation = new_generation
+    if commit is not None and stats.changed:
+        commit()
+    manifest.save()
+    return stats
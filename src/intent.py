@@ -0,0 +1,132 @@
+"""
+Single-pass intent detection for chat messages.
+
+All intent patterns are compiled once into one regular expression, grouped by
+intent in priority order and wrapped in a lookahead so every start position is
+tried exactly once. At each position the highest-priority intent wins, and the
+scan stops as soon as the top-priority intent (emergency) is seen, so the
+result is the same as checking each intent in turn.
+
+Extra phrases (from INTENT_PHRASES_PATH) are folded into a trie-shaped regex,
+so adding hundreds of phrases does not add hundreds of alternatives to try.
+"""
+import json
+import logging
+import re
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INTENT_PRIORITY = ("emergency", "greeting", "farewell", "small_talk")
+
+DEFAULT_PATTERNS: Dict[str, List[str]] = {
+    "emergency": [
+        r'\b(emergency|urgent|critical|severe\s+pain)\b',
+        r'\b(can\'?t\s+breathe|difficulty\s+breathing|chest\s+pain)\b',
+        r'\b(heart\s+attack|stroke|seizure|overdose)\b',
+        r'\b(bleeding\s+heavily|unconscious|not\s+responding)\b'
+    ],
+    "greeting": [
+        r'\b(hi|hello|hey|hiya|howdy)\b',
+        r'\b(good\s+(morning|afternoon|evening|day))\b',
+        r'\b(greetings|salutations)\b',
+        r'^\s*(hi|hello|hey)[\s!.]*$'
+    ],
+    "farewell": [
+        r'\b(bye|goodbye|see\s+you|farewell|take\s+care|later)\b',
+        r'\b(thanks?\s+(and\s+)?bye|bye\s+thanks?)\b',
+        r'\b(have\s+a\s+(good|great|nice)\s+(day|evening|night))\b'
+    ],
+    "small_talk": [
+        r'\b(how\s+are\s+you|how\s+you\s+doing|what\'?s\s+up)\b',
+        r'\b(how\'?s\s+it\s+going|how\'?s\s+everything)\b',
+        r'\b(nice\s+to\s+meet\s+you|pleased\s+to\s+meet)\b',
+        r'\b(thank\s*you|thanks|no\s+thank\s*you|no\s+thanks|nope|nah)\b',
+        r'\b(ok|okay|alright|fine|cool)\b'
+    ],
+}
+
+
+def phrases_to_regex(phrases: Iterable[str]) -> Optional[str]:
+    """
+    Build a trie-shaped regex matching any of `phrases` as whole words,
+    e.g. ["see ya", "see you soon"] -> \\b(?:see\\s+(?:ya|you\\s+soon))\\b.
+    Shared prefixes are matched once, so cost grows with phrase length, not count.
+    """
+    trie: dict = {}
+    for phrase in phrases:
+        tokens = phrase.lower().split()
+        if not tokens:
+            continue
+        node = trie
+        for char in " ".join(tokens):
+            node = node.setdefault(char, {})
+        node[""] = {}
+    if not trie:
+        return None
+
+    def emit(node):
+        terminal = "" in node
+        branches = []
+        for char in sorted(k for k in node if k):
+            piece = r"\s+" if char == " " else re.escape(char)
+            branches.append(piece + emit(node[char]))
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return r"\b(?:" + emit(trie) + r")\b"
+
+
+def load_intent_phrases(path) -> Dict[str, List[str]]:
+    """Read {"intent": ["phrase", ...]} from a JSON file; unknown intents are ignored."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    phrases = {}
+    for intent, values in data.items():
+        if intent not in INTENT_PRIORITY:
+            logger.warning(f"Ignoring phrases for unknown intent {intent!r}")
+            continue
+        phrases[intent] = [str(v) for v in values]
+    return phrases
+
+
+class IntentClassifier:
+    """Classifies a message into at most one intent, honouring `priority`."""
+
+    def __init__(self, patterns=None, phrases=None, priority=INTENT_PRIORITY):
+        patterns = {k: list(v) for k, v in (patterns or DEFAULT_PATTERNS).items()}
+        for intent, values in (phrases or {}).items():
+            regex = phrases_to_regex(values)
+            if regex:
+                patterns.setdefault(intent, []).append(regex)
+
+        self.priority = tuple(intent for intent in priority if patterns.get(intent))
+        groups = [
+            f"(?P<{intent}>" + "|".join(f"(?:{p})" for p in patterns[intent]) + ")"
+            for intent in self.priority
+        ]
+        self._combined = re.compile("(?=" + "|".join(groups) + ")", re.IGNORECASE)
+        self._rank = {intent: rank for rank, intent in enumerate(self.priority)}
+        self._single = {
+            intent: re.compile("|".join(f"(?:{p})" for p in patterns[intent]), re.IGNORECASE)
+            for intent in self.priority
+        }
+
+    def classify(self, message) -> Optional[str]:
+        """Return the highest-priority intent found in `message`, or None."""
+        text = message.strip()
+        best = None
+        for match in self._combined.finditer(text):
+            intent = match.lastgroup
+            if best is None or self._rank[intent] < self._rank[best]:
+                best = intent
+                if self._rank[best] == 0:
+                    break
+        return best
+
+    def has_intent(self, message, intent) -> bool:
+        return bool(self._single[intent].search(message.strip()))
@@ -0,0 +1,508 @@
+"""
+LLM client: deadlines, retries, hedged requests and a circuit breaker.
+
+LLMClient wraps the model built by a LazyBackend (Gemini, the stub, or
+HTTPGenerativeModel) and is the only thing app.py calls to generate text.
+
+- Every attempt must answer within `timeout` seconds. The deadline is also
+  passed to the model as `request_options={"timeout": ...}` so that the
+  underlying HTTP/gRPC call gives up too.
+- Transient failures (timeouts, connection errors, 408/429/5xx) are retried
+  up to `max_retries` times, sleeping a random time up to
+  min(backoff_max, backoff_base * 2**attempt) ("full jitter") in between.
+- With `hedge`, an attempt that has not answered within the recent
+  `hedge_percentile` latency gets a second, identical request, and the
+  first answer wins. Hedging stops while the breaker is counting failures.
+- After `failure_threshold` consecutive failed calls the breaker opens and
+  calls fail fast with LLMUnavailable for `reset_timeout` seconds. After that
+  one probe call is let through, and its result closes or reopens the breaker.
+
+LLMUnavailable is what callers catch to serve a degraded answer. Any other
+exception is a non-transient error from the model (e.g. a blocked prompt).
+"""
+import asyncio
+import functools
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+_END = object()  # what a stream read returns once the provider's iterator is exhausted
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# Exception class names (anywhere in the MRO) treated as transient, covering
+# requests and google.api_core without importing either.
+TRANSIENT_ERRORS = {
+    "ConnectionError", "Timeout", "ChunkedEncodingError", "DeadlineExceeded",
+    "ServiceUnavailable", "ResourceExhausted", "InternalServerError", "TooManyRequests",
+    "BadGateway", "GatewayTimeout", "Aborted",
+}
+
+
+class LLMUnavailable(Exception):
+    """The model cannot answer right now: the breaker is open or every retry failed."""
+
+
+class LLMTimeout(Exception):
+    """One attempt did not answer within the client's timeout."""
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, status_code, message=""):
+        super().__init__(f"HTTP {status_code}: {message}" if message else f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def is_transient(exc):
+    """True for failures worth retrying: timeouts, connection errors, 408/429/5xx"""
+    if isinstance(exc, (LLMTimeout, TimeoutError, ConnectionError)):
+        return True
+    for attr in ("status_code", "code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int) and status in TRANSIENT_STATUS:
+            return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(exc).__mro__)
+
+
+def response_text(response):
+    return response.text if hasattr(response, "text") else str(response)
+
+
+class LatencyWindow:
+    """The last `size` successful call latencies, for percentiles."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures -> half_open after `reset_timeout`."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now; in half_open only the single probe may"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("LLM circuit breaker closed")
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"LLM circuit breaker open for {self.reset_timeout:.0f}s")
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.opened}
+
+
+class LLMClient:
+    """
+    Deadline, retry, hedging and circuit-breaking wrapper around the model of
+    `backend`. Sync calls run on a private thread pool of `max_workers`, so a
+    hung request cannot hold the caller past its deadline.
+    """
+
+    def __init__(self, backend, timeout=30.0, max_retries=2, backoff_base=0.25, backoff_max=4.0,
+                 hedge=False, hedge_percentile=0.95, hedge_min_samples=20, breaker=None, max_workers=32):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyWindow()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(
+            ("calls", "attempts", "retries", "timeouts", "failures", "rejected", "hedges", "hedge_wins"), 0
+        )
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counts[name] += amount
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None when hedging is off or unwarranted"""
+        if not self.hedge or self.breaker.failures or len(self.latency) < self.hedge_min_samples:
+            return None
+        delay = self.latency.percentile(self.hedge_percentile)
+        return delay if delay < self.timeout else None
+
+    def _admit(self):
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise LLMUnavailable("circuit breaker is open")
+
+    def _give_up(self, error):
+        self._count("failures")
+        self.breaker.record_failure()
+        return LLMUnavailable(f"LLM failed after {self.max_retries + 1} attempts: {error!r}")
+
+    def _failed_attempt(self, attempt, error):
+        """Re-raise non-transient errors; the model answered, so the breaker counts a success"""
+        if not is_transient(error):
+            self.breaker.record_success()
+            raise error
+        if isinstance(error, LLMTimeout):
+            self._count("timeouts")
+        logger.warning(f"LLM attempt {attempt + 1} failed: {error!r}")
+
+    # --- sync ---
+
+    def _invoke(self, prompt_text, generation_config):
+        start = time.perf_counter()
+        response = self.backend.get().generate_content(
+            prompt_text, generation_config=generation_config, request_options={"timeout": self.timeout}
+        )
+        text = response_text(response)
+        self.latency.add(time.perf_counter() - start)
+        return text
+
+    def _attempt(self, prompt_text, generation_config):
+        self._count("attempts")
+        deadline = time.perf_counter() + self.timeout
+        futures = [self._executor.submit(self._invoke, prompt_text, generation_config)]
+        hedge_after = self.hedge_delay()
+        if hedge_after is not None and not wait(futures, timeout=hedge_after).done:
+            self._count("hedges")
+            futures.append(self._executor.submit(self._invoke, prompt_text, generation_config))
+        pending, error = set(futures), None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.perf_counter()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self._count("hedge_wins")
+                    # A losing request still running cannot be interrupted;
+                    # the model-side timeout ends it.
+                    return future.result()
+                error = future.exception()
+        if pending:
+            for future in pending:
+                future.cancel()
+            raise LLMTimeout(f"no answer within {self.timeout:.1f}s")
+        raise error
+
+    def generate(self, prompt_text, generation_config=None):
+        """Text of the model's answer; raises LLMUnavailable when it cannot answer"""
+        self._admit()
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(self._backoff(attempt))
+            try:
+                text = self._attempt(prompt_text, generation_config)
+            except Exception as e:
+                self._failed_attempt(attempt, e)
+                error = e
+                continue
+            self.breaker.record_success()
+            return text
+        raise self._give_up(error)
+
+    def _open_stream(self, prompt_text, generation_config):
+        """(chunk iterator, first non-empty text or None)"""
+        response = self.backend.get().generate_content(
+            prompt_text, generation_config=generation_config, stream=True,
+            request_options={"timeout": self.timeout},
+        )
+        chunks = iter(response)
+        for chunk in chunks:
+            text = getattr(chunk, "text", "")
+            if text:
+                return chunks, text
+        return chunks, None
+
+    def stream(self, prompt_text, generation_config=None):
+        """
+        Yield text pieces as they arrive. Opening the stream and waiting for
+        the first piece are retried like generate(); once a piece has been
+        yielded, errors propagate, and each later piece must arrive within
+        `timeout` or LLMTimeout is raised. Streams are never hedged.
+        """
+        self._admit()
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(self._backoff(attempt))
+            self._count("attempts")
+            future = self._executor.submit(self._open_stream, prompt_text, generation_config)
+            try:
+                chunks, first = future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                error = LLMTimeout(f"no first token within {self.timeout:.1f}s")
+                self._failed_attempt(attempt, error)
+                continue
+            except Exception as e:
+                self._failed_attempt(attempt, e)
+                error = e
+                continue
+            self.breaker.record_success()
+            if first is None:
+                return
+            yield first
+            while True:
+                # Read on the pool so a stalled provider stream cannot hold
+                # the caller past the deadline, as in astream().
+                future = self._executor.submit(next, chunks, _END)
+                try:
+                    chunk = future.result(timeout=self.timeout)
+                except TimeoutError:
+                    raise LLMTimeout(f"stream stalled for {self.timeout:.1f}s")
+                if chunk is _END:
+                    return
+                text = getattr(chunk, "text", "")
+                if text:
+                    yield text
+        raise self._give_up(error)
+
+    # --- async ---
+
+    async def _ainvoke(self, prompt_text, generation_config):
+        start = time.perf_counter()
+        model = await self.backend.aget()
+        response = await model.generate_content_async(
+            prompt_text, generation_config=generation_config, request_options={"timeout": self.timeout}
+        )
+        text = response_text(response)
+        self.latency.add(time.perf_counter() - start)
+        return text
+
+    async def _aattempt(self, prompt_text, generation_config):
+        self._count("attempts")
+        deadline = time.perf_counter() + self.timeout
+        tasks = [asyncio.ensure_future(self._ainvoke(prompt_text, generation_config))]
+        try:
+            hedge_after = self.hedge_delay()
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self._count("hedges")
+                    tasks.append(asyncio.ensure_future(self._ainvoke(prompt_text, generation_config)))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - time.perf_counter()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise LLMTimeout(f"no answer within {self.timeout:.1f}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def agenerate(self, prompt_text, generation_config=None):
+        """Async variant of generate()"""
+        self._admit()
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt))
+            try:
+                text = await self._aattempt(prompt_text, generation_config)
+            except Exception as e:
+                self._failed_attempt(attempt, e)
+                error = e
+                continue
+            self.breaker.record_success()
+            return text
+        raise self._give_up(error)
+
+    async def _aopen_stream(self, prompt_text, generation_config):
+        model = await self.backend.aget()
+        response = await model.generate_content_async(
+            prompt_text, generation_config=generation_config, stream=True,
+            request_options={"timeout": self.timeout},
+        )
+        chunks = response.__aiter__()
+        async for chunk in chunks:
+            text = getattr(chunk, "text", "")
+            if text:
+                return chunks, text
+        return chunks, None
+
+    async def astream(self, prompt_text, generation_config=None):
+        """Async variant of stream(); each later piece must also arrive within `timeout`"""
+        self._admit()
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt))
+            self._count("attempts")
+            try:
+                chunks, first = await asyncio.wait_for(
+                    self._aopen_stream(prompt_text, generation_config), timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                error = LLMTimeout(f"no first token within {self.timeout:.1f}s")
+                self._failed_attempt(attempt, error)
+                continue
+            except Exception as e:
+                self._failed_attempt(attempt, e)
+                error = e
+                continue
+            self.breaker.record_success()
+            if first is None:
+                return
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise LLMTimeout(f"stream stalled for {self.timeout:.1f}s")
+                text = getattr(chunk, "text", "")
+                if text:
+                    yield text
+        raise self._give_up(error)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counts)
+        p50, p95 = self.latency.percentile(0.5), self.latency.percentile(0.95)
+        data["p50_ms"] = round(p50 * 1000, 1) if p50 is not None else None
+        data["p95_ms"] = round(p95 * 1000, 1) if p95 is not None else None
+        data["breaker"] = self.breaker.stats()
+        return data
+
+
+class _HTTPChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class _HTTPStream:
+    """Newline-delimited JSON chunks of a streamed HTTP response, iterable sync or async."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def __iter__(self):
+        try:
+            for line in self.response.iter_lines():
+                if line:
+                    yield _HTTPChunk(json.loads(line).get("text", ""))
+        finally:
+            self.response.close()
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        chunks = iter(self)
+        done = object()
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+
+
+class HTTPGenerativeModel:
+    """
+    generate_content over HTTP/JSON, for a self-hosted model or the fake
+    server in benchmarks/fake_llm_server.py. Requests are POSTed to `url` as
+    {"prompt", "generation_config", "stream"}; the reply is {"text": ...}, or
+    one such object per line when streaming. One requests.Session with a
+    pool of `pool_size` keep-alive connections is shared by all calls.
+    """
+
+    def __init__(self, url, pool_size=32, connect_timeout=3.05, read_timeout=60.0, headers=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def generate_content(self, contents, generation_config=None, stream=False, request_options=None):
+        timeout = (request_options or {}).get("timeout", self.read_timeout)
+        response = self.session.post(
+            self.url,
+            json={"prompt": contents, "generation_config": generation_config or {}, "stream": stream},
+            timeout=(self.connect_timeout, timeout),
+            stream=stream,
+        )
+        if response.status_code >= 400:
+            message = response.text[:200]
+            response.close()
+            raise HTTPStatusError(response.status_code, message)
+        if stream:
+            return _HTTPStream(response)
+        return _HTTPChunk(response.json().get("text", ""))
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, request_options=None):
+        call = functools.partial(self.generate_content, contents, generation_config, stream, request_options)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,436 @@
+"""
+On-disk vector index backend, an offline alternative to PineconeVectorStore.
+
+Vectors are L2-normalized and stored as a memory-mapped float32 (or int8 with
+per-row scales) matrix. An inverted-file (IVF) index built with spherical
+k-means narrows each query to the `nprobe` closest clusters, so search cost
+grows with the probed lists rather than with the whole corpus.
+
+Layout of `index_dir`:
+    CURRENT              name of the active version directory
+    v<hex>/meta.json     ids, documents, dimension, quantization
+    v<hex>/vectors.npy   float32 (n, d) or int8 (n, d)
+    v<hex>/scales.npy    float32 (n,), int8 only
+    v<hex>/centroids.npy float32 (nlist, d)
+    v<hex>/lists.npy     row ids grouped by cluster
+    v<hex>/offsets.npy   start of each cluster in lists.npy (nlist + 1)
+
+Each save writes a fresh version directory and then swaps CURRENT, so serving
+processes never observe a half-written index. A serving process loads the new
+version into a fresh _Snapshot and swaps it in whole; each search reads one
+snapshot, so a reload never mixes rows of one version with documents of another.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+logger = logging.getLogger(__name__)
+
+KMEANS_SAMPLE = 20000
+KMEANS_ITERATIONS = 10
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize_int8(matrix):
+    """Symmetric per-row int8 quantization; returns (codes, scales)."""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def spherical_kmeans(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """Cosine k-means on a sample of the (normalized) vectors; returns centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > KMEANS_SAMPLE:
+        sample = vectors[rng.choice(len(vectors), KMEANS_SAMPLE, replace=False)]
+    sample = np.asarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                centroids[c] = sample[rng.integers(len(sample))]
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+def build_ivf(vectors, nlist, batch_size=8192):
+    """Cluster `vectors` and return (centroids, lists, offsets)."""
+    centroids = spherical_kmeans(vectors, nlist)
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        block = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+        assignment[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+    lists = np.argsort(assignment, kind="stable").astype(np.int64)
+    counts = np.bincount(assignment, minlength=nlist)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return centroids, lists, offsets
+
+
+class _Snapshot:
+    """One loaded index version. Replaced as a whole on reload, never modified."""
+
+    __slots__ = ("version", "quantization", "ids", "docs", "row_of", "vectors", "scales",
+                 "centroids", "lists", "offsets")
+
+    def __init__(self, version=None, quantization="none", ids=(), docs=(), vectors=None, scales=None,
+                 centroids=None, lists=None, offsets=None):
+        self.version = version
+        self.quantization = quantization
+        self.ids: List[str] = list(ids)
+        self.docs: List[dict] = list(docs)
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.vectors = vectors
+        self.scales = scales
+        self.centroids = centroids
+        self.lists = lists
+        self.offsets = offsets
+
+
+class LocalVectorStore(VectorStore):
+    """
+    LangChain VectorStore over a local, memory-mapped matrix with an IVF index.
+
+    `quantization` is "none" (float32) or "int8". `nlist` defaults to about
+    sqrt(n) clusters; an index smaller than `min_ivf_size` is searched exactly.
+    """
+
+    def __init__(self, index_dir, embedding: Embeddings, quantization="none",
+                 nprobe=8, nlist=None, min_ivf_size=2048, watch_interval=5.0):
+        self.index_dir = index_dir
+        self.embedding = embedding
+        self.quantization = quantization
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self.min_ivf_size = min_ivf_size
+        self.watch_interval = watch_interval
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._index = _Snapshot(quantization=quantization)
+        self._reset()
+
+    def _reset(self):
+        """Drop unsaved mutations"""
+        # Unsaved mutations from ingestion: added rows, and saved rows deleted.
+        self._pending_ids: List[str] = []
+        self._pending_set = set()  # membership index over _pending_ids
+        self._pending_docs: List[dict] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._deleted_rows = set()
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    # ---- persistence -------------------------------------------------
+
+    @classmethod
+    def load(cls, index_dir, embedding: Embeddings, **kwargs):
+        store = cls(index_dir, embedding, **kwargs)
+        if not store._load_current():
+            logger.warning(f"No local vector index found in {index_dir}; starting empty")
+        return store
+
+    def _current_version(self):
+        try:
+            with open(os.path.join(self.index_dir, "CURRENT"), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _load_current(self):
+        version = self._current_version()
+        if version is None:
+            return False
+        path = os.path.join(self.index_dir, version)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {}
+        if meta["ids"]:
+            arrays["vectors"] = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+            if meta["quantization"] == "int8":
+                arrays["scales"] = np.load(os.path.join(path, "scales.npy"))
+            if meta.get("ivf"):
+                arrays["centroids"] = np.load(os.path.join(path, "centroids.npy"))
+                arrays["lists"] = np.load(os.path.join(path, "lists.npy"), mmap_mode="r")
+                arrays["offsets"] = np.load(os.path.join(path, "offsets.npy"))
+        index = _Snapshot(version, meta["quantization"], meta["ids"], meta["documents"], **arrays)
+        self._reset()
+        self.quantization = index.quantization
+        self._index = index
+        logger.info(f"Loaded local vector index {path} ({len(index.ids)} vectors, {index.quantization})")
+        return True
+
+    def _maybe_reload(self):
+        """Pick up a newer version written by store_index.py."""
+        if self._pending_ids or self._deleted_rows:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        # One thread reloads; the others keep searching the current snapshot.
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.watch_interval
+            version = self._current_version()
+            if version is not None and version != self._index.version:
+                self._load_current()
+        finally:
+            self._reload_lock.release()
+
+    def _dense_vectors(self):
+        """All live vectors as float32, applying unsaved mutations."""
+        parts, ids, docs = [], [], []
+        index = self._index
+        if index.vectors is not None and len(index.ids):
+            keep = np.array([r for r in range(len(index.ids)) if r not in self._deleted_rows], dtype=np.int64)
+            base = np.asarray(index.vectors[keep], dtype=np.float32)
+            # Dequantize by what was loaded, not by the target format for the next save.
+            if index.scales is not None:
+                base = base * index.scales[keep][:, None]
+            parts.append(base)
+            ids.extend(index.ids[r] for r in keep)
+            docs.extend(index.docs[r] for r in keep)
+        if self._pending_vectors:
+            parts.append(np.vstack(self._pending_vectors))
+            ids.extend(self._pending_ids)
+            docs.extend(self._pending_docs)
+        dim = parts[0].shape[1] if parts else 0
+        vectors = np.vstack(parts) if parts else np.zeros((0, dim), dtype=np.float32)
+        return ids, docs, vectors
+
+    def save(self):
+        """Write the current contents as a new version and make it active."""
+        ids, docs, vectors = self._dense_vectors()
+        version = f"v{uuid.uuid4().hex[:12]}"
+        path = os.path.join(self.index_dir, version)
+        os.makedirs(path)
+
+        meta = {
+            "ids": ids,
+            "documents": docs,
+            "dimension": int(vectors.shape[1]) if len(vectors) else 0,
+            "quantization": self.quantization,
+            "ivf": False,
+        }
+        if len(vectors):
+            if self.quantization == "int8":
+                codes, scales = quantize_int8(vectors)
+                np.save(os.path.join(path, "vectors.npy"), codes)
+                np.save(os.path.join(path, "scales.npy"), scales)
+            else:
+                np.save(os.path.join(path, "vectors.npy"), vectors.astype(np.float32))
+            if len(vectors) >= self.min_ivf_size:
+                nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+                centroids, lists, offsets = build_ivf(vectors, nlist)
+                np.save(os.path.join(path, "centroids.npy"), centroids)
+                np.save(os.path.join(path, "lists.npy"), lists)
+                np.save(os.path.join(path, "offsets.npy"), offsets)
+                meta["ivf"] = True
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        previous = self._current_version()
+        tmp = os.path.join(self.index_dir, "CURRENT.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(self.index_dir, "CURRENT"))
+        self._load_current()
+        # Keep the previous version briefly for readers that just opened it.
+        for name in os.listdir(self.index_dir):
+            if name.startswith("v") and name not in (version, previous):
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+        logger.info(f"Saved local vector index {path} ({len(ids)} vectors)")
+
+    def clear(self):
+        self._reset()
+        self.save()
+
+    # ---- mutation (ingestion) ---------------------------------------
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        vectors = self.embedding.embed_documents(texts)
+        docs = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return self.add_vectors(ids, vectors, docs)
+
+    def add_vectors(self, ids: List[str], vectors, docs: Optional[List[Document]] = None) -> List[str]:
+        """
+        Upsert precomputed embeddings under `ids`; `docs` defaults to empty
+        documents. Visible to searches after the next save().
+        """
+        ids = list(ids)
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if len(vectors) != len(ids) or (docs is not None and len(docs) != len(ids)):
+            raise ValueError("ids, vectors and docs must have the same length")
+        self.delete(ids)
+        self._pending_ids.extend(ids)
+        self._pending_set.update(ids)
+        if docs is None:
+            self._pending_docs.extend({"page_content": "", "metadata": {}} for _ in ids)
+        else:
+            self._pending_docs.extend({"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs)
+        self._pending_vectors.append(vectors)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return True
+        wanted = set(ids)
+        for doc_id in wanted:
+            row = self._index.row_of.get(doc_id)
+            if row is not None:
+                self._deleted_rows.add(row)
+        if not self._pending_set.isdisjoint(wanted):
+            # Rare: the same ID upserted twice within one run.
+            ids_, docs_, vectors_ = self._dense_pending(exclude=wanted)
+            self._pending_ids, self._pending_docs, self._pending_vectors = ids_, docs_, vectors_
+            self._pending_set = set(ids_)
+        return True
+
+    def _dense_pending(self, exclude):
+        if not self._pending_vectors:
+            return [], [], []
+        stacked = np.vstack(self._pending_vectors)
+        keep = [i for i, doc_id in enumerate(self._pending_ids) if doc_id not in exclude]
+        return (
+            [self._pending_ids[i] for i in keep],
+            [self._pending_docs[i] for i in keep],
+            [stacked[keep]] if keep else [],
+        )
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, index_dir="vector_index", **kwargs: Any):
+        store = cls(index_dir, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.save()
+        return store
+
+    # ---- search -------------------------------------------------------
+
+    def _candidate_rows(self, index, query):
+        if index.centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(index.centroids))
+        probed = np.argpartition(-(index.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([index.lists[index.offsets[c]:index.offsets[c + 1]] for c in probed])
+
+    def _score_rows(self, index, query, rows=None):
+        vectors = index.vectors if rows is None else index.vectors[rows]
+        scores = np.asarray(vectors, dtype=np.float32) @ query
+        if index.scales is not None:
+            scores *= index.scales if rows is None else index.scales[rows]
+        return scores
+
+    def _search(self, index, embedding, k):
+        if index.vectors is None or not len(index.ids):
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        rows = self._candidate_rows(index, query)
+        scores = self._score_rows(index, query, rows)
+        if rows is None:
+            rows = np.arange(len(scores))
+        if self._deleted_rows:
+            alive = np.array([r not in self._deleted_rows for r in rows])
+            rows, scores = rows[alive], scores[alive]
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _current_index(self):
+        self._maybe_reload()
+        return self._index
+
+    def search_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[int, float]]:
+        """Top-k (row, cosine score) pairs from the saved index."""
+        return self._search(self._current_index(), embedding, k)
+
+    @staticmethod
+    def _document(index, row):
+        doc = index.docs[row]
+        return Document(id=index.ids[row], page_content=doc["page_content"], metadata=doc["metadata"])
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        index = self._current_index()
+        return [(self._document(index, row), score) for row, score in self._search(index, embedding, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        """Pick `k` of the `fetch_k` nearest rows, trading relevance against redundancy."""
+        index = self._current_index()
+        hits = self._search(index, embedding, fetch_k)
+        if not hits:
+            return []
+        rows = np.array([row for row, _ in hits], dtype=np.int64)
+        candidates = np.asarray(index.vectors[rows], dtype=np.float32)
+        if index.scales is not None:
+            candidates = candidates * index.scales[rows][:, None]
+        picked = maximal_marginal_relevance(
+            np.asarray(embedding, dtype=np.float32), candidates, lambda_mult=lambda_mult, k=min(k, len(rows))
+        )
+        return [self._document(index, int(rows[i])) for i in picked]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding.embed_query(query), k, fetch_k, lambda_mult
+        )
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    def stats(self):
+        index = self._index
+        return {
+            "version": index.version,
+            "vectors": len(index.ids),
+            "quantization": index.quantization,
+            "ivf_lists": len(index.centroids) if index.centroids is not None else 0,
+            "nprobe": self.nprobe,
+        }
+
+    def __len__(self):
+        return len(self._index.ids) - len(self._deleted_rows) + len(self._pending_ids)
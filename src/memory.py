@@ -0,0 +1,284 @@
+"""
+Per-session conversation memory in chat_history.db.
+
+Turns are written by a background thread in batched transactions, so a
+request only appends to an in-process queue. Recent turns per session are
+also kept in memory, and the database (WAL mode, indexed on session_id) is
+read only for sessions this process has not seen yet.
+
+`build_history` turns stored turns into prompt messages: the last few turns
+(only the newest answer in full), older ones folded into a one-line
+extractive summary of the questions asked, all under a token budget.
+"""
+import logging
+import queue
+import re
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from typing import List, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]
+
+# Messages that lean on earlier turns: leading cues ("what about ...",
+# "and in children?", "tell me more") and bare instructions ("explain briefly").
+FOLLOW_UP_CUE = re.compile(
+    r"^\s*(and|also|but|so|then|what\s+about|how\s+about|what\s+else|anything\s+else"
+    r"|tell\s+me\s+more|more\s+(about|on)|same\s+for)\b"
+    r"|^\s*(why(\s+(is|was)\s+(that|it)|\s+not)?"
+    r"|(explain|elaborate|summari[sz]e|continue|go\s+on)(\s+(briefly|again|please|more|in\s+short|in\s+detail))*)"
+    r"\s*[?.!]*\s*$",
+    re.IGNORECASE,
+)
+ANAPHORA = re.compile(r"\b(it|its|it'?s|this|that|these|those|they|them|their|same)\b", re.IGNORECASE)
+SHORT_FOLLOW_UP_WORDS = 6
+
+_WORDS = re.compile(r"[a-z][a-z0-9'-]*")
+# Words that do not name a subject: function words, question words, and the
+# generic aspects of a subject that follow-ups ask about.
+_NON_SUBJECT_WORDS = set("""
+a an the and or but nor so then also not no yes of to in on at by for from with without about into over
+after before during while than as if when where which who whom whose what why how
+is are was were be been being am do does did done has have had having can could should would will
+shall may might must i me my we us our you your he him his she her it its it's this that these those
+they them their same one ones there here any some much many more most less very too just only even
+still again ever really please tell know want need like get gets got take takes taking taken make
+makes give use used using usual usually typical typically normally recommended ok okay else anything
+something thing things way explain elaborate summarize summarise continue go briefly short detail details
+symptom symptoms sign signs cause causes caused causing treat treats treated treating treatment
+treatments cure cures cured side effect effects risk risks dose doses dosage dosing safe safely
+dangerous serious normal common contagious work works working help helps prevent prevention
+diagnose diagnosed diagnosis prognosis complication complications option options long last lasts
+often bad good better worse best worst alternative alternatives interaction interactions difference
+mean means happen happens type types kind kinds child children kid kids adult adults elderly
+pregnant pregnancy women men people someone food meals
+""".split())
+
+
+def estimate_tokens(text) -> int:
+    """Rough token count (~4 characters per token); cheap and model-agnostic."""
+    return len(text) // 4 + 1
+
+
+def names_subject(message) -> bool:
+    """True when the message names something of its own ("acne", "metformin", "a rash")"""
+    return any(word not in _NON_SUBJECT_WORDS for word in _WORDS.findall(message.lower()))
+
+
+def is_follow_up(message) -> bool:
+    """
+    True for messages that only make sense with earlier turns: a leading cue
+    or bare instruction, or a pronoun ("is it contagious?") in a message that
+    is short or names no subject of its own. "What is hypothyroidism and how
+    is it treated?" is standalone.
+    """
+    if FOLLOW_UP_CUE.search(message):
+        return True
+    if not ANAPHORA.search(message):
+        return False
+    return len(message.split()) <= SHORT_FOLLOW_UP_WORDS or not names_subject(message)
+
+
+def refers_back(message) -> bool:
+    """
+    True for a follow-up whose retrieval query needs the previous topic: it
+    points back with a pronoun or names nothing of its own. "What about
+    diabetes?" is a follow-up but is retrieved on its own.
+    """
+    return is_follow_up(message) and (bool(ANAPHORA.search(message)) or not names_subject(message))
+
+
+def first_sentence(text, max_chars=160):
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "..."
+
+
+def build_history(turns: Sequence[Turn], max_turns=4, token_budget=600) -> List[BaseMessage]:
+    """
+    Prompt messages for `turns` (oldest first): up to `max_turns` recent turns,
+    newest first into the budget, with earlier answers cut to their first
+    sentence; then a summary of the questions asked before them with whatever
+    budget is left.
+    """
+    recent, used = [], 0
+    for question, answer in reversed(turns[-max_turns:]):
+        answer = first_sentence(answer, 400) if recent else answer
+        cost = estimate_tokens(question) + estimate_tokens(answer)
+        if used + cost > token_budget:
+            break
+        recent.append((question, answer))
+        used += cost
+    recent.reverse()
+
+    older = [question for question, _ in turns[: len(turns) - len(recent)]]
+    summary = None
+    while older:
+        summary = "Earlier in this conversation the user asked: " + "; ".join(older)
+        if used + estimate_tokens(summary) <= token_budget:
+            break
+        older.pop(0)
+        summary = None
+
+    messages: List[BaseMessage] = []
+    if summary:
+        messages.append(SystemMessage(content=summary))
+    for question, answer in recent:
+        messages.append(HumanMessage(content=question))
+        messages.append(AIMessage(content=answer))
+    return messages
+
+
+class ConversationStore:
+    """
+    chat_history(id, session_id, question, answer, timestamp) with a write-behind
+    queue. `max_turns` recent turns are kept per session for up to
+    `max_sessions` sessions.
+    """
+
+    def __init__(self, path, max_turns=20, max_sessions=10000, flush_interval=0.5, max_batch=256):
+        self.path = path
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._sessions: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self.writes = 0
+        self.batches = 0
+        self.db_reads = 0
+        self._migrate()
+        self._writer = threading.Thread(target=self._write_loop, name="chat-history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _migrate(self):
+        conn = self._connect()
+        try:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS chat_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chat_history)")}
+            if "session_id" not in columns:
+                conn.execute("ALTER TABLE chat_history ADD COLUMN session_id TEXT")
+            if "answer" not in columns:
+                conn.execute("ALTER TABLE chat_history ADD COLUMN answer TEXT")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history (session_id, id)"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _cached(self, session_id):
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is not None:
+                self._sessions.move_to_end(session_id)
+            return turns
+
+    def _remember(self, session_id, turns):
+        with self._lock:
+            existing = self._sessions.get(session_id)
+            if existing is not None:
+                # A turn recorded while we were reading the database wins.
+                return existing
+            self._sessions[session_id] = turns
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return turns
+
+    def recent_turns(self, session_id) -> List[Turn]:
+        """Last `max_turns` (question, answer) pairs, oldest first"""
+        turns = self._cached(session_id)
+        if turns is None:
+            self.db_reads += 1
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT question, answer FROM chat_history WHERE session_id = ? "
+                    "ORDER BY id DESC LIMIT ?",
+                    (session_id, self.max_turns),
+                ).fetchall()
+            finally:
+                conn.close()
+            loaded = deque(((q, a or "") for q, a in reversed(rows)), maxlen=self.max_turns)
+            turns = self._remember(session_id, loaded)
+        with self._lock:
+            return list(turns)
+
+    def start_session(self, session_id):
+        """Mark a newly created session as empty, so it is never looked up in the database"""
+        self._remember(session_id, deque(maxlen=self.max_turns))
+
+    def record(self, session_id, question, answer):
+        """Remember a turn now; it reaches the database on the next flush"""
+        if self._cached(session_id) is None:
+            # Load what an earlier process stored first, so it is not shadowed.
+            self.recent_turns(session_id)
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                turns = self._sessions[session_id] = deque(maxlen=self.max_turns)
+            turns.append((question, answer))
+            self._sessions.move_to_end(session_id)
+        self._queue.put((session_id, question, answer))
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO chat_history (session_id, question, answer) VALUES (?, ?, ?)",
+                        batch,
+                    )
+                self.writes += len(batch)
+                self.batches += 1
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write {len(batch)} chat history rows: {e}")
+            if stop:
+                break
+        conn.close()
+
+    def close(self):
+        """Flush queued turns and stop the writer"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=10)
+
+    def stats(self):
+        return {
+            "sessions_cached": len(self._sessions),
+            "queued": self._queue.qsize(),
+            "writes": self.writes,
+            "batches": self.batches,
+            "db_reads": self.db_reads,
+        }
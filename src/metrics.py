@@ -0,0 +1,347 @@
+"""
+Request tracing and Prometheus-style metrics for the answer pipeline.
+
+A request is wrapped in `Tracer.request` (or decorated with `Tracer.traced`)
+and each stage in `span("name")`. Every span feeds the rag_stage_seconds
+histogram, and the whole request feeds rag_request_seconds; `/metrics`
+renders both in the Prometheus text format. A sampled share of requests, and
+every slow one, is written to the trace log as one JSON line with its spans.
+
+With `profile_slow_ms` set, sync requests run under cProfile, and those
+slower than the threshold leave a .prof file in `profile_dir`. The file
+works with `python -m pstats`, snakeviz or flameprof.
+
+Metrics are per process: with several gunicorn workers, each reports its own.
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: (list(c), s, n) for key, (c, s, n) in self._series.items()}
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, {"le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class CallbackMetric:
+    """Values read at scrape time: `callback()` returns {label values tuple: number}."""
+
+    def __init__(self, name, documentation, labelnames, callback, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.error(f"Metric {self.name} failed: {e}")
+            return lines
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def callback(self, name, documentation, labelnames, callback, kind="gauge"):
+        return self.register(CallbackMetric(name, documentation, labelnames, callback, kind))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Spans of one request, as (stage, start offset, seconds)."""
+
+    def __init__(self, tracer, route):
+        self.tracer = tracer
+        self.route = route
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.outcome = "ok"
+        self.duration = None
+
+    def record(self, stage, start, seconds):
+        self.spans.append((stage, start - self.start, seconds))
+        self.tracer.stage_seconds.observe(seconds, stage=stage)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "route": self.route,
+            "outcome": self.outcome,
+            "timestamp": self.started_at,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "spans": [
+                {"stage": stage, "start_ms": round(offset * 1000, 3), "duration_ms": round(seconds * 1000, 3)}
+                for stage, offset, seconds in self.spans
+            ],
+        }
+
+
+@contextmanager
+def span(stage):
+    """Time a pipeline stage of the current request; a no-op outside one"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(stage, start, time.perf_counter() - start)
+
+
+def record_stage(stage, start):
+    """Record a stage that began at perf_counter() `start` and ends now"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(stage, start, time.perf_counter() - start)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def set_outcome(outcome):
+    """Label the current request (canned, cache, llm, error, ...)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.outcome = outcome
+
+
+class Tracer:
+    """
+    Records request and stage latency into `registry`. Traces are logged for
+    a `sample_rate` share of requests and for every request slower than
+    `slow_ms`, to `log_path` as JSON lines or to the logger when unset.
+    """
+
+    def __init__(self, registry, sample_rate=0.01, slow_ms=2000.0, log_path=None,
+                 profile_slow_ms=None, profile_dir="profiles", profile_sample_rate=1.0):
+        self.registry = registry
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self.profile_slow_ms = profile_slow_ms
+        self.profile_dir = profile_dir
+        self.profile_sample_rate = profile_sample_rate
+        self._log_lock = threading.Lock()
+        # cProfile can only profile one request at a time on newer Pythons.
+        self._profile_lock = threading.Lock()
+        self.request_seconds = registry.histogram(
+            "rag_request_seconds", "End-to-end request latency", ("route",)
+        )
+        self.stage_seconds = registry.histogram(
+            "rag_stage_seconds", "Latency of each answer pipeline stage", ("stage",)
+        )
+        self.requests_total = registry.counter(
+            "rag_requests_total", "Requests by route and outcome", ("route", "outcome")
+        )
+
+    def _start_profiler(self):
+        if self.profile_slow_ms is None or random.random() >= self.profile_sample_rate:
+            return None
+        if not self._profile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            self._profile_lock.release()
+            return None
+        return profiler
+
+    def _stop_profiler(self, profiler, trace):
+        try:
+            profiler.disable()
+            if trace.duration * 1000 < self.profile_slow_ms:
+                return
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{trace.trace_id}.prof")
+            profiler.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(25)
+            with open(path[:-5] + ".txt", "w", encoding="utf-8") as f:
+                f.write(json.dumps(trace.to_dict()) + "\n\n" + summary.getvalue())
+            logger.info(f"Slow request {trace.trace_id} ({trace.duration * 1000:.0f} ms) profiled to {path}")
+        finally:
+            self._profile_lock.release()
+
+    def _log(self, trace):
+        line = json.dumps(trace.to_dict())
+        if not self.log_path:
+            logger.info(f"trace {line}")
+            return
+        with self._log_lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    @contextmanager
+    def request(self, route, profile=True):
+        trace = Trace(self, route)
+        token = _current_trace.set(trace)
+        profiler = self._start_profiler() if profile else None
+        try:
+            yield trace
+        except (GeneratorExit, asyncio.CancelledError):
+            # Client went away mid-stream.
+            trace.outcome = "cancelled"
+            raise
+        except BaseException:
+            trace.outcome = "error"
+            raise
+        finally:
+            trace.duration = time.perf_counter() - trace.start
+            if profiler is not None:
+                self._stop_profiler(profiler, trace)
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                # An abandoned stream finalized from another context.
+                pass
+            self.request_seconds.observe(trace.duration, route=route)
+            self.requests_total.inc(route=route, outcome=trace.outcome)
+            if trace.duration * 1000 >= self.slow_ms or random.random() < self.sample_rate:
+                self._log(trace)
+
+    def traced(self, route):
+        """
+        Decorator running a view (function, coroutine, or sync/async generator
+        for streamed responses) inside `request(route)`. Only plain functions
+        are profiled; the others interleave with other requests.
+        """
+        def decorate(fn):
+            if inspect.isasyncgenfunction(fn):
+                @functools.wraps(fn)
+                async def agen_wrapper(*args, **kwargs):
+                    with self.request(route, profile=False):
+                        async for item in fn(*args, **kwargs):
+                            yield item
+                return agen_wrapper
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def coro_wrapper(*args, **kwargs):
+                    with self.request(route, profile=False):
+                        return await fn(*args, **kwargs)
+                return coro_wrapper
+            if inspect.isgeneratorfunction(fn):
+                @functools.wraps(fn)
+                def gen_wrapper(*args, **kwargs):
+                    with self.request(route, profile=False):
+                        yield from fn(*args, **kwargs)
+                return gen_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.request(route):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
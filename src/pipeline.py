@@ -0,0 +1,325 @@
+"""
+The question-answering pipeline shared by the Flask (app.py) and asyncio
+(asgi.py) serving paths.
+
+Stages: conversation history → precomputed tier → retrieval → semantic
+answer cache → context packing and prompt → LLM → sanitize → cache and
+history writes. Concurrent identical standalone questions share one run.
+
+The stages are written once, as generator "programs". A program yields each
+blocking step it needs as a Call of a Stage, which holds a sync and an async
+implementation. run()/iterate() execute the sync ones, and arun()/aiterate()
+await the async ones, so the Flask and asyncio paths cannot drift apart. A
+program yields Emit(text) for each piece of a streamed answer and Next(it)
+to read the next piece from an LLM stream.
+"""
+import asyncio
+import inspect
+import logging
+
+from src.cache import normalize_query
+from src.metrics import set_outcome, span
+from src.singleflight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DONE = object()  # what Next sends back once a stream is exhausted
+
+
+class IncompleteAnswer(Exception):
+    """The LLM stream failed after part of the answer was sent; nothing was stored."""
+
+
+class Stage:
+    """A blocking step with a sync and an async implementation"""
+
+    __slots__ = ("sync", "async_")
+
+    def __init__(self, sync, async_=None):
+        self.sync = sync
+        self.async_ = async_ or sync
+
+    @classmethod
+    def threaded(cls, fn):
+        """A stage whose async variant runs the sync one on the default executor"""
+        return cls(fn, lambda *args: asyncio.to_thread(fn, *args))
+
+
+class Call:
+    __slots__ = ("stage", "args")
+
+    def __init__(self, stage, *args):
+        self.stage = stage
+        self.args = args
+
+
+class Next:
+    __slots__ = ("stream",)
+
+    def __init__(self, stream):
+        self.stream = stream
+
+
+class Emit:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _execute(step):
+    if isinstance(step, Call):
+        return step.stage.sync(*step.args)
+    if isinstance(step, Next):
+        return next(step.stream, DONE)
+    raise TypeError(f"Unexpected pipeline step {step!r}")
+
+
+async def _aexecute(step):
+    if isinstance(step, Call):
+        result = step.stage.async_(*step.args)
+        return await result if inspect.isawaitable(result) else result
+    if isinstance(step, Next):
+        return await anext(step.stream, DONE)
+    raise TypeError(f"Unexpected pipeline step {step!r}")
+
+
+def _advance(program, result, error):
+    """The program's next step; StopIteration carries its return value"""
+    if error is not None:
+        return program.throw(error)
+    return program.send(result)
+
+
+def run(program):
+    """Run a program to completion with the sync stages; returns its result"""
+    result = error = None
+    while True:
+        try:
+            step = _advance(program, result, error)
+        except StopIteration as stop:
+            return stop.value
+        result = error = None
+        try:
+            result = _execute(step)
+        except Exception as e:
+            error = e
+
+
+def iterate(program):
+    """Run a streaming program with the sync stages, yielding what it emits"""
+    result = error = None
+    try:
+        while True:
+            try:
+                step = _advance(program, result, error)
+            except StopIteration:
+                return
+            result = error = None
+            if isinstance(step, Emit):
+                yield step.value
+                continue
+            try:
+                result = _execute(step)
+            except Exception as e:
+                error = e
+    finally:
+        program.close()
+
+
+async def arun(program):
+    """Async variant of run()"""
+    result = error = None
+    while True:
+        try:
+            step = _advance(program, result, error)
+        except StopIteration as stop:
+            return stop.value
+        result = error = None
+        try:
+            result = await _aexecute(step)
+        except Exception as e:
+            error = e
+
+
+async def aiterate(program):
+    """Async variant of iterate()"""
+    result = error = None
+    try:
+        while True:
+            try:
+                step = _advance(program, result, error)
+            except StopIteration:
+                return
+            result = error = None
+            if isinstance(step, Emit):
+                yield step.value
+                continue
+            try:
+                result = await _aexecute(step)
+            except Exception as e:
+                error = e
+    finally:
+        program.close()
+
+
+class AnswerPipeline:
+    """
+    The serving pipeline over the app's components. Stages are Stage objects;
+    the rest are plain callables cheap enough to run on the event loop:
+
+    - history(session_id, msg) -> (retrieval query, history messages)
+    - precomputed(msg, history) -> answer or None
+    - retrieve(query) -> documents
+    - cache_lookup(msg, docs, history) -> (answer or None, query vector, context key)
+    - generate(inputs) -> raw answer, through the pack -> prompt -> LLM chain
+    - llm_stream(prompt, packed docs) -> iterator of answer pieces
+    - remember(session_id, msg, raw answer, final response), records the turn
+    """
+
+    def __init__(self, *, history, precomputed, retrieve, cache_lookup, generate, llm_stream,
+                 pack, format_prompt, sanitize, disclaimer, outcome_of, store, remember, coalesce=True):
+        self.history = history
+        self.precomputed = precomputed
+        self.retrieve = retrieve
+        self.cache_lookup = cache_lookup
+        self.generate = generate
+        self.llm_stream = llm_stream
+        self.pack = pack
+        self.format_prompt = format_prompt
+        self.sanitize = sanitize
+        self.disclaimer = disclaimer
+        self.outcome_of = outcome_of
+        self.store = store
+        self.remember = remember
+        self.coalesce = coalesce
+        self.inflight = SingleFlight()
+        self.ainflight = AsyncSingleFlight()
+        self.shared_answer = Stage(
+            lambda key, *args: self.inflight.do(key, run, self.answer_program(*args)),
+            lambda key, *args: self.ainflight.do(key, arun, self.answer_program(*args)),
+        )
+
+    def coalescing_stats(self):
+        stats = [self.inflight.stats(), self.ainflight.stats()]
+        return {field: sum(s[field] for s in stats) for field in ("executions", "coalesced", "in_flight")}
+
+    # --- programs ---
+
+    def generation_program(self, msg, docs, history, query_vector=None, context=None):
+        """(raw answer, final response, outcome) from the LLM, stored in the answer cache"""
+        answer = yield Call(self.generate, {"input": msg, "context": docs, "history": history})
+        if not isinstance(answer, str):
+            answer = str(answer)
+        with span("sanitize"):
+            final_response = self.sanitize(answer)
+        logger.info(f"Generated response length: {len(final_response)}")
+        self.store(msg, query_vector, context, answer, final_response)
+        return answer, final_response, self.outcome_of(answer)
+
+    def answer_program(self, msg, query, history):
+        """(raw answer, final response, outcome) via retrieval, the answer cache and the LLM"""
+        docs = yield Call(self.retrieve, query)
+        cached_answer, query_vector, context = yield Call(self.cache_lookup, msg, docs, history)
+        if cached_answer is not None:
+            logger.info("Answered from semantic cache")
+            return cached_answer, cached_answer, "cache"
+        return (yield from self.generation_program(msg, docs, history, query_vector, context))
+
+    def respond_program(self, msg, session_id):
+        """The final response for /get, recorded in the session's history"""
+        query, history = yield Call(self.history, session_id, msg)
+        precomputed = yield Call(self.precomputed, msg, history)
+        if precomputed is not None:
+            logger.info("Answered from precomputed answers")
+            set_outcome("precomputed")
+            yield Call(self.remember, session_id, msg, precomputed, precomputed)
+            return precomputed
+
+        if self.coalesce and not history:
+            (answer, final_response, outcome), shared = yield Call(
+                self.shared_answer, normalize_query(msg), msg, query, history
+            )
+            if shared:
+                logger.info("Answered by a concurrent identical request")
+        else:
+            answer, final_response, outcome = yield from self.answer_program(msg, query, history)
+
+        set_outcome(outcome)
+        yield Call(self.remember, session_id, msg, answer, final_response)
+        return final_response
+
+    def stream_program(self, msg, session_id):
+        """
+        Emits the /stream answer piece by piece; the disclaimer goes out last.
+        Raises IncompleteAnswer when the LLM stream fails after the first piece.
+        """
+        query, history = yield Call(self.history, session_id, msg)
+        precomputed = yield Call(self.precomputed, msg, history)
+        if precomputed is not None:
+            set_outcome("precomputed")
+            yield Call(self.remember, session_id, msg, precomputed, precomputed)
+            yield Emit(precomputed)
+            return
+
+        docs = yield Call(self.retrieve, query)
+        cached_answer, query_vector, context = yield Call(self.cache_lookup, msg, docs, history)
+        if cached_answer is not None:
+            logger.info("Answered from semantic cache")
+            set_outcome("cache")
+            yield Call(self.remember, session_id, msg, cached_answer, cached_answer)
+            yield Emit(cached_answer)
+            return
+
+        packed = self.pack(docs)
+        prompt_value = self.format_prompt({"input": msg, "context": packed, "history": history})
+        stream = yield Call(self.llm_stream, prompt_value, packed)
+        pieces = []
+        while True:
+            try:
+                piece = yield Next(stream)
+            except Exception as e:
+                if not pieces:
+                    raise
+                # A partial answer must not be cached, remembered or counted as answered.
+                logger.error(f"LLM stream failed mid-answer: {e}")
+                set_outcome("llm_error")
+                raise IncompleteAnswer(str(e)) from e
+            if piece is DONE:
+                break
+            if not pieces:
+                piece = piece.lstrip()
+            pieces.append(piece)
+            yield Emit(piece)
+
+        answer = "".join(pieces)
+        set_outcome(self.outcome_of(answer))
+        if not answer.strip():
+            yield Emit(self.sanitize(answer))
+            return
+
+        # The disclaimer depends on the whole answer, so it goes out last.
+        disclaimer = self.disclaimer(answer)
+        if disclaimer:
+            yield Emit(disclaimer)
+        final_response = answer.strip() + disclaimer
+        logger.info(f"Streamed response length: {len(final_response)}")
+        self.store(msg, query_vector, context, answer, final_response)
+        yield Call(self.remember, session_id, msg, answer, final_response)
+
+    # --- sync and async adapters ---
+
+    def respond(self, msg, session_id):
+        return run(self.respond_program(msg, session_id))
+
+    async def arespond(self, msg, session_id):
+        return await arun(self.respond_program(msg, session_id))
+
+    def stream(self, msg, session_id):
+        return iterate(self.stream_program(msg, session_id))
+
+    def astream(self, msg, session_id):
+        return aiterate(self.stream_program(msg, session_id))
+
+    def generate_from_docs(self, msg, docs, history, query_vector=None, context=None):
+        return run(self.generation_program(msg, docs, history, query_vector, context))
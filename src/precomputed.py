@@ -0,0 +1,188 @@
+"""
+Precomputed answers for the most frequent questions.
+
+precompute_answers.py generates answers offline through the serving chain
+and writes them to a JSON file. Each entry keeps the question, its
+normalized text and embedding, the sanitized answer, and the context
+signature of the chunks it was grounded in. At serving time, /get looks up
+a standalone question by normalized text first, then by embedding
+similarity. A hit skips retrieval and the LLM. The file is re-read when it
+changes, so a refresh written by store_index.py goes live without a
+restart. The file records the index generation it was built against; when
+that no longer matches the index manifest (the refresh after ingestion
+failed or was skipped), no entry is served until it is refreshed.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from src.cache import IndexGenerationWatcher, normalize_query
+from src.ingest import read_index_generation
+from src.memory import is_follow_up
+
+logger = logging.getLogger(__name__)
+
+
+def load_file(path):
+    """The answer file as {"generation", "entries", ...}; empty when missing or unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load precomputed answers from {path}: {e}")
+        return {}
+
+
+def load_entries(path):
+    return load_file(path).get("entries", [])
+
+
+def save_entries(path, entries, generation=None):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"generation": generation, "saved_at": time.time(), "entries": entries}, f)
+    os.replace(tmp_path, path)
+
+
+def mine_questions(db_path, top_n=100, min_count=2):
+    """
+    The `top_n` most frequent standalone questions in chat_history.db, as
+    [(question, count)]. Variants are grouped by normalized text and shown in
+    their most common spelling. Follow-ups ("what about side effects?") are
+    skipped because their answers depend on the conversation.
+    """
+    if not os.path.exists(db_path):
+        logger.warning(f"No chat history at {db_path}")
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT question FROM chat_history").fetchall()
+    finally:
+        conn.close()
+    counts, spellings = Counter(), {}
+    for (question,) in rows:
+        question = (question or "").strip()
+        key = normalize_query(question)
+        if not key or is_follow_up(question):
+            continue
+        counts[key] += 1
+        spellings.setdefault(key, Counter())[question] += 1
+    return [
+        (spellings[key].most_common(1)[0][0], count)
+        for key, count in counts.most_common(top_n)
+        if count >= min_count
+    ]
+
+
+def load_question_list(path):
+    """Curated questions: one per line, blank lines and # comments ignored"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+class PrecomputedAnswers:
+    """
+    Read-only view of the precomputed answer file for the serving path.
+    `lookup_text` is an exact match on normalized text; `lookup_vector`
+    accepts the best entry within `threshold` cosine similarity. With a
+    `manifest_path`, the file is only served while its generation matches
+    the index manifest's; both files are re-checked when they change.
+    """
+
+    def __init__(self, path, threshold=0.95, check_interval=5.0, manifest_path=None):
+        self.path = path
+        self.threshold = threshold
+        self.manifest_path = manifest_path
+        self._watchers = [IndexGenerationWatcher(path, check_interval=check_interval)]
+        if manifest_path:
+            self._watchers.append(IndexGenerationWatcher(manifest_path, check_interval=check_interval))
+        self._lock = threading.Lock()
+        self._by_text = {}
+        self._answers = []
+        self._vectors = None
+        self.stale_entries = 0
+        self.text_hits = 0
+        self.vector_hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        data = load_file(self.path)
+        entries = data.get("entries", [])
+        stale_entries = 0
+        if entries and self.manifest_path:
+            generation = read_index_generation(self.manifest_path)
+            if data.get("generation") != generation:
+                logger.warning(
+                    f"Not serving {len(entries)} precomputed answers from {self.path}: built for index "
+                    f"generation {data.get('generation')}, the index is at {generation}. "
+                    f"Run: python precompute_answers.py --refresh"
+                )
+                entries, stale_entries = [], len(entries)
+        vectors = [entry.get("vector") for entry in entries]
+        matrix = None
+        if entries and all(vectors):
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._answers = [entry["answer"] for entry in entries]
+            self._by_text = {entry["key"]: i for i, entry in enumerate(entries)}
+            self._vectors = matrix
+            self.stale_entries = stale_entries
+        if entries:
+            logger.info(f"Loaded {len(entries)} precomputed answers from {self.path}")
+
+    def _reload_if_changed(self):
+        # Poll every watcher, so each one records the current mtime.
+        changed = [watcher.changed() for watcher in self._watchers]
+        if any(changed):
+            self.load()
+
+    def __len__(self):
+        return len(self._answers)
+
+    def lookup_text(self, question):
+        self._reload_if_changed()
+        with self._lock:
+            i = self._by_text.get(normalize_query(question))
+            if i is None:
+                return None
+            self.text_hits += 1
+            return self._answers[i]
+
+    def lookup_vector(self, vector):
+        """Answer of the most similar precomputed question, or None; counts a miss"""
+        with self._lock:
+            if self._vectors is not None and len(vector) == self._vectors.shape[1]:
+                query = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(query)
+                scores = self._vectors @ (query / norm if norm else query)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.vector_hits += 1
+                    return self._answers[best]
+            self.misses += 1
+            return None
+
+    def stats(self):
+        hits = self.text_hits + self.vector_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._answers),
+            "stale_entries": self.stale_entries,
+            "threshold": self.threshold,
+            "hits": hits,
+            "text_hits": self.text_hits,
+            "vector_hits": self.vector_hits,
+            "misses": self.misses,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,112 @@
+"""
+Retrieval stage: over-fetch, rerank locally, and size k to the question.
+
+AdaptiveRetriever replaces `as_retriever(search_type="similarity", k=5)`.
+It embeds the query once, then either takes the plain top-k, picks k of
+`fetch_k` candidates with maximal marginal relevance (relevant but not
+redundant), or scores the candidates with a small cross-encoder on CPU.
+With `adaptive_k`, short definitional questions get `min_k` chunks and
+comparisons or list questions get `max_k`.
+"""
+import logging
+import re
+import threading
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.metrics import span
+
+logger = logging.getLogger(__name__)
+
+DEFINITIONAL_PATTERN = re.compile(
+    r"^\s*(what\s+(is|are)\s+(an?\s+)?\S+|define\b|definition\s+of|meaning\s+of|what\s+does\s+\S+\s+mean)",
+    re.IGNORECASE,
+)
+BROAD_PATTERN = re.compile(
+    r"\b(compare|comparison|differences?|versus|vs\.?|between|list|types\s+of|kinds\s+of|"
+    r"pros\s+and\s+cons|causes\s+and|symptoms\s+and|and\s+(how|what|why))\b",
+    re.IGNORECASE,
+)
+
+
+def choose_k(query, k=5, min_k=3, max_k=8):
+    """Fewer chunks for 'what is X', more for comparisons and multi-part questions"""
+    if BROAD_PATTERN.search(query):
+        return max_k
+    if DEFINITIONAL_PATTERN.search(query) and len(query.split()) <= 6:
+        return min_k
+    return k
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a sentence-transformers CrossEncoder on CPU."""
+
+    def __init__(self, model_name, device="cpu", batch_size=32):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device=self.device)
+                    logger.info(f"Loaded reranker {self.model_name} on {self.device}")
+        return self._model
+
+    def rerank(self, query, docs: List[Document], k) -> List[Document]:
+        if not docs:
+            return []
+        scores = self.load().predict(
+            [(query, doc.page_content) for doc in docs], batch_size=self.batch_size
+        )
+        order = sorted(range(len(docs)), key=lambda i: -float(scores[i]))
+        return [docs[i] for i in order[:k]]
+
+
+class AdaptiveRetriever(BaseRetriever):
+    """
+    `search_type` is "similarity" or "mmr"; a `reranker` takes precedence over
+    both and reorders the `fetch_k` nearest candidates.
+    """
+
+    vectorstore: Any
+    embeddings: Any
+    search_type: str = "mmr"
+    k: int = 5
+    min_k: int = 3
+    max_k: int = 8
+    fetch_k: int = 20
+    lambda_mult: float = 0.7
+    adaptive_k: bool = True
+    reranker: Optional[Any] = None
+
+    def k_for(self, query):
+        if not self.adaptive_k:
+            return self.k
+        return choose_k(query, self.k, self.min_k, self.max_k)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        k = self.k_for(query)
+        with span("embed_query"):
+            query_vector = self.embeddings.embed_query(query)
+        if self.reranker is not None:
+            with span("vector_search"):
+                candidates = self.vectorstore.similarity_search_by_vector(query_vector, k=max(self.fetch_k, k))
+            with span("rerank"):
+                return self.reranker.rerank(query, candidates, k)
+        with span("vector_search"):
+            if self.search_type == "mmr":
+                return self.vectorstore.max_marginal_relevance_search_by_vector(
+                    query_vector, k=k, fetch_k=max(self.fetch_k, k), lambda_mult=self.lambda_mult
+                )
+            return self.vectorstore.similarity_search_by_vector(query_vector, k=k)
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are still atomic, but not merged under a lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def context_signature(docs):
+    """
+    Order-independent fingerprint of a retrieved document set. Two questions
+    only share an answer if they were grounded in the same chunks.
+    """
+    digests = sorted(
+        hashlib.sha256(
+            f"{doc.metadata.get('source')}|{doc.metadata.get('page')}|{doc.page_content}".encode("utf-8")
+        ).hexdigest()
+        for doc in docs
+    )
+    return hashlib.sha256("".join(digests).encode("utf-8")).hexdigest()
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """
+    Stores sanitized answers keyed on the question embedding. A lookup hits when
+    a cached question is within `threshold` cosine similarity of the new one
+    and was answered from the same retrieved context.
+
+    Entries are evicted least-recently-used once `maxsize` is reached. The
+    cache is persisted to `path` (JSON, without the vectors) and `path`.npy
+    (the vectors, one row per entry) on save(), and every `save_every`
+    inserts by a background thread, so requests never wait for the disk.
+    Several worker processes can share `path`: save() merges with what the
+    others wrote, under a file lock, instead of overwriting it.
+    """
+
+    def __init__(self, path=None, maxsize=2000, threshold=0.92, save_every=20):
+        self.path = path
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_requested = threading.Event()
+        self._vectors = None
+        self._entries = []
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self.load()
+            threading.Thread(target=self._flush_loop, name="semantic-cache-flush", daemon=True).start()
+
+    def lookup(self, vector, context):
+        """Return the cached answer for a similar question with the same context, or None."""
+        query = _unit(vector)
+        with self._lock:
+            if self._vectors is None or not self._entries:
+                self.misses += 1
+                return None
+            scores = self._vectors @ query
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold:
+                    break
+                entry = self._entries[i]
+                if entry["context"] == context:
+                    entry["last_used"] = time.time()
+                    entry["hits"] += 1
+                    self.hits += 1
+                    return entry["answer"]
+            self.misses += 1
+            return None
+
+    def add(self, question, vector, context, answer):
+        vector = _unit(vector)
+        with self._lock:
+            if self._vectors is not None and self._entries:
+                scores = self._vectors @ vector
+                for i in np.flatnonzero(scores >= self.threshold):
+                    if self._entries[i]["context"] == context:
+                        # Refresh the existing entry rather than storing a near-duplicate.
+                        self._entries[i].update(answer=answer, last_used=time.time())
+                        return
+            self._entries.append({
+                "question": question,
+                "context": context,
+                "answer": answer,
+                "last_used": time.time(),
+                "hits": 0,
+            })
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            while len(self._entries) > self.maxsize:
+                oldest = min(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+                del self._entries[oldest]
+                self._vectors = np.delete(self._vectors, oldest, axis=0)
+                self.evictions += 1
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every
+        if should_save:
+            self._save_requested.set()
+
+    def _flush_loop(self):
+        while True:
+            self._save_requested.wait()
+            self._save_requested.clear()
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"Could not save semantic cache to {self.path}: {e}")
+
+    @property
+    def _vectors_path(self):
+        return f"{self.path}.npy"
+
+    def _read_entries(self):
+        """Saved entries, each with its "vector" row; empty when missing or inconsistent"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", [])
+            if entries and "vector" in entries[0]:
+                # Written before vectors moved to the .npy file.
+                for entry in entries:
+                    entry["vector"] = np.asarray(entry["vector"], dtype=np.float32)
+                return entries
+            vectors = np.load(self._vectors_path) if entries else None
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load semantic cache from {self.path}: {e}")
+            return []
+        if vectors is not None and len(vectors) != len(entries):
+            logger.warning(f"Ignoring semantic cache {self.path}: {len(entries)} entries but {len(vectors)} vectors")
+            return []
+        for entry, vector in zip(entries, vectors if vectors is not None else ()):
+            entry["vector"] = vector
+        return entries
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        with self._file_lock():
+            entries = self._read_entries()[-self.maxsize:]
+        if not entries:
+            return
+        with self._lock:
+            self._entries = [{k: v for k, v in e.items() if k != "vector"} for e in entries]
+            self._vectors = np.vstack([e["vector"] for e in entries]).astype(np.float32)
+        logger.info(f"Loaded {len(entries)} semantic cache entries from {self.path}")
+
+    def save(self):
+        """Merge this process's entries into `path`, keeping the `maxsize` most recently used"""
+        if not self.path:
+            return
+        with self._lock:
+            # _vectors is replaced, never modified in place, so its rows stay valid.
+            entries = [dict(entry, vector=self._vectors[i]) for i, entry in enumerate(self._entries)]
+            self._unsaved = 0
+        with self._save_lock, self._file_lock():
+            merged = {}
+            for entry in self._read_entries() + entries:
+                key = (entry["question"], entry["context"])
+                if key not in merged or entry["last_used"] >= merged[key]["last_used"]:
+                    merged[key] = entry
+            kept = sorted(merged.values(), key=lambda e: e["last_used"])[-self.maxsize:]
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            if kept:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, np.vstack([entry["vector"] for entry in kept]).astype(np.float32))
+                os.replace(tmp_path, self._vectors_path)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": [{k: v for k, v in e.items() if k != "vector"} for e in kept]}, f)
+            os.replace(tmp_path, self.path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
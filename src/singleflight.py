@@ -0,0 +1,94 @@
+"""
+Request coalescing ("single flight").
+
+When many users ask the same question at the same moment, only the first
+request runs the answer pipeline; the others wait for it and share its
+result, or its exception. Nothing is kept once the call finishes: this
+deduplicates work that is in flight, while the caches in src/cache.py and
+src/semantic_cache.py cover questions asked later.
+"""
+import asyncio
+import threading
+
+from src.metrics import span
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-based coalescing for the Flask workers."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """(fn(*args, **kwargs), shared); shared is True when another caller ran it"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            with span("coalesced_wait"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    Coalescing for the asyncio serving path. The shared work runs as its own
+    task, so a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def do(self, key, fn, *args, **kwargs):
+        """(await fn(*args, **kwargs), shared); shared is True when another caller ran it"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            with span("coalesced_wait"):
+                return await asyncio.shield(task), True
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+        self._calls[key] = task
+        self.executions += 1
+        task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task), False
+
+    def stats(self):
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
@@ -0,0 +1,180 @@
+"""
+Local stand-ins for the embedding model, Pinecone and Gemini.
+
+Selected with EMBEDDING_BACKEND=stub, VECTOR_BACKEND=stub and LLM_BACKEND=stub,
+they let the app boot and serve offline with configurable latency, which is
+what the load tests and benchmarks in benchmarks/ drive.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import time
+from typing import List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+STUB_CORPUS = [
+    "Diabetes mellitus is characterised by chronic hyperglycaemia. Common symptoms include polyuria, polydipsia, weight loss and fatigue.",
+    "Type 2 diabetes is usually treated with lifestyle changes and metformin, which lowers hepatic glucose production.",
+    "Hypertension is a persistently raised arterial blood pressure, generally above 130/80 mmHg on repeated measurement.",
+    "Aspirin irreversibly inhibits cyclooxygenase, reducing prostaglandin and thromboxane synthesis.",
+    "Ibuprofen is a non-steroidal anti-inflammatory drug; side effects include gastric irritation and renal impairment.",
+    "Acne vulgaris is a disorder of the pilosebaceous unit presenting with comedones, papules and pustules.",
+    "Iron deficiency anaemia results from blood loss, poor intake or malabsorption and causes microcytic red cells.",
+    "Asthma is a chronic inflammatory airway disease with reversible bronchoconstriction, wheeze and cough.",
+    "Migraine is a primary headache disorder with recurrent unilateral throbbing pain, nausea and photophobia.",
+    "Influenza is an acute viral respiratory infection causing fever, myalgia, cough and sore throat.",
+    "Pneumonia is an infection of the lung parenchyma; typical symptoms are fever, productive cough and dyspnoea.",
+    "Hypothyroidism causes fatigue, cold intolerance, weight gain and constipation and is treated with levothyroxine.",
+    "Gastro-oesophageal reflux disease causes heartburn and regurgitation and is treated with proton pump inhibitors.",
+    "Osteoarthritis is a degenerative joint disease with pain on use, stiffness and reduced range of movement.",
+    "Antibiotic-associated colitis is commonly caused by Clostridioides difficile overgrowth after antibiotic use.",
+    "Dehydration presents with thirst, dry mucous membranes, reduced urine output and, when severe, hypotension.",
+]
+
+
+def _words(text):
+    return _WORD.findall(text.lower())
+
+
+def _sleep(latency):
+    if latency > 0:
+        time.sleep(latency)
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Deterministic hashed bag-of-words vectors. Questions sharing words get
+    similar vectors, which is enough to exercise caches and similarity search.
+    """
+
+    def __init__(self, size=384, latency=0.0):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text):
+        vector = [0.0] * self.size
+        for word in _words(text):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.size
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_query(self, text: str) -> List[float]:
+        _sleep(self.latency)
+        return self._embed(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        _sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+
+class StubRetriever(BaseRetriever):
+    """Ranks a small built-in medical corpus by word overlap after `latency` seconds."""
+
+    k: int = 5
+    latency: float = 0.0
+
+    def _search(self, query):
+        query_words = set(_words(query))
+        ranked = sorted(
+            range(len(STUB_CORPUS)),
+            key=lambda i: (-len(query_words & set(_words(STUB_CORPUS[i]))), i),
+        )
+        return [
+            Document(page_content=STUB_CORPUS[i], metadata={"source": "stub-corpus.pdf", "page": i})
+            for i in ranked[:self.k]
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        _sleep(self.latency)
+        return self._search(query)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return self._search(query)
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _StubStream:
+    """Iterable (sync or async) of response chunks, like a streamed Gemini response."""
+
+    def __init__(self, pieces, first_token_latency, token_latency):
+        self.pieces = pieces
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+
+    def __iter__(self):
+        for i, piece in enumerate(self.pieces):
+            _sleep(self.first_token_latency if i == 0 else self.token_latency)
+            yield _StubResponse(piece)
+
+    async def __aiter__(self):
+        for i, piece in enumerate(self.pieces):
+            delay = self.first_token_latency if i == 0 else self.token_latency
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield _StubResponse(piece)
+
+
+class StubGenerativeModel:
+    """
+    Mimics the parts of google.generativeai.GenerativeModel the app uses.
+    `latency` is the total time for a full answer; when streaming, a third of
+    it is spent before the first token and the rest spread over the tokens.
+    """
+
+    def __init__(self, latency=0.0, tokens=20):
+        self.latency = latency
+        self.tokens = max(1, tokens)
+        self.calls = 0
+
+    def _answer(self, prompt_text):
+        question = prompt_text.rsplit("Human:", 1)[-1].strip() or prompt_text.strip()
+        return (
+            f"This is a stub answer about: {question[:120]}. "
+            "The relevant condition is usually managed with appropriate treatment, "
+            "and symptoms should be reviewed by a clinician if they persist."
+        )
+
+    def _pieces(self, prompt_text):
+        words = self._answer(prompt_text).split(" ")
+        size = max(1, math.ceil(len(words) / self.tokens))
+        return [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+
+    def _stream(self, prompt_text):
+        pieces = self._pieces(prompt_text)
+        first = self.latency / 3
+        per_token = (self.latency - first) / max(1, len(pieces) - 1)
+        return _StubStream(pieces, first, per_token)
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return self._stream(contents)
+        _sleep(self.latency)
+        return _StubResponse(self._answer(contents))
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return self._stream(contents)
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return _StubResponse(self._answer(contents))
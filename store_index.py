@@ -1,11 +1,16 @@
 from dotenv import load_dotenv
+import argparse
+import logging
 import os
-from src.helper import load_pdf_file, filter_to_minimal_docs, text_split, download_hugging_face_embeddings
-from pinecone import Pinecone
-from pinecone import ServerlessSpec 
-from langchain_pinecone import PineconeVectorStore
+import shutil
+from src.helper import data_dir
+from src.ingest import Manifest, sync_directory
+from src.helper import download_hugging_face_embeddings
 
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 
@@ -13,42 +18,109 @@ load_dotenv()
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
-os.environ["GEMINI_API_KEY"] = GEMINI_API_KEY
+if PINECONE_API_KEY:
+    os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
+if GEMINI_API_KEY:
+    os.environ["GEMINI_API_KEY"] = GEMINI_API_KEY
+
+DATA_DIR = os.environ.get("DATA_DIR", data_dir)
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "0")) or None  # default: one per CPU
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "vector_index")
+# Applies to a new local index; an existing one keeps its on-disk format.
+LOCAL_INDEX_QUANTIZATION = os.environ.get("LOCAL_INDEX_QUANTIZATION")
+# Each backend tracks its own contents, so switching backends never skips files.
+INDEX_MANIFEST_PATH = os.environ.get(
+    "INDEX_MANIFEST_PATH",
+    os.path.join(LOCAL_INDEX_DIR, "manifest.json") if VECTOR_BACKEND == "local" else "index_manifest.json",
+)
 
 
+parser = argparse.ArgumentParser(description="Incrementally sync the PDFs in Data/ into the vector index.")
+parser.add_argument("--rebuild", action="store_true",
+                    help="delete every vector and the manifest, then re-ingest from scratch")
+parser.add_argument("--skip-answer-refresh", action="store_true",
+                    help="do not regenerate precomputed answers whose retrieved context changed")
+args = parser.parse_args()
 
-extracted_data = load_pdf_file(r"C:\Users\hp\Desktop\PROJECT\Medical_AI_Chatbot\Data")
-filter_data = filter_to_minimal_docs(extracted_data)
-text_chunks=text_split(filter_data)
 
 embeddings = download_hugging_face_embeddings()
 
 
+def open_pinecone_store():
+    from pinecone import Pinecone
+    from pinecone import ServerlessSpec 
+    from langchain_pinecone import PineconeVectorStore
 
-api_key = os.getenv("PINECONE_API_KEY")
-pc = Pinecone(api_key=api_key)
+    if not PINECONE_API_KEY:
+        raise ValueError("PINECONE_API_KEY is not set. Please create a .env file with your API keys.")
 
+    pc = Pinecone(api_key=PINECONE_API_KEY)
 
+    index_name = "medical-bot"  # change if desired
 
+    if not pc.has_index(index_name):
+        pc.create_index(
+            name=index_name,
+            dimension=384,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
 
+    index = pc.Index(index_name)
 
-index_name = "medical-bot"  # change if desired
-
-if not pc.has_index(index_name):
-    pc.create_index(
-        name=index_name,
-        dimension=384,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-    )
+    if args.rebuild:
+        # Vectors written before the manifest existed have random IDs the
+        # incremental sync cannot track, so a one-off rebuild clears them.
+        index.delete(delete_all=True)
 
-index = pc.Index(index_name)
+    return PineconeVectorStore(index_name=index_name, embedding=embeddings)
 
 
+def open_local_store():
+    from src.local_index import LocalVectorStore
 
-docsearch = PineconeVectorStore.from_documents(
-    documents=text_chunks,
-    index_name=index_name,
-    embedding=embeddings,
+    if args.rebuild:
+        shutil.rmtree(LOCAL_INDEX_DIR, ignore_errors=True)
+    os.makedirs(LOCAL_INDEX_DIR, exist_ok=True)
+    store = LocalVectorStore.load(
+        LOCAL_INDEX_DIR, embedding=embeddings, quantization=LOCAL_INDEX_QUANTIZATION or "none"
+    )
+    if LOCAL_INDEX_QUANTIZATION and store.quantization != LOCAL_INDEX_QUANTIZATION:
+        raise ValueError(
+            f"The index in {LOCAL_INDEX_DIR} is stored as {store.quantization!r}, not "
+            f"LOCAL_INDEX_QUANTIZATION={LOCAL_INDEX_QUANTIZATION!r}. Run with --rebuild to change it."
+        )
+    return store
+
+
+if VECTOR_BACKEND == "local":
+    docsearch = open_local_store()
+else:
+    docsearch = open_pinecone_store()
+
+if args.rebuild:
+    Manifest(INDEX_MANIFEST_PATH).save()
+    logger.info("Cleared index and manifest for a full rebuild")
+
+stats = sync_directory(
+    DATA_DIR, docsearch, INDEX_MANIFEST_PATH, batch_size=INGEST_BATCH_SIZE, workers=INGEST_WORKERS,
+    commit=docsearch.save if VECTOR_BACKEND == "local" else None,
+)
+logger.info(
+    f"Ingestion finished: {stats.files_changed} files changed, {stats.files_unchanged} unchanged, "
+    f"{stats.files_removed} removed; {stats.chunks_upserted} chunks upserted, "
+    f"{stats.chunks_deleted} deleted, {stats.chunks_unchanged} unchanged"
 )
+
+# Precomputed answers grounded in chunks that changed are regenerated, so the
+# answer tier never outlives the documents it was built from.
+PRECOMPUTED_ANSWERS_PATH = os.environ.get("PRECOMPUTED_ANSWERS_PATH", "precomputed_answers.json")
+if stats.changed and not args.skip_answer_refresh and os.path.exists(PRECOMPUTED_ANSWERS_PATH):
+    from precompute_answers import refresh_answers
+
+    try:
+        refresh_answers(PRECOMPUTED_ANSWERS_PATH)
+    except Exception as e:
+        logger.error(f"Could not refresh precomputed answers: {e}. Run: python precompute_answers.py --refresh")
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stub_app(tmp_path, monkeypatch):
+    """app.py on the stub backends, with its state files under tmp_path on first import"""
+    monkeypatch.setenv("EMBEDDING_BACKEND", "stub")
+    monkeypatch.setenv("VECTOR_BACKEND", "stub")
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.setenv("CHAT_HISTORY_DB", str(tmp_path / "chat_history.db"))
+    monkeypatch.setenv("SEMANTIC_CACHE_PATH", str(tmp_path / "semantic_cache.json"))
+    monkeypatch.setenv("PRECOMPUTED_ANSWERS_PATH", str(tmp_path / "precomputed_answers.json"))
+    monkeypatch.setenv("BATCH_JOBS_DIR", str(tmp_path / "batch_jobs"))
+    return pytest.importorskip("app")
@@ -0,0 +1,56 @@
+import time
+
+from src.batch import BatchJobs, BatchPipeline, BatchRunner
+
+
+def _runner():
+    def generate(question, docs):
+        if "fail" in question:
+            raise RuntimeError("model error")
+        return f"answer to {question}", "llm"
+
+    pipeline = BatchPipeline(
+        embed_many=lambda questions: None,
+        retrieve=lambda question: [],
+        cached_answer=lambda question, docs: (None, None),
+        generate=generate,
+    )
+    return BatchRunner(pipeline, llm_rate_per_minute=0)
+
+
+def _wait(jobs, job_id):
+    for _ in range(200):
+        status = jobs.status(job_id)
+        if status["state"] in ("done", "failed"):
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job still {status['state']}")
+
+
+def test_job_runs_in_the_background_and_is_polled_from_disk(tmp_path):
+    items = [{"id": "1", "question": "what is asthma"}, {"id": "2", "question": "please fail"}]
+    job_id = BatchJobs(str(tmp_path), _runner).submit(items)
+
+    # A second instance over the same directory stands in for another worker.
+    status = _wait(BatchJobs(str(tmp_path), _runner), job_id)
+    assert status["state"] == "done"
+    assert status["total"] == 2 and status["completed"] == 2
+    assert status["outcomes"] == {"llm": 1, "error": 1}
+
+    results = {result["id"]: result for result in BatchJobs(str(tmp_path), _runner).results(job_id)}
+    assert results["1"]["answer"] == "answer to what is asthma"
+    assert results["2"]["error"] == "model error"
+
+
+def test_unknown_and_malformed_job_ids(tmp_path):
+    jobs = BatchJobs(str(tmp_path), _runner)
+    assert jobs.status("0" * 32) is None
+    assert jobs.status("../secrets") is None
+
+
+def test_partial_last_line_is_not_returned(tmp_path):
+    jobs = BatchJobs(str(tmp_path), _runner)
+    job_id = "a" * 32
+    with open(jobs.results_path(job_id), "w") as f:
+        f.write('{"id": "1", "outcome": "llm"}\n{"id": "2", "outc')
+    assert jobs.read_results(job_id) == b'{"id": "1", "outcome": "llm"}\n'
@@ -0,0 +1,59 @@
+from langchain_core.documents import Document
+
+from src.context import ContextPacker, estimate_tokens, join_adjacent
+
+
+def _doc(n, words=100):
+    text = " ".join(f"doc{n}word{i}" for i in range(words)) + "."
+    return Document(page_content=text, metadata={"source": f"doc{n}.pdf", "page": n})
+
+
+def test_pack_counts_docs_dropped_for_budget():
+    docs = [_doc(n) for n in range(6)]
+    cost = estimate_tokens(docs[0].page_content)
+
+    # The second doc is truncated in; the four after it are dropped.
+    packer = ContextPacker(token_budget=cost + 100, min_fragment_tokens=60)
+    packed = packer.pack(docs)
+    assert len(packed) == 2
+    assert packer.stats()["truncated"] == 1
+    assert packer.stats()["dropped_for_budget"] == 4
+
+    # Too little budget left for a fragment of the second doc: it is dropped too.
+    packer = ContextPacker(token_budget=cost + 10, min_fragment_tokens=60)
+    packed = packer.pack(docs)
+    assert len(packed) == 1
+    stats = packer.stats()
+    assert stats["truncated"] == 0 and stats["merged_chunks"] == 0 and stats["dropped_duplicates"] == 0
+    assert stats["dropped_for_budget"] == 5
+
+
+def test_pack_within_budget_drops_nothing():
+    packer = ContextPacker(token_budget=10_000)
+    packer.pack([_doc(n) for n in range(3)])
+    assert packer.stats()["dropped_for_budget"] == 0
+
+
+def _chunk(text, chunk=None):
+    metadata = {"source": "a.pdf", "page": 0}
+    if chunk is not None:
+        metadata["chunk"] = chunk
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_join_adjacent_trusts_chunk_indices():
+    shared = "the shared overlap between two neighbouring chunks"
+    left, right = "asthma is an airway disease; " + shared, shared + " treated with inhalers"
+
+    joined = join_adjacent(_chunk(left, 3), _chunk(right, 4))
+    assert joined.page_content == left + " treated with inhalers"
+    assert (joined.metadata["chunk"], joined.metadata["chunk_end"]) == (3, 4)
+
+    # Same overlap, but not neighbours according to ingestion.
+    assert join_adjacent(_chunk(left, 3), _chunk(right, 5)) is None
+    # Neighbours without any overlap are still joined.
+    assert join_adjacent(_chunk("first chunk", 3), _chunk("second chunk", 4)).page_content == "first chunk second chunk"
+
+    # Chunks stored without indices fall back to the overlap.
+    assert join_adjacent(_chunk(left), _chunk(right)).page_content == left + " treated with inhalers"
+    assert join_adjacent(_chunk("first chunk"), _chunk("second chunk")) is None
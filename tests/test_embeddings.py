@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+from src.embeddings import BatchingEmbeddings
+
+
+class SlowEmbeddings:
+    """embed_documents blocks until `release` is set, so a caller can be cancelled meanwhile."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def embed_documents(self, texts):
+        self.release.wait(5)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _embed_in_thread(batcher, text):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("vector", batcher.embed_query(text)), daemon=True)
+    thread.start()
+    thread.join(5)
+    return result.get("vector")
+
+
+def test_cancelled_async_query_does_not_stop_the_worker():
+    base = SlowEmbeddings()
+    batcher = BatchingEmbeddings(base, max_wait_ms=1)
+
+    async def cancel_while_queued():
+        base.release.clear()
+        # The first query holds the worker; the second is cancelled while queued.
+        first = asyncio.ensure_future(batcher.aembed_query("first"))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(batcher.aembed_query("second"))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        base.release.set()
+        return await first
+
+    assert asyncio.run(cancel_while_queued()) == [5.0, 1.0]
+    assert _embed_in_thread(batcher, "third") == [5.0, 1.0]
+    assert batcher._worker.is_alive()
+
+
+def test_cancelled_query_in_a_running_batch_is_answered_and_ignored():
+    base = SlowEmbeddings()
+    batcher = BatchingEmbeddings(base, max_wait_ms=1)
+
+    async def cancel_in_flight():
+        base.release.clear()
+        task = asyncio.ensure_future(batcher.aembed_query("abc"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        base.release.set()
+
+    asyncio.run(cancel_in_flight())
+    assert _embed_in_thread(batcher, "four") == [4.0, 1.0]
+    assert batcher._worker.is_alive()
@@ -0,0 +1,93 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.vectorstores import InMemoryVectorStore
+
+import src.ingest as ingest
+from src.ingest import chunk_id, read_index_generation, sync_directory
+from src.stubs import StubEmbeddings
+
+
+def fake_iter_text_chunks(paths, sources=None, workers=None):
+    """Files are "PDFs" whose pages are split on form feeds and chunks on blank lines"""
+    for path, source in zip(paths, sources):
+        with open(path, "r", encoding="utf-8") as f:
+            pages = f.read().split("\f")
+        for page, text in enumerate(pages):
+            for index, chunk in enumerate(part for part in text.split("\n\n") if part.strip()):
+                yield Document(page_content=chunk, metadata={"source": source, "page": page, "chunk": index})
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "iter_text_chunks", fake_iter_text_chunks)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    store = InMemoryVectorStore(StubEmbeddings(size=32))
+    manifest_path = str(tmp_path / "manifest.json")
+
+    def sync(**kwargs):
+        return sync_directory(str(data_dir), store, manifest_path, **kwargs)
+
+    return data_dir, store, sync
+
+
+def test_sync_directory_upserts_only_what_changed(corpus):
+    data_dir, store, sync = corpus
+    (data_dir / "a.pdf").write_text("asthma one\n\nasthma two\fpage two", encoding="utf-8")
+    (data_dir / "b.pdf").write_text("migraine", encoding="utf-8")
+
+    stats = sync(batch_size=2)
+    assert (stats.files_changed, stats.chunks_upserted, stats.chunks_deleted, stats.chunks_unchanged) == (2, 4, 0, 0)
+    expected_ids = {chunk_id("a.pdf", 0, 0), chunk_id("a.pdf", 0, 1), chunk_id("a.pdf", 1, 0), chunk_id("b.pdf", 0, 0)}
+    assert set(store.store) == expected_ids
+    assert store.store[chunk_id("a.pdf", 0, 1)]["text"] == "asthma two"
+    assert store.store[chunk_id("a.pdf", 0, 1)]["metadata"] == {"source": "a.pdf", "page": 0, "chunk": 1}
+
+    # Nothing changed: no file is even parsed.
+    stats = sync()
+    assert (stats.files_unchanged, stats.files_changed, stats.chunks_upserted, stats.chunks_deleted) == (2, 0, 0, 0)
+    assert not stats.changed
+
+    # Edit one chunk and drop another: the rest of the file is left alone.
+    (data_dir / "a.pdf").write_text("asthma one\n\nasthma 2", encoding="utf-8")
+    stats = sync()
+    assert (stats.files_changed, stats.files_unchanged) == (1, 1)
+    assert (stats.chunks_upserted, stats.chunks_unchanged, stats.chunks_deleted) == (1, 1, 1)
+    assert stats.changed_sources == ["a.pdf"]
+    assert set(store.store) == expected_ids - {chunk_id("a.pdf", 1, 0)}
+    assert store.store[chunk_id("a.pdf", 0, 1)]["text"] == "asthma 2"
+
+    # A removed file takes its chunks with it.
+    (data_dir / "b.pdf").unlink()
+    stats = sync()
+    assert (stats.files_removed, stats.chunks_deleted, stats.chunks_upserted) == (1, 1, 0)
+    assert set(store.store) == {chunk_id("a.pdf", 0, 0), chunk_id("a.pdf", 0, 1)}
+
+
+def test_sync_directory_empties_a_file_that_loses_its_text(corpus):
+    data_dir, store, sync = corpus
+    (data_dir / "a.pdf").write_text("asthma one\n\nasthma two", encoding="utf-8")
+    first = sync()
+    generation = read_index_generation(str(data_dir.parent / "manifest.json"))
+
+    # e.g. re-exported as an image-only PDF: the file changed but yields no chunks.
+    (data_dir / "a.pdf").write_text("", encoding="utf-8")
+    stats = sync()
+    assert (stats.files_changed, stats.chunks_upserted, stats.chunks_deleted) == (1, 0, 2)
+    assert store.store == {}
+    assert first.changed and stats.changed
+    assert read_index_generation(str(data_dir.parent / "manifest.json")) != generation
+
+    # The empty file is recorded, so the next run leaves it alone.
+    stats = sync()
+    assert (stats.files_unchanged, stats.files_changed, stats.chunks_deleted) == (1, 0, 0)
+
+
+def test_sync_directory_commits_buffered_stores_once(corpus):
+    data_dir, store, sync = corpus
+    (data_dir / "a.pdf").write_text("asthma one\n\nasthma two", encoding="utf-8")
+    commits = []
+    sync(commit=lambda: commits.append(True))
+    assert commits == [True]
+    sync(commit=lambda: commits.append(True))
+    assert commits == [True]
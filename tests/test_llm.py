@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.backends import LazyBackend
+from src.llm import LLMClient, LLMTimeout
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StallingModel:
+    """Streams two pieces, then stalls until `release` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def _chunks(self):
+        yield _Chunk("first ")
+        yield _Chunk("second ")
+        self.release.wait(10)
+        yield _Chunk("late")
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        return self._chunks()
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, request_options=None):
+        async def chunks():
+            for chunk in self._chunks():
+                if chunk.text == "late":
+                    await asyncio.sleep(10)
+                yield chunk
+        return chunks()
+
+
+def _client(model):
+    return LLMClient(LazyBackend("llm", lambda: model), timeout=0.2, max_retries=0)
+
+
+def test_stream_times_out_when_the_provider_stalls_mid_answer():
+    model = StallingModel()
+    pieces = []
+    start = time.perf_counter()
+    with pytest.raises(LLMTimeout):
+        for piece in _client(model).stream("Human: hi"):
+            pieces.append(piece)
+    elapsed = time.perf_counter() - start
+    model.release.set()
+    assert pieces == ["first ", "second "]
+    assert elapsed < 2
+
+
+def test_astream_times_out_when_the_provider_stalls_mid_answer():
+    model = StallingModel()
+    model.release.set()
+
+    async def consume():
+        pieces = []
+        with pytest.raises(LLMTimeout):
+            async for piece in _client(model).astream("Human: hi"):
+                pieces.append(piece)
+        return pieces
+
+    assert asyncio.run(consume()) == ["first ", "second "]
+
+
+def test_stream_reads_to_the_end():
+    model = StallingModel()
+    model.release.set()
+    assert "".join(_client(model).stream("Human: hi")) == "first second late"
+
+
+def test_stalled_stream_is_reported_as_incomplete_and_not_cached(stub_app, monkeypatch):
+    app = stub_app
+
+    def stalling_stream(prompt_text, generation_config=None):
+        yield "Diabetes treatment involves"
+        raise LLMTimeout("stream stalled for 0.5s")
+
+    monkeypatch.setattr(app.llm_client, "stream", stalling_stream)
+    cached = app.answer_cache.stats()["size"]
+    recorded = app.conversation_store.stats()["queued"] + app.conversation_store.stats()["writes"]
+
+    response = app.app.test_client().post("/stream", data={"msg": "How is type 2 diabetes treated long term?"})
+    body = response.get_data(as_text=True)
+
+    assert '"Diabetes treatment involves"' in body
+    assert "event: error" in body and app.INCOMPLETE_RESPONSE in body
+    assert "personalized medical advice" not in body
+    assert app.answer_cache.stats()["size"] == cached
+    assert app.conversation_store.stats()["queued"] + app.conversation_store.stats()["writes"] == recorded
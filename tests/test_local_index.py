@@ -0,0 +1,100 @@
+import threading
+
+import numpy as np
+
+from src.local_index import LocalVectorStore
+from src.stubs import StubEmbeddings
+
+TEXTS = [
+    "Asthma is a chronic inflammatory airway disease.",
+    "Metformin lowers hepatic glucose production.",
+    "Acne vulgaris presents with comedones and papules.",
+]
+
+
+def test_int8_index_survives_a_save_with_another_target_format(tmp_path):
+    embeddings = StubEmbeddings(size=64)
+    store = LocalVectorStore(str(tmp_path), embeddings, quantization="int8")
+    store.add_texts(TEXTS, ids=["a", "b", "c"])
+    store.save()
+
+    reopened = LocalVectorStore.load(str(tmp_path), embeddings)
+    assert reopened.quantization == "int8"
+    reopened.quantization = "none"
+    reopened.add_texts(["Gout is caused by urate crystals."], ids=["d"])
+    reopened.save()
+
+    ids, _, vectors = LocalVectorStore.load(str(tmp_path), embeddings)._dense_vectors()
+    expected = embeddings.embed_documents(TEXTS)
+    for i, doc_id in enumerate(["a", "b", "c"]):
+        row = ids.index(doc_id)
+        unit = np.asarray(expected[i]) / np.linalg.norm(expected[i])
+        assert np.allclose(vectors[row], unit, atol=0.02)
+
+
+def test_upserting_a_pending_id_replaces_it(tmp_path):
+    store = LocalVectorStore(str(tmp_path), StubEmbeddings(size=64))
+    store.add_texts(TEXTS, ids=["a", "b", "c"])
+    store.add_texts(["Asthma causes wheeze and cough."], ids=["a"])
+    assert len(store) == 3
+    store.save()
+
+    ids, docs, _ = LocalVectorStore.load(str(tmp_path), StubEmbeddings(size=64))._dense_vectors()
+    assert sorted(ids) == ["a", "b", "c"]
+    assert docs[ids.index("a")]["page_content"] == "Asthma causes wheeze and cough."
+
+
+def test_add_vectors_upserts_precomputed_embeddings(tmp_path):
+    embeddings = StubEmbeddings(size=64)
+    store = LocalVectorStore(str(tmp_path), embeddings)
+    store.add_texts(TEXTS, ids=["a", "b", "c"])
+    store.save()
+
+    # Replaces a saved row and a pending one, like add_texts.
+    store.add_vectors(["d"], [embeddings.embed_query("gout")])
+    store.add_vectors(["a", "d"], embeddings.embed_documents(["wheeze", "urate crystals"]))
+    assert len(store) == 4
+    store.save()
+
+    reopened = LocalVectorStore.load(str(tmp_path), embeddings)
+    assert [doc.page_content for doc in reopened.similarity_search("urate crystals", k=1)] == [""]
+    ids, _, vectors = reopened._dense_vectors()
+    assert sorted(ids) == ["a", "b", "c", "d"]
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+
+
+def test_searches_during_hot_reloads_never_mix_versions(tmp_path):
+    embeddings = StubEmbeddings(size=32)
+    texts = [f"Document number {i} about condition {i}." for i in range(60)]
+
+    def write_version(n):
+        writer = LocalVectorStore(str(tmp_path), embeddings)
+        writer.add_texts(texts[:n], ids=[f"d{i}" for i in range(n)])
+        writer.save()
+
+    write_version(60)
+    reader = LocalVectorStore.load(str(tmp_path), embeddings, watch_interval=0)
+    queries = [embeddings.embed_query(text) for text in texts]
+    errors, stop = [], threading.Event()
+
+    def search():
+        while not stop.is_set():
+            for query in queries:
+                try:
+                    for doc, _ in reader.similarity_search_with_score_by_vector(query, k=3):
+                        # Ids and documents must come from the same version.
+                        assert doc.page_content == texts[int(doc.id[1:])]
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+                    return
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for n in [3, 60, 5, 40, 3, 60] * 3:
+        write_version(n)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors[0]
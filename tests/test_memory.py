@@ -0,0 +1,64 @@
+import pytest
+
+from src.memory import ConversationStore, is_follow_up, refers_back
+
+STANDALONE = [
+    "What is hypothyroidism and how is it treated?",
+    "Is it safe to exercise with a cold?",
+    "Is it normal to have heart palpitations after coffee?",
+    "My baby has a rash, is it serious?",
+    "Should I worry about a mole that changed color?",
+    "Why do I feel dizzy when I stand up?",
+    "Why do joints become stiff with age and what is osteoarthritis?",
+    "Which drugs are more effective than metformin?",
+]
+
+FOLLOW_UPS = [
+    "what about its side effects?",
+    "is it contagious?",
+    "how is it treated?",
+    "what are the side effects of that?",
+    "and in children?",
+    "tell me more",
+    "explain briefly?",
+    "why?",
+    "what about diabetes?",
+]
+
+
+@pytest.mark.parametrize("message", STANDALONE)
+def test_standalone_questions_with_pronouns_are_not_follow_ups(message):
+    assert not is_follow_up(message)
+
+
+@pytest.mark.parametrize("message", FOLLOW_UPS)
+def test_follow_ups(message):
+    assert is_follow_up(message)
+
+
+def test_only_follow_ups_that_point_back_carry_the_previous_topic():
+    assert refers_back("is it contagious?")
+    assert refers_back("tell me more")
+    assert not refers_back("what about diabetes?")
+    assert not refers_back("What is hypothyroidism and how is it treated?")
+
+
+def test_conversation_context_keeps_a_standalone_question_on_its_own_topic(stub_app):
+    app = stub_app
+    app.conversation_store.record("s1", "What are the symptoms of diabetes?", "Thirst and polyuria.")
+    question = "What is hypothyroidism and how is it treated?"
+    assert app.conversation_context("s1", question) == (question, [])
+    query, history = app.conversation_context("s1", "is it contagious?")
+    assert query == "What are the symptoms of diabetes? is it contagious?"
+    assert history
+
+
+def test_first_turn_of_a_new_session_skips_the_database(tmp_path):
+    store = ConversationStore(str(tmp_path / "chat_history.db"))
+    store.start_session("fresh")
+    store.record("fresh", "What is asthma?", "A lung condition.")
+    assert store.stats()["db_reads"] == 0
+    store.record("returning", "What is acne?", "A skin condition.")
+    assert store.stats()["db_reads"] == 1
+    assert store.recent_turns("fresh") == [("What is asthma?", "A lung condition.")]
+    store.close()
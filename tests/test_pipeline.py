@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.pipeline import AnswerPipeline, IncompleteAnswer, Stage
+
+
+def make_pipeline(answers=None, fail_retrieval=False, followers=0, fail_generation=False):
+    """
+    With `followers`, generation waits until that many identical requests are
+    coalesced onto it, so concurrent callers really do overlap.
+    """
+    calls = {"generate": 0, "stored": [], "remembered": []}
+
+    def retrieve(query):
+        if fail_retrieval:
+            raise RuntimeError("vector store down")
+        return [f"doc about {query}"]
+
+    def answer(inputs):
+        calls["generate"] += 1
+        if fail_generation:
+            raise RuntimeError("model error")
+        return f"answer to {inputs['input']}"
+
+    def followers_waiting():
+        return pipeline.coalescing_stats()["coalesced"] >= followers
+
+    def generate(inputs):
+        deadline = time.monotonic() + 5
+        while not followers_waiting() and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return answer(inputs)
+
+    async def agenerate(inputs):
+        deadline = time.monotonic() + 5
+        while not followers_waiting() and time.monotonic() < deadline:
+            await asyncio.sleep(0.001)
+        return answer(inputs)
+
+    def llm_stream(prompt, docs):
+        return iter([" answer ", "in ", "pieces"])
+
+    async def allm_stream(prompt, docs):
+        for piece in llm_stream(prompt, docs):
+            yield piece
+
+    pipeline = AnswerPipeline(
+        history=Stage.threaded(lambda session_id, msg: (msg, [])),
+        precomputed=Stage(lambda msg, history: (answers or {}).get(msg)),
+        retrieve=Stage(retrieve),
+        cache_lookup=Stage(lambda msg, docs, history: (None, [1.0], "ctx")),
+        generate=Stage(generate, agenerate),
+        llm_stream=Stage(llm_stream, allm_stream),
+        pack=lambda docs: docs,
+        format_prompt=lambda inputs: inputs["input"],
+        sanitize=lambda answer: answer.strip() + " [sanitized]",
+        disclaimer=lambda answer: " [disclaimer]",
+        outcome_of=lambda answer: "llm",
+        store=lambda *args: calls["stored"].append(args),
+        remember=Stage(lambda *args: calls["remembered"].append(args)),
+    )
+    return pipeline, calls
+
+
+async def collect(stream):
+    return [piece async for piece in stream]
+
+
+def test_sync_and_async_responses_match():
+    pipeline, calls = make_pipeline()
+    sync_answer = pipeline.respond("What is asthma?", "s1")
+    async_answer = asyncio.run(pipeline.arespond("What is asthma?", "s1"))
+    assert sync_answer == async_answer == "answer to What is asthma? [sanitized]"
+    assert calls["generate"] == 2
+    assert len(calls["stored"]) == 2
+
+
+def test_precomputed_answer_skips_retrieval_and_llm():
+    pipeline, calls = make_pipeline(answers={"What is acne?": "precomputed acne"}, fail_retrieval=True)
+    assert pipeline.respond("What is acne?", "s1") == "precomputed acne"
+    assert list(pipeline.stream("What is acne?", "s1")) == ["precomputed acne"]
+    assert calls["generate"] == 0
+
+
+def test_sync_and_async_streams_match():
+    pipeline, calls = make_pipeline()
+    pieces = list(pipeline.stream("What is gout?", "s1"))
+    assert pieces == ["answer ", "in ", "pieces", " [disclaimer]"]
+    assert asyncio.run(collect(pipeline.astream("What is gout?", "s1"))) == pieces
+    assert calls["stored"][-1][4] == "answer in pieces [disclaimer]"
+
+
+def test_stage_errors_reach_the_caller():
+    pipeline, _ = make_pipeline(fail_retrieval=True)
+    with pytest.raises(RuntimeError, match="vector store down"):
+        pipeline.respond("What is gout?", "s1")
+    with pytest.raises(RuntimeError, match="vector store down"):
+        asyncio.run(collect(pipeline.astream("What is gout?", "s1")))
+
+
+def test_stream_failing_mid_answer_is_not_stored():
+    pipeline, calls = make_pipeline()
+
+    def stalling_stream(prompt, docs):
+        yield "Diabetes treatment involves"
+        raise TimeoutError("stream stalled")
+
+    async def astalling_stream(prompt, docs):
+        yield "Diabetes treatment involves"
+        raise TimeoutError("stream stalled")
+
+    pipeline.llm_stream = Stage(stalling_stream, astalling_stream)
+    pieces = []
+    with pytest.raises(IncompleteAnswer):
+        for piece in pipeline.stream("How is diabetes treated?", "s1"):
+            pieces.append(piece)
+    assert pieces == ["Diabetes treatment involves"]
+    with pytest.raises(IncompleteAnswer):
+        asyncio.run(collect(pipeline.astream("How is diabetes treated?", "s1")))
+    assert calls["stored"] == [] and calls["remembered"] == []
+
+
+CONCURRENT = 8
+
+
+def respond_concurrently(pipeline, msg):
+    """[answer or exception] from CONCURRENT threads asking `msg` at once"""
+    results = [None] * CONCURRENT
+
+    def ask(i):
+        try:
+            results[i] = pipeline.respond(msg, f"s{i}")
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(CONCURRENT)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+async def arespond_concurrently(pipeline, msg):
+    return await asyncio.gather(
+        *(pipeline.arespond(msg, f"s{i}") for i in range(CONCURRENT)), return_exceptions=True
+    )
+
+
+def test_concurrent_identical_questions_share_one_generation_on_threads():
+    pipeline, calls = make_pipeline(followers=CONCURRENT - 1)
+    results = respond_concurrently(pipeline, "What is asthma?")
+    assert results == ["answer to What is asthma? [sanitized]"] * CONCURRENT
+    assert calls["generate"] == 1
+    assert len(calls["stored"]) == 1
+    assert len(calls["remembered"]) == CONCURRENT
+    assert pipeline.coalescing_stats() == {"executions": 1, "coalesced": CONCURRENT - 1, "in_flight": 0}
+
+
+def test_concurrent_identical_questions_share_one_generation_on_asyncio():
+    pipeline, calls = make_pipeline(followers=CONCURRENT - 1)
+    results = asyncio.run(arespond_concurrently(pipeline, "What is asthma?"))
+    assert results == ["answer to What is asthma? [sanitized]"] * CONCURRENT
+    assert calls["generate"] == 1
+    assert pipeline.coalescing_stats() == {"executions": 1, "coalesced": CONCURRENT - 1, "in_flight": 0}
+
+
+def test_followers_get_the_leaders_exception():
+    pipeline, calls = make_pipeline(followers=CONCURRENT - 1, fail_generation=True)
+    results = respond_concurrently(pipeline, "What is asthma?")
+    assert all(isinstance(result, RuntimeError) and str(result) == "model error" for result in results)
+    assert calls["generate"] == 1
+
+    pipeline, calls = make_pipeline(followers=CONCURRENT - 1, fail_generation=True)
+    results = asyncio.run(arespond_concurrently(pipeline, "What is asthma?"))
+    assert all(isinstance(result, RuntimeError) and str(result) == "model error" for result in results)
+    assert calls["generate"] == 1
+    assert pipeline.coalescing_stats()["in_flight"] == 0
+
+
+def test_without_coalescing_each_request_generates():
+    pipeline, calls = make_pipeline()
+    pipeline.coalesce = False
+    respond_concurrently(pipeline, "What is asthma?")
+    assert calls["generate"] == CONCURRENT
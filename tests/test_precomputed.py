@@ -0,0 +1,45 @@
+import os
+
+from src.ingest import Manifest
+from src.precomputed import PrecomputedAnswers, save_entries
+
+
+def _entry(question, answer, vector):
+    return {"question": question, "key": question.lower(), "vector": vector, "answer": answer}
+
+
+def _write_manifest(path, generation, mtime_ns):
+    Manifest(str(path), generation=generation).save()
+    # Force a new mtime so the watcher sees the change on coarse filesystems.
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_entries_for_an_older_index_generation_are_not_served(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    answers_path = str(tmp_path / "precomputed_answers.json")
+    _write_manifest(manifest, "gen-1", 1_000_000_000)
+    save_entries(answers_path, [_entry("what is asthma", "asthma answer", [1.0, 0.0])], generation="gen-1")
+
+    answers = PrecomputedAnswers(answers_path, check_interval=0, manifest_path=str(manifest))
+    assert answers.lookup_text("What is asthma") == "asthma answer"
+    assert answers.lookup_vector([1.0, 0.0]) == "asthma answer"
+
+    # Re-ingestion bumps the generation and the answer refresh does not run.
+    _write_manifest(manifest, "gen-2", 2_000_000_000)
+    assert answers.lookup_text("What is asthma") is None
+    assert len(answers) == 0
+    assert answers.lookup_vector([1.0, 0.0]) is None
+    assert answers.stats()["stale_entries"] == 1
+
+    # A refresh written for the new generation is served again.
+    save_entries(answers_path, [_entry("what is asthma", "new asthma answer", [1.0, 0.0])], generation="gen-2")
+    os.utime(answers_path, ns=(3_000_000_000, 3_000_000_000))
+    assert answers.lookup_text("What is asthma") == "new asthma answer"
+    assert answers.stats()["stale_entries"] == 0
+
+
+def test_without_a_manifest_path_the_generation_is_not_checked(tmp_path):
+    answers_path = str(tmp_path / "precomputed_answers.json")
+    save_entries(answers_path, [_entry("what is acne", "acne answer", [0.0, 1.0])], generation="gen-1")
+    answers = PrecomputedAnswers(answers_path, check_interval=0)
+    assert answers.lookup_text("what is acne") == "acne answer"
@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+
+import numpy as np
+
+from src.semantic_cache import SemanticAnswerCache
+
+
+def test_save_merges_entries_from_other_workers(tmp_path):
+    path = str(tmp_path / "semantic_cache.json")
+    first = SemanticAnswerCache(path=path)
+    second = SemanticAnswerCache(path=path)
+    first.add("what is asthma", [1.0, 0.0], "ctx-a", "asthma answer")
+    second.add("what is acne", [0.0, 1.0], "ctx-b", "acne answer")
+    first.save()
+    second.save()
+
+    reloaded = SemanticAnswerCache(path=path)
+    assert reloaded.lookup([1.0, 0.0], "ctx-a") == "asthma answer"
+    assert reloaded.lookup([0.0, 1.0], "ctx-b") == "acne answer"
+
+
+def test_save_keeps_most_recently_used_within_maxsize(tmp_path):
+    path = str(tmp_path / "semantic_cache.json")
+    first = SemanticAnswerCache(path=path, maxsize=2)
+    second = SemanticAnswerCache(path=path, maxsize=2)
+    first.add("q1", [1.0, 0.0, 0.0], "c1", "a1")
+    second.add("q2", [0.0, 1.0, 0.0], "c2", "a2")
+    second.add("q3", [0.0, 0.0, 1.0], "c3", "a3")
+    first.save()
+    second.save()
+
+    reloaded = SemanticAnswerCache(path=path, maxsize=2)
+    assert reloaded.stats()["size"] == 2
+    assert reloaded.lookup([1.0, 0.0, 0.0], "c1") is None
+
+
+def test_add_saves_in_the_background(tmp_path, monkeypatch):
+    path = str(tmp_path / "semantic_cache.json")
+    cache = SemanticAnswerCache(path=path, save_every=2)
+    saved = threading.Event()
+    save = cache.save
+
+    def slow_save():
+        time.sleep(0.5)
+        save()
+        saved.set()
+
+    monkeypatch.setattr(cache, "save", slow_save)
+    start = time.perf_counter()
+    cache.add("q1", [1.0, 0.0], "c1", "a1")
+    cache.add("q2", [0.0, 1.0], "c2", "a2")
+    assert time.perf_counter() - start < 0.2
+    assert saved.wait(5)
+    assert np.load(path + ".npy").shape == (2, 2)
+    assert SemanticAnswerCache(path=path).lookup([0.0, 1.0], "c2") == "a2"
+
+
+def test_loads_a_cache_saved_with_json_vectors(tmp_path):
+    path = tmp_path / "semantic_cache.json"
+    entry = {"question": "q", "context": "c", "answer": "a", "last_used": 1.0, "hits": 0, "vector": [0.6, 0.8]}
+    path.write_text(json.dumps({"entries": [entry]}))
+    cache = SemanticAnswerCache(path=str(path))
+    assert cache.lookup([0.6, 0.8], "c") == "a"
+    cache.save()
+    assert "vector" not in json.loads(path.read_text())["entries"][0]
+    assert SemanticAnswerCache(path=str(path)).lookup([0.6, 0.8], "c") == "a"